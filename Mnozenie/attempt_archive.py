@@ -0,0 +1,265 @@
+import bisect
+import dataclasses
+import io
+import json
+import threading
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .batch_scoring import score_batch
+from .czytanie_scoring import score_words, word_mask
+from .persistence import PersistenceWriter
+from .speech2text import FLAC, RAW_PCM, ISpeech2Text, encode_audio, soundfile
+from .voice_sample import VoiceSample
+
+
+@dataclass
+class Attempt:
+    """One reading of a sentence, as stored in the AttemptArchive."""
+
+    sentence: str
+    transcript: str
+    timestamp: float  # When the recording ended, Unix time
+    time_taken: float  # Seconds from showing the sentence to starting to read
+    score: float
+    time_score: float
+    words: list[bool]  # Which words of the sentence were read correctly
+    frame_rate: int
+    duration: float  # Seconds of audio
+    # Where the audio is stored
+    codec: str = RAW_PCM
+    segment: int = 0
+    offset: int = 0
+    size: int = 0
+    id: int = field(default=-1, compare=False)
+
+
+class AttemptArchive:
+    """Keeps the audio and the results of every reading attempt.
+
+    The archive is a directory of append-only segment files. Each record in a
+    segment is a line of JSON describing the attempt, followed by its audio (FLAC if
+    soundfile is installed, raw int16 PCM otherwise). When a segment grows over
+    SEGMENT_SIZE, the next one is started. index.jsonl repeats the descriptions
+    together with the positions of the audio, so that opening the archive does not
+    read the segments; if it is lost, it is rebuilt from them.
+
+    With a PersistenceWriter, the files are written in the background. add() is
+    thread-safe."""
+
+    SEGMENT_SIZE = 64 * 2**20
+    INDEX_FILE = "index.jsonl"
+
+    directory: Path
+    codec: str
+    _writer: PersistenceWriter | None
+    _attempts: list[Attempt]  # Attempt i has id i
+    _by_sentence: dict[str, list[int]]
+    _by_time: list[tuple[float, int]]  # (timestamp, id), sorted
+    _segment: int
+    _segment_size: int
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        directory: Path = Path("recordings"),
+        writer: PersistenceWriter | None = None,
+        codec: str | None = None,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if codec is None:
+            codec = FLAC if soundfile is not None else RAW_PCM
+        self.codec = codec
+        self._writer = writer
+        self._attempts = []
+        self._by_sentence = {}
+        self._by_time = []
+        self._lock = threading.Lock()
+
+        segments = sorted(self.directory.glob("attempts-*.seg"))
+        self._segment = int(segments[-1].stem.split("-")[1]) if segments else 0
+        self._segment_size = (
+            self._segment_path(self._segment).stat().st_size if segments else 0
+        )
+        if (self.directory / self.INDEX_FILE).exists():
+            self._load_index()
+        elif segments:
+            self._rebuild_index(segments)
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"attempts-{segment:05d}.seg"
+
+    def _load_index(self):
+        sizes = {}
+        with open(self.directory / self.INDEX_FILE, "rb") as f:
+            for line in f:
+                try:
+                    attempt = Attempt(**json.loads(line))
+                except (json.JSONDecodeError, TypeError):
+                    break  # Torn tail of an interrupted write
+                if attempt.segment not in sizes:
+                    path = self._segment_path(attempt.segment)
+                    sizes[attempt.segment] = path.stat().st_size if path.exists() else 0
+                if attempt.offset + attempt.size > sizes[attempt.segment]:
+                    break  # The audio did not make it to the disk
+                self._index(attempt)
+
+    def _rebuild_index(self, segments: list[Path]):
+        lines = []
+        for path in segments:
+            segment = int(path.stem.split("-")[1])
+            size = path.stat().st_size
+            with open(path, "rb") as f:
+                while header := f.readline():
+                    try:
+                        description = json.loads(header)
+                    except json.JSONDecodeError:
+                        break
+                    attempt = Attempt(segment=segment, offset=f.tell(), **description)
+                    if attempt.offset + attempt.size > size:
+                        break
+                    f.seek(attempt.size, 1)
+                    self._index(attempt)
+                    lines.append(self._index_line(attempt))
+        with open(self.directory / self.INDEX_FILE, "wb") as f:
+            f.write(b"".join(lines))
+
+    def _index(self, attempt: Attempt):
+        attempt.id = len(self._attempts)
+        self._attempts.append(attempt)
+        self._by_sentence.setdefault(attempt.sentence, []).append(attempt.id)
+        bisect.insort(self._by_time, (attempt.timestamp, attempt.id))
+
+    @staticmethod
+    def _description(attempt: Attempt) -> dict:
+        description = dataclasses.asdict(attempt)
+        for key in ("segment", "offset", "id"):
+            del description[key]
+        return description
+
+    def _index_line(self, attempt: Attempt) -> bytes:
+        description = dataclasses.asdict(attempt)
+        del description["id"]
+        return (json.dumps(description, ensure_ascii=False) + "\n").encode()
+
+    def add(
+        self,
+        sound: VoiceSample,
+        sentence: str,
+        transcript: str,
+        timestamp: float,
+        time_taken: float,
+        score: float,
+        time_score: float,
+        words: list[bool],
+    ) -> Attempt:
+        audio = encode_audio(sound.data, sound.frame_rate, self.codec)
+        attempt = Attempt(
+            sentence=sentence,
+            transcript=transcript,
+            timestamp=timestamp,
+            time_taken=time_taken,
+            score=score,
+            time_score=time_score,
+            words=list(words),
+            frame_rate=sound.frame_rate,
+            duration=sound.length(),
+            codec=self.codec,
+            size=len(audio),
+        )
+        header = (
+            json.dumps(self._description(attempt), ensure_ascii=False) + "\n"
+        ).encode()
+        with self._lock:
+            if self._segment_size > 0 and (
+                self._segment_size + len(header) + len(audio) > self.SEGMENT_SIZE
+            ):
+                self._segment += 1
+                self._segment_size = 0
+            attempt.segment = self._segment
+            attempt.offset = self._segment_size + len(header)
+            self._segment_size += len(header) + len(audio)
+            self._index(attempt)
+            # The audio goes first, so that the index never points past the data.
+            self._append(self._segment_path(attempt.segment), header + audio)
+            self._append(self.directory / self.INDEX_FILE, self._index_line(attempt))
+        return attempt
+
+    def _append(self, path: Path, data: bytes):
+        if self._writer is not None:
+            self._writer.append(path, data)
+        else:
+            with open(path, "ab") as f:
+                f.write(data)
+
+    def __len__(self) -> int:
+        return len(self._attempts)
+
+    def __iter__(self) -> Iterator[Attempt]:
+        return iter(list(self._attempts))
+
+    def __getitem__(self, id: int) -> Attempt:
+        return self._attempts[id]
+
+    def by_sentence(self, sentence: str) -> list[Attempt]:
+        return [self._attempts[i] for i in self._by_sentence.get(sentence, [])]
+
+    def between(self, start: float, end: float) -> list[Attempt]:
+        """Attempts with start <= timestamp < end, oldest first."""
+        first = bisect.bisect_left(self._by_time, (start, -1))
+        last = bisect.bisect_left(self._by_time, (end, -1))
+        return [self._attempts[i] for _, i in self._by_time[first:last]]
+
+    def load_audio(self, attempt: Attempt) -> VoiceSample:
+        """The audio of the attempt. Raw PCM is memory-mapped, not read."""
+        if self._writer is not None:
+            self._writer.flush()
+        path = self._segment_path(attempt.segment)
+        if attempt.codec == RAW_PCM:
+            samples = np.memmap(
+                path, np.int16, "r", attempt.offset, (attempt.size // 2,)
+            )
+        else:
+            with open(path, "rb") as f:
+                f.seek(attempt.offset)
+                data = f.read(attempt.size)
+            samples, _ = soundfile.read(io.BytesIO(data), dtype="int16")
+        return VoiceSample.FromArray(samples, attempt.frame_rate)
+
+    def rescore(
+        self, attempts: Iterable[Attempt] | None = None, processes: int | None = None
+    ) -> list[Attempt]:
+        """Scores the stored transcripts again, e.g. after the scoring has changed,
+        on a pool of processes (see score_batch()). Returns updated copies of the
+        attempts; the archive itself is not changed."""
+        attempts = list(self if attempts is None else attempts)
+        batch = score_batch(((a.sentence, a.transcript) for a in attempts), processes)
+        return [
+            dataclasses.replace(
+                attempt,
+                words=batch.mask(k).tolist(),
+                score=float(batch.scores[k]),
+                id=attempt.id,
+            )
+            for k, attempt in enumerate(attempts)
+        ]
+
+    def retranscribe(
+        self, speech2text: ISpeech2Text, attempts: Iterable[Attempt] | None = None
+    ) -> Iterator[Attempt]:
+        """Transcribes and scores the stored audio again, e.g. with another model.
+        Yields updated copies of the attempts."""
+        for attempt in self if attempts is None else attempts:
+            transcript = speech2text.get_transcript(self.load_audio(attempt))
+            words = word_mask(attempt.sentence, transcript)
+            yield dataclasses.replace(
+                attempt,
+                transcript=transcript,
+                words=words,
+                score=score_words(words),
+                id=attempt.id,
+            )
@@ -0,0 +1,93 @@
+import os
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from .czytanie_scoring import highlight_sentence, score_words, word_mask
+
+
+@dataclass
+class BatchScores:
+    """Results of score_batch(). The HTML highlighting is only built on request."""
+
+    references: list[str]
+    scores: np.ndarray  # float64, one per pair
+    words: np.ndarray  # bool, the word masks of all the pairs one after another
+    offsets: np.ndarray  # int64, the mask of pair k is words[offsets[k]:offsets[k + 1]]
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def mask(self, k: int) -> np.ndarray:
+        return self.words[self.offsets[k] : self.offsets[k + 1]]
+
+    def highlight(self, k: int) -> str:
+        return highlight_sentence(self.references[k], self.mask(k))
+
+
+def _score_chunk(pairs: list[tuple[str, str]]) -> tuple[list[float], bytes, list[int]]:
+    # Runs in a worker process. Returns plain types, which are cheap to pickle.
+    scores = []
+    words = bytearray()
+    lengths = []
+    for reference, transcript in pairs:
+        mask = word_mask(reference, transcript)
+        scores.append(score_words(mask))
+        words.extend(mask)
+        lengths.append(len(mask))
+    return scores, bytes(words), lengths
+
+
+def score_batch(
+    pairs: Iterable[tuple[str, str]],
+    processes: int | None = None,
+    chunk_size: int = 500,
+) -> BatchScores:
+    """Scores many (reference, transcript) pairs, e.g. all the stored attempts
+    after the scoring has changed.
+
+    Identical pairs are scored once. The distinct pairs are split into chunks of
+    chunk_size, which are scored on a pool of `processes` processes (by default one
+    per CPU). Batches of fewer than two chunks are scored in this process."""
+    pairs = list(pairs)
+    distinct: dict[tuple[str, str], int] = {}
+    for pair in pairs:
+        distinct.setdefault(pair, len(distinct))
+    todo = list(distinct)
+    chunks = [todo[k : k + chunk_size] for k in range(0, len(todo), chunk_size)]
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes <= 1 or len(chunks) < 2:
+        results = map(_score_chunk, chunks)
+    else:
+        with ProcessPoolExecutor(min(processes, len(chunks))) as executor:
+            results = list(executor.map(_score_chunk, chunks))
+
+    distinct_scores = []
+    distinct_words = []
+    distinct_lengths = []
+    for scores, words, lengths in results:
+        distinct_scores.extend(scores)
+        distinct_words.append(np.frombuffer(words, np.bool_))
+        distinct_lengths.extend(lengths)
+    distinct_lengths = np.array(distinct_lengths, np.int64)
+    distinct_offsets = np.concatenate([[0], np.cumsum(distinct_lengths)])
+    all_words = (
+        np.concatenate(distinct_words) if distinct_words else np.zeros(0, np.bool_)
+    )
+
+    # Expand back to one entry per pair, in the order of the input.
+    index = np.array([distinct[pair] for pair in pairs], np.int64)
+    lengths = distinct_lengths[index] if len(index) else np.zeros(0, np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+    starts = np.repeat(distinct_offsets[index] - offsets[:-1], lengths)
+    words = all_words[np.arange(offsets[-1]) + starts]
+    return BatchScores(
+        references=[reference for reference, _ in pairs],
+        scores=np.array(distinct_scores, np.float64)[index],
+        words=words,
+        offsets=offsets,
+    )
@@ -0,0 +1,69 @@
+import queue
+import threading
+from pathlib import Path
+
+import pyaudio
+from pydub import AudioSegment
+
+
+class CuePlayer:
+    """Plays short feedback sounds with no delay.
+
+    The sound files are decoded once, on the worker thread, into PCM in one common
+    format. The worker keeps one output stream open and plays what gets queued by
+    play(). A new cue cuts off the one that is still playing."""
+
+    FRAME_RATE = 44100
+    CHANNELS = 2
+    CHUNK_FRAMES = 512  # How often (in frames) the worker checks for a newer cue
+
+    _files: dict[str, Path]
+    _cues: dict[str, bytes]  # name -> PCM, int16
+    _requests: queue.Queue
+    _p: pyaudio.PyAudio
+    _thread: threading.Thread
+
+    def __init__(self, files: dict[str, Path], p: pyaudio.PyAudio | None = None):
+        self._files = files
+        self._cues = {}
+        self._requests = queue.Queue()
+        self._p = p if p is not None else pyaudio.PyAudio()
+        self._thread = threading.Thread(target=self._run, name="CuePlayer", daemon=True)
+        self._thread.start()
+
+    def play(self, name: str):
+        self._requests.put(name)
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
+
+    def _decode(self, path: Path) -> bytes:
+        song = AudioSegment.from_file(path)
+        song = (
+            song.set_frame_rate(self.FRAME_RATE)
+            .set_channels(self.CHANNELS)
+            .set_sample_width(2)
+        )
+        return song.raw_data
+
+    def _run(self):
+        for name, path in self._files.items():
+            self._cues[name] = self._decode(path)
+        stream = self._p.open(
+            format=pyaudio.paInt16,
+            channels=self.CHANNELS,
+            rate=self.FRAME_RATE,
+            output=True,
+        )
+        chunk_bytes = self.CHUNK_FRAMES * self.CHANNELS * 2
+        try:
+            while (name := self._requests.get()) is not None:
+                pcm = self._cues[name]
+                for start in range(0, len(pcm), chunk_bytes):
+                    if not self._requests.empty():
+                        break  # Interrupted by the next cue
+                    stream.write(pcm[start : start + chunk_bytes])
+        finally:
+            stream.stop_stream()
+            stream.close()
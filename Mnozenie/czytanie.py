@@ -1,90 +1,63 @@
-import heapq
+import argparse
 import tkinter as tk
-from dataclasses import dataclass
-import json
 
 import numpy as np
 from pathlib import Path
 
 import time
 
-from pydub import AudioSegment
-from pydub.playback import play
-
-from .czytanie_scoring import score_sentence, calc_time_penalty
+from .attempt_archive import AttemptArchive
+from .cue_player import CuePlayer
+from .czytanie_scoring import (
+    CompiledSentence,
+    calc_time_penalty,
+    highlight_sentence,
+    score_sentence,
+    score_words,
+    word_mask,
+)
+from .pipeline import Job, Pipeline
+from .persistence import PersistenceWriter
+from .progress_repository import (
+    IProgressRepository,
+    JsonProgressRepository,
+    SqliteProgressRepository,
+)
+from .profile_selector import ProfileSelector
+from .profiles import Profile, ProfileManager, add_profile_arguments
+from .sentence_store import ScoringServer
 from .sound_recorder import SoundRecorder
-from threading import Thread
+from .speech2text import (
+    ISpeech2Text,
+    ITranscriptStream,
+    Speech2Text,
+    WhisperSpeech2Text,
+)
+from .transcript_cache import CachedSpeech2Text
+from .vad import VadGate, trim_silence
+from .voice_sample import VoiceSample
 import requests
 
 
-class Speech2Text:
-    def get_transcript(self, sound) -> str:
-        return requests.get(
-            "http://192.168.42.5:8000/request/", data=sound.json()
-        ).text.strip()
-
-
-@dataclass(order=True)
-class Score:
-    score: float
-    sentence: str
-
-
-class ScoringServer:
-    _scores: dict[str, float]  # Sentence -> score points
-    _scores_sort: list[Score]  # List of sentences sorted by score\
-
-    def __init__(
-        self,
-        input_file: str = "czytanie-sentences.txt",
-        output_file: str = "czytanie-scores.json",
-    ):
-        self._scores = {}
-        self._scores_sort = []
-        try:
-            with open(output_file, "r") as fr:
-                try:
-                    self._scores = json.load(fr)
-                except json.JSONDecodeError:
-                    with open(output_file, "w") as fw:
-                        jsonobj = json.dumps(self._scores, indent=4)
-                        fw.write(jsonobj)
-        except FileNotFoundError:
-            with open(output_file, "w") as fw:
-                jsonobj = json.dumps(self._scores, indent=4)
-                fw.write(jsonobj)
-        self._scores_sort = [
-            Score(score, sentence) for sentence, score in self._scores.items()
-        ]
-
-        for line in open(input_file):
-            sentence = line.strip()
-            if sentence not in self._scores:
-                self._scores[sentence] = 0
-                self._scores_sort.append(Score(0, sentence))
-        heapq.heapify(self._scores_sort)
-
-    def get_sentence(self) -> str:
-        return heapq.heappop(self._scores_sort).sentence
-
-    def set_sentence_score(self, sentence: str, score: float):
-        self._scores[sentence] = score
-        heapq.heappush(self._scores_sort, Score(score, sentence))
-        with open("czytanie-scores.json", "w") as fw:
-            jsonobj = json.dumps(self._scores, indent=4)
-            fw.write(jsonobj)
-
-
 def get_resource(resource_name: str) -> Path:
     curdir = Path(__file__).parent
     return curdir / resource_name
 
 
 class CzytanieApp:
+    TRANSCRIPTION_TIMEOUT = 60.0  # seconds
     _window: tk.Tk
     _sound_recorder: SoundRecorder
+    _cue_player: CuePlayer
     _scoring_server: ScoringServer
-    _speech2text: Speech2Text
+    _speech2text: ISpeech2Text
+    _transcript_stream: ITranscriptStream | None
+    _writer: PersistenceWriter
+    _profiles: ProfileManager | None
+    _profile: Profile
+    _archive: AttemptArchive
+    _pipeline: Pipeline
+    _transcription_job: Job | None
     _question_text: tk.Text
     _record_button: tk.Button
     _next_question_button: tk.Button
@@ -99,65 +72,61 @@ class CzytanieApp:
     incorrect: float
     total_questions: float
 
-    def __init__(self):
+    def __init__(
+        self,
+        speech2text: ISpeech2Text | None = None,
+        auto_stop_ms: int | None = None,
+        repository: IProgressRepository | None = None,
+        profiles: ProfileManager | None = None,
+        profile: str | None = None,
+        writer: PersistenceWriter | None = None,
+    ):
+        # auto_stop_ms: stop the recording by itself after this much silence
+        # following the speech, instead of waiting for the button release.
+        # Without profiles, the progress goes to the repository (the JSON files in
+        # the current directory by default). With them, to the given profile, and
+        # the window gets a profile selector.
+        self.auto_stop_ms = auto_stop_ms
         self.current_sentence = None
         self.time_taken = 0.0
         self.time_start = 0.0
 
-        self.accuracy_score = 0.0
-        self.time_score = 0.0
-        self.correct = 0.0
-        self.incorrect = 0.0
-        self.total_questions = 0.0
-
         self.started_recording = False
         self.answered = False
         self.rerolled = 0
 
         self._window = tk.Tk()
         self._window.title("Czytanie")
+        self._window.protocol("WM_DELETE_WINDOW", self.quit_app)
+        self._pipeline = Pipeline(self._window)
+        self._transcription_job = None
 
         self._window.configure(bg="black")
 
         self._user_answer = None
 
+        self._writer = writer if writer is not None else PersistenceWriter()
         self._sound_recorder = SoundRecorder()
-        self._scoring_server = ScoringServer()
-        self._speech2text = Speech2Text()
-
-        try:
-            with open("total_scores.json", "r") as fr:
-                try:
-                    scores = json.load(fr)
-                except json.JSONDecodeError:
-                    scores = {
-                        "accuracy": 0.0,
-                        "time": 0.0,
-                        "correct": 0.0,
-                        "incorrect": 0.0,
-                        "total": 0.0,
-                    }
-                    with open("total_scores.json", "w") as fw:
-                        jsonobj = json.dumps(scores, indent=4)
-                        fw.write(jsonobj)
-                self.accuracy_score = scores["accuracy"]
-                self.time_score = scores["time"]
-                self.correct = scores["correct"]
-                self.incorrect = scores["incorrect"]
-                self.total_questions = scores["total"]
-        except FileNotFoundError:
-            with open("total_scores.json", "w") as fw:
-                jsonobj = json.dumps(
-                    {
-                        "accuracy": 0.0,
-                        "time": 0.0,
-                        "correct": 0.0,
-                        "incorrect": 0.0,
-                        "total": 0.0,
-                    },
-                    indent=4,
-                )
-                fw.write(jsonobj)
+        self._cue_player = CuePlayer(
+            {
+                "correct": get_resource("correct.mp3"),
+                "incorrect": get_resource("incorrect.mp3"),
+            },
+            self._sound_recorder.p,
+        )
+        self._speech2text = speech2text if speech2text is not None else Speech2Text()
+        self._transcript_stream = None
+
+        self._profiles = profiles
+        if profiles is not None:
+            self._load_profile(profiles.get(profile))
+            ProfileSelector(
+                self._window, profiles, profile, self.switch_profile, bg="black"
+            ).pack()
+        else:
+            if repository is None:
+                repository = JsonProgressRepository(writer=self._writer)
+            self._load_profile(Profile("", Path("."), repository, writer=self._writer))
 
         self._question_text = tk.Text(
             self._window, height=1, background="black", foreground="white", width=100
@@ -225,36 +194,152 @@ class CzytanieApp:
 
         self.next_question()
 
+    def quit_app(self):
+        self._pipeline.shutdown()
+        self._cue_player.close()
+        if self._profiles is not None:
+            self._profiles.close()
+        else:
+            self._profile.close()
+        self._writer.close()
+        self._window.destroy()
+
+    def _load_profile(self, profile: Profile):
+        self._profile = profile
+        self._scoring_server = profile.scoring_server
+        self._archive = profile.archive
+        totals = profile.load_totals()
+        self.accuracy_score = totals.get("accuracy", 0.0)
+        self.time_score = totals.get("time", 0.0)
+        self.correct = totals.get("correct", 0.0)
+        self.incorrect = totals.get("incorrect", 0.0)
+        self.total_questions = totals.get("total", 0.0)
+
+    def switch_profile(self, name: str):
+        if self.started_recording:
+            self._sound_recorder.stop_recording()
+            self._transcript_stream.cancel()
+            self._transcript_stream = None
+            self.started_recording = False
+        self._load_profile(self._profiles.get(name))
+        self.rerolled = 0
+        self.next_question()
+
     def start_recording(self, event):
         if not self.started_recording and not self.answered:
+            if self._transcription_job is not None:
+                # The child reads again - the previous attempt is not wanted anymore.
+                self._transcription_job.cancel()
+                self._transcription_job = None
+            self._record_button["text"] = "Record"
             self.started_recording = True
             self.time_taken = time.time() - self.time_start
-            self._sound_recorder.start_recording()
+            # Transcription starts while the child is still reading. Only the speech
+            # is sent, not the silence around it.
+            frame_rate = self._sound_recorder.frame_rate
+            gate = VadGate(
+                self._speech2text.start_stream(frame_rate),
+                frame_rate,
+                auto_stop_ms=self.auto_stop_ms,
+                on_auto_stop=lambda: self._pipeline.call_soon(self.auto_stop, gate),
+            )
+            self._transcript_stream = gate
+            self._sound_recorder.start_recording(gate.feed)
+
+    def auto_stop(self, gate: VadGate):
+        if gate is self._transcript_stream:
+            self.stop_recording(None)
 
     def stop_recording(self, event):
         if not self.answered and self.started_recording:
             self.started_recording = False
             self._sound_recorder.stop_recording()
             sound = self._sound_recorder.get_last_recording()
+            stream = self._transcript_stream
+            self._transcript_stream = None
             if sound.length() < 1.0:
+                stream.cancel()
                 return
-            transcript = self._speech2text.get_transcript(sound)
-            if transcript == "":
+            start, end = trim_silence(sound.samples, sound.frame_rate)
+            if start == end:
+                stream.cancel()
+                self._record_button["text"] = "Record (nothing heard, try again)"
                 return
+            sound = VoiceSample.FromArray(sound.samples[start:end], sound.frame_rate)
+            self._record_button["text"] = "Transcribing…"
+            self._transcription_job = self._pipeline.submit(
+                self._transcribe_and_score,
+                stream,
+                sound,
+                self._scoring_server.compiled(self.current_sentence),
+                self.time_taken,
+                self._archive,
+                time.monotonic() + self.TRANSCRIPTION_TIMEOUT,
+                on_done=self.show_transcript,
+                on_error=self.transcription_failed,
+                timeout=self.TRANSCRIPTION_TIMEOUT,
+            )
 
-            self.answered = True
-            self.rerolled = 0
-            self._record_button["state"] = "disabled"
-            self._next_question_button["state"] = "normal"
+    def _transcribe_and_score(
+        self,
+        stream,
+        sound,
+        sentence: CompiledSentence,
+        time_taken: float,
+        archive: AttemptArchive,
+        deadline: float,
+    ):
+        # Runs on a worker thread of the pipeline. The pipeline drops the result
+        # after the timeout, but the thread must not stay blocked either: with
+        # all the workers waiting for a hung server, no sentence would get scored.
+        try:
+            transcript = stream.finish(max(0.0, deadline - time.monotonic()))
+        except TimeoutError:
+            stream.cancel()
+            raise
+        except requests.RequestException:
+            # Server without streaming support
+            transcript = self._speech2text.get_transcript(sound)
+        if transcript == "":
+            return transcript, None
+        words = word_mask(sentence, transcript)
+        score = score_words(words)
+        archive.add(
+            sound,
+            sentence.text,
+            transcript,
+            timestamp=time.time(),
+            time_taken=time_taken,
+            score=score,
+            time_score=calc_time_penalty(time_taken, sentence),
+            words=words,
+        )
+        return transcript, (score, highlight_sentence(sentence, words))
+
+    def transcription_failed(self, error: Exception):
+        self._transcription_job = None
+        print(f"Transcription failed: {error!r}")
+        self._record_button["text"] = "Record (try again)"
+
+    def show_transcript(self, result):
+        self._transcription_job = None
+        self._record_button["text"] = "Record"
+        transcript, scored = result
+        if transcript == "":
+            return
+        self.answered = True
+        self.rerolled = 0
+        self._record_button["state"] = "disabled"
+        self._next_question_button["state"] = "normal"
 
-            self._user_answer = tk.Text(
-                self._window, height=1, background="black", foreground="white"
-            )
-            self._user_answer.delete("1.0", tk.END)
-            self._user_answer.insert(tk.END, transcript)
-            self._user_answer.pack()
+        self._user_answer = tk.Text(
+            self._window, height=1, background="black", foreground="white"
+        )
+        self._user_answer.delete("1.0", tk.END)
+        self._user_answer.insert(tk.END, transcript)
+        self._user_answer.pack()
 
-            self.check_answer(transcript)
+        self.check_answer(transcript, scored)
 
     def insert_colored_text(self, html_text):
         import re
@@ -275,16 +360,20 @@ class CzytanieApp:
             state="disabled"
         )  # Disable the Text widget after inserting text
 
-    def check_answer(self, transcript):
-        score, redacted_answer_in_html = score_sentence(
-            self.current_sentence, transcript
-        )
+    def check_answer(self, transcript, scored: tuple[float, str] | None = None):
+        if scored is None:
+            scored = score_sentence(
+                self._scoring_server.compiled(self.current_sentence), transcript
+            )
+        score, redacted_answer_in_html = scored
         score = np.round(score, 2)
         self.accuracy_score += score
         self.accuracy_score = np.round(self.accuracy_score, 2)
         self._accuracy_score_label["text"] += f" + {score}"
 
-        time_score = calc_time_penalty(self.time_taken, self.current_sentence)
+        time_score = calc_time_penalty(
+            self.time_taken, self._scoring_server.compiled(self.current_sentence)
+        )
         time_score = np.round(time_score, 2)
         self.time_score += time_score
         self._time_score_label["text"] += f" + {time_score}"
@@ -292,31 +381,24 @@ class CzytanieApp:
         if score == 1.0 and time_score == 1.0:
             self.correct += 1.0
             self._correct_label["text"] += " + 1"
-            song = AudioSegment.from_mp3(get_resource("correct.mp3"))
-            T = Thread(target=play, args=(song,))
-            T.start()
+            self._cue_player.play("correct")
         else:
             self.incorrect += 1.0
             self._incorrect_label["text"] += " + 1"
-            song = AudioSegment.from_mp3(get_resource("incorrect.mp3"))
-            T = Thread(target=play, args=(song,))
-            T.start()
+            self._cue_player.play("incorrect")
 
         self.total_questions += 1.0
         self._total_questions_label["text"] += " + 1"
 
-        with open("total_scores.json", "w") as fw:
-            jsonobj = json.dumps(
-                {
-                    "accuracy": self.accuracy_score,
-                    "time": self.time_score,
-                    "correct": self.correct,
-                    "incorrect": self.incorrect,
-                    "total": self.total_questions,
-                },
-                indent=4,
-            )
-            fw.write(jsonobj)
+        self._profile.save_totals(
+            {
+                "accuracy": self.accuracy_score,
+                "time": self.time_score,
+                "correct": self.correct,
+                "incorrect": self.incorrect,
+                "total": self.total_questions,
+            }
+        )
 
         self._scoring_server.set_sentence_score(self.current_sentence, score)
         self._question_text.delete("1.0", tk.END)  # Clear the existing text
@@ -324,6 +406,10 @@ class CzytanieApp:
 
     def next_question(self, event=None):
         if self.rerolled < 1:  # 1 is max rerolls
+            if self._transcription_job is not None:
+                self._transcription_job.cancel()
+                self._transcription_job = None
+                self._record_button["text"] = "Record"
             self.current_sentence = self._scoring_server.get_sentence()
             if self._user_answer is not None:
                 self._user_answer.destroy()
@@ -348,7 +434,67 @@ class CzytanieApp:
 
 
 def main():
-    app = CzytanieApp()
+    parser = argparse.ArgumentParser(description="Reading practice")
+    parser.add_argument(
+        "--server", help="URL of the transcription server", default=None
+    )
+    parser.add_argument(
+        "--whisper",
+        metavar="MODEL",
+        help="Transcribe locally with this Whisper model (tiny, base, small...) "
+        "instead of using the transcription server",
+    )
+    parser.add_argument(
+        "--threads", type=int, help="CPU threads for the local Whisper model"
+    )
+    parser.add_argument(
+        "--auto-stop",
+        metavar="MS",
+        type=int,
+        help="Stop recording after this many milliseconds of silence",
+    )
+    parser.add_argument(
+        "--database",
+        metavar="FILE",
+        type=Path,
+        help="Keep the progress in this SQLite database, which can be shared with "
+        "mnozenie and suits big corpora. A new database imports the JSON files",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.whisper is not None:
+        speech2text = WhisperSpeech2Text(args.whisper, threads=args.threads)
+    elif args.server is not None:
+        speech2text = Speech2Text(args.server)
+    else:
+        speech2text = Speech2Text()
+    speech2text = CachedSpeech2Text(
+        speech2text, cache_file=Path("transcript-cache.jsonl")
+    )
+    if args.profile is not None:
+        writer = PersistenceWriter()
+        profiles = ProfileManager(
+            args.profiles, use_database=args.profile_database, writer=writer
+        )
+        app = CzytanieApp(
+            speech2text,
+            auto_stop_ms=args.auto_stop,
+            profiles=profiles,
+            profile=args.profile,
+            writer=writer,
+        )
+    else:
+        repository = None
+        if args.database is not None:
+            repository = SqliteProgressRepository(
+                args.database,
+                totals_file=Path("total_scores.json"),
+                scores_file=Path("czytanie-scores.json"),
+            )
+        app = CzytanieApp(
+            speech2text, auto_stop_ms=args.auto_stop, repository=repository
+        )
     app._window.mainloop()
 
 
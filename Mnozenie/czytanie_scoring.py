@@ -1,15 +1,67 @@
-import difflib
+import bisect
+import functools
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+
+_PUNCTUATION = str.maketrans("", "", "!?.,;:-–…")
 
 
 def just_letters(s: str) -> str:
-    return " ".join(s.lower().translate(str.maketrans("", "", "!?.,;:-–…")).split())
+    return " ".join(s.lower().translate(_PUNCTUATION).split())
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledSentence:
+    """A reference sentence, with everything that scoring needs from it worked out
+    once. All the scoring functions accept it in place of the sentence. It is
+    shared by everyone who compiles the same sentence, so it is read-only."""
+
+    text: str
+    normalized: str  # just_letters(text)
+    tokens: tuple[str, ...]  # text.split(), the words as shown
+    positions: tuple[int, ...]  # Indices of the tokens that are not just punctuation
+    words: tuple[str, ...]  # Those tokens, normalized
+    word_counts: Mapping[str, int]  # How many times each of the words occurs
+    timeout: float
+
+    @property
+    def word_count(self) -> int:
+        return len(self.tokens)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_sentence(sentence: str) -> CompiledSentence:
+    tokens = tuple(sentence.split())
+    normalized_tokens = [just_letters(token) for token in tokens]
+    positions = tuple(i for i, token in enumerate(normalized_tokens) if token != "")
+    words = tuple(normalized_tokens[i] for i in positions)
+    word_counts: dict[str, int] = {}
+    for word in words:
+        word_counts[word] = word_counts.get(word, 0) + 1
+    normalized = just_letters(sentence)
+    return CompiledSentence(
+        text=sentence,
+        normalized=normalized,
+        tokens=tokens,
+        positions=positions,
+        words=words,
+        word_counts=MappingProxyType(word_counts),
+        timeout=len(normalized) / 1.5 + 6,
+    )
+
 
+def _compiled(sentence: str | CompiledSentence) -> CompiledSentence:
+    if isinstance(sentence, CompiledSentence):
+        return sentence
+    return compile_sentence(sentence)
 
-def calculate_timeout_from_sentence(sentence: str) -> float:
-    return len(just_letters(sentence)) / 1.5 + 6
 
+def calculate_timeout_from_sentence(sentence: str | CompiledSentence) -> float:
+    return _compiled(sentence).timeout
 
-def calc_time_penalty(time_taken, sentence: str) -> float:
+
+def calc_time_penalty(time_taken, sentence: str | CompiledSentence) -> float:
     timeout = calculate_timeout_from_sentence(sentence)
 
     if time_taken < timeout * 2 and not time_taken < timeout:
@@ -19,84 +71,228 @@ def calc_time_penalty(time_taken, sentence: str) -> float:
     return 0
 
 
-def score_sentence(correct_sentence: str, user_sentence: str) -> tuple[float, str]:
-    sequence_matcher = difflib.SequenceMatcher(
-        None, just_letters(correct_sentence), just_letters(user_sentence)
-    )
-    # Calculate number of words that were read wrong.
-    # 1. Calculate positions of spaces in the correct sentence
-    correct_spaces = [-1] + [i for i, c in enumerate(correct_sentence) if c == " "]
-    correct_spaces.append(len(correct_sentence))
-    # Find what words were read wrong
-    wrong_words = 0
-    mb = sequence_matcher.get_matching_blocks()
-    mb = [mb for mb in mb if mb.size > 0]
-    if len(mb) == 0:
-        return 0, highlight_sentence(
-            correct_sentence, [False] * (len(correct_spaces) - 1)
-        )
-
-    left_word_pos_idx = 0
-    sequence_pos = 0
-    words = [True] * (
-        len(correct_spaces) - 1
-    )  # Each word will get a True if was correctly read, or False if not
-
-    correct_pos_left = mb[sequence_pos].a
-    correct_pos_right = mb[sequence_pos].size
-    # All the words before the first match are wrong.
-    while correct_spaces[left_word_pos_idx] + 1 < correct_pos_left:
-        words[left_word_pos_idx] = False
-        left_word_pos_idx += 1
-        if left_word_pos_idx == len(correct_spaces) - 1:
-            return 0, highlight_sentence(correct_sentence, words)
-
-    while True:  # Driven by correct_pos.
-        correct_pos_left = mb[sequence_pos].a
-        correct_pos_right = mb[sequence_pos].size + mb[sequence_pos].a
-
-        while True:
-            left_word_pos = correct_spaces[left_word_pos_idx]
-            right_word_pos = correct_spaces[left_word_pos_idx + 1]
-            if right_word_pos < correct_pos_right:
-                left_word_pos_idx += 1
-                if left_word_pos_idx == len(correct_spaces) - 1:
-                    break
-                continue
-            break
-        if left_word_pos_idx == len(correct_spaces) - 1:
-            break
-
-        sequence_pos += 1
-        if sequence_pos == len(mb):
-            # We are going to exit. All the words not read are wrong (missing).
-            left_word_pos_idx += 1
-            while left_word_pos_idx < len(correct_spaces) - 1:
-                words[left_word_pos_idx] = False
-                left_word_pos_idx += 1
-            break
-        correct_pos_left = mb[sequence_pos].a
-        correct_pos_right = mb[sequence_pos].size + mb[sequence_pos].a
-        while left_word_pos < correct_pos_left:
-            words[left_word_pos_idx] = False
-            left_word_pos_idx += 1
-            if left_word_pos_idx == len(correct_spaces) - 1:
-                break
-            left_word_pos = correct_spaces[left_word_pos_idx]
-            right_word_pos = correct_spaces[left_word_pos_idx + 1]
-        if left_word_pos_idx == len(correct_spaces) - 1:
-            break
-
-    total_word_count = len(correct_spaces) - 1
-    wrong_words = sum(1 for word in words if not word)
-
-    return (total_word_count - wrong_words) / total_word_count, highlight_sentence(
-        correct_sentence, words
-    )
+def score_sentence(
+    correct_sentence: str | CompiledSentence, user_sentence: str
+) -> tuple[float, str]:
+    words = word_mask(correct_sentence, user_sentence)
+    return score_words(words), highlight_sentence(correct_sentence, words)
+
+
+def score_words(words: list[bool]) -> float:
+    if not words:
+        return 0.0
+    return sum(words) / len(words)
+
+
+def word_mask(
+    correct_sentence: str | CompiledSentence, user_sentence: str
+) -> list[bool]:
+    """For each word of the correct sentence (split on whitespace), whether it was
+    read correctly, i.e. whether the alignment pairs it with the same word of the
+    user sentence. Words made only of punctuation count as read."""
+    compiled = _compiled(correct_sentence)
+    reference = compiled.words
+    user = just_letters(user_sentence).split()
+    words = [True] * len(compiled.tokens)
+    for position in compiled.positions:
+        words[position] = False
+    for i, j in align_words(reference, user, compiled.word_counts):
+        if i is not None and j is not None and reference[i] == user[j]:
+            words[compiled.positions[i]] = True
+    return words
+
+
+BAND = 32  # How far (in words) the alignment may stray from the diagonal
+
+
+def align_words(
+    reference: list[str] | tuple[str, ...],
+    user: list[str],
+    reference_counts: Mapping[str, int] | None = None,
+) -> list[tuple[int | None, int | None]]:
+    """Aligns two sequences of words. Returns pairs (i, j) of aligned words,
+    (i, None) for words of the reference that were skipped and (None, j) for words
+    that are only in the user sentence. reference_counts (occurrences of each word
+    of the reference) can be passed in if they are known already.
+
+    Words that occur exactly once in both sequences are paired up first (the
+    longest run of such pairs that keeps the order), and the stretches between
+    these anchors are aligned the same way, like in patience diff. Short stretches,
+    and stretches without such words, are left to _align_stretch(). On a real
+    reading they are short, so long passages take linear time."""
+    if len(reference) <= BAND and len(user) <= BAND:
+        return _align_stretch(reference, user)  # Exact, and cheap enough
+    anchors = _anchors(reference, user, reference_counts)
+    if not anchors:
+        return _align_stretch(reference, user)
+    alignment = []
+    i0 = j0 = 0
+    for i, j in anchors + [(len(reference), len(user))]:
+        for a, b in align_words(reference[i0:i], user[j0:j]):
+            alignment.append(
+                (None if a is None else a + i0, None if b is None else b + j0)
+            )
+        if i < len(reference):
+            alignment.append((i, j))
+        i0, j0 = i + 1, j + 1
+    return alignment
+
+
+def _anchors(
+    reference: list[str] | tuple[str, ...],
+    user: list[str],
+    counts: dict[str, int] | None = None,
+) -> list[tuple[int, int]]:
+    """Pairs (i, j) of words that are unique in both sequences, the longest
+    subsequence of them that is increasing in both i and j."""
+    if counts is None:
+        counts = {}
+        for word in reference:
+            counts[word] = counts.get(word, 0) + 1
+    in_user: dict[str, int] = {}  # Word -> its position, or -1 if repeated
+    for j, word in enumerate(user):
+        if counts.get(word) == 1:
+            in_user[word] = -1 if word in in_user else j
+    pairs = [
+        (i, in_user[word])
+        for i, word in enumerate(reference)
+        if in_user.get(word, -1) >= 0
+    ]
+
+    # Longest increasing subsequence of the j's, by patience sorting.
+    tops: list[int] = []  # tops[k]: smallest last j of an increasing run of length k+1
+    top_pair: list[int] = []
+    previous: list[int] = []
+    for index, (_, j) in enumerate(pairs):
+        k = bisect.bisect_left(tops, j)
+        if k == len(tops):
+            tops.append(j)
+            top_pair.append(index)
+        else:
+            tops[k] = j
+            top_pair[k] = index
+        previous.append(top_pair[k - 1] if k > 0 else -1)
+    anchors = []
+    index = top_pair[-1] if top_pair else -1
+    while index >= 0:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def _align_stretch(
+    reference: list[str], user: list[str]
+) -> list[tuple[int | None, int | None]]:
+    """Aligns the words between two anchors with a dynamic program. The alignment
+    has as many identical pairs as possible; among those, it prefers to pair up
+    words that are similar letter by letter.
+
+    Only a band of cells around the line from (0, 0) to (n, m) is computed, so
+    that a long stretch takes linear time. The band is BAND words wide on each
+    side of the line."""
+    n, m = len(reference), len(user)
+    if n == 0 or m == 0:
+        return [(i, None) for i in range(n)] + [(None, j) for j in range(m)]
+    half_width = BAND + -(-m // n)  # Rows must overlap, however steep the line
+    # Identical words cost 0, skipping a word 1 and pairing different words a bit
+    # less than 2, less the more similar they are. All the similarity bonuses
+    # together are below 1, so they never outweigh an identical pair.
+    bonus = 1 / (min(n, m) + 1)
+    inf = float("inf")
+
+    moves: list[list[int]] = []  # 0: pair, 1: skip reference word, 2: skip user word
+    firsts: list[int] = []  # j of the first cell of each row
+    prev_costs: list[float] = []
+    prev_first = 0
+    for i in range(n + 1):
+        center = i * m // n
+        first = max(0, center - half_width)
+        last = min(m, center + half_width)
+        row_costs = []
+        row_moves = []
+        for j in range(first, last + 1):
+            best, move = (0.0, 0) if i == 0 and j == 0 else (inf, 0)
+            if j > first:
+                best, move = row_costs[-1] + 1, 2
+            k = j - prev_first  # Index of (i - 1, j) in the previous row
+            if i > 0 and k < len(prev_costs):
+                cost = prev_costs[k] + 1
+                if cost < best:
+                    best, move = cost, 1
+            if i > 0 and j > 0 and 0 < k <= len(prev_costs):
+                cost = prev_costs[k - 1]
+                if reference[i - 1] == user[j - 1]:
+                    if cost <= best:
+                        best, move = cost, 0
+                elif cost + 2 - bonus < best:
+                    cost += 2 - bonus * word_similarity(reference[i - 1], user[j - 1])
+                    if cost < best:
+                        best, move = cost, 0
+            row_costs.append(best)
+            row_moves.append(move)
+        moves.append(row_moves)
+        firsts.append(first)
+        prev_costs, prev_first = row_costs, first
+
+    alignment = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        move = moves[i][j - firsts[i]]
+        if move == 0:
+            i, j = i - 1, j - 1
+            alignment.append((i, j))
+        elif move == 1:
+            i -= 1
+            alignment.append((i, None))
+        else:
+            j -= 1
+            alignment.append((None, j))
+    alignment.reverse()
+    return alignment
+
+
+@functools.lru_cache(maxsize=4096)
+def word_similarity(a: str, b: str) -> float:
+    """1 for identical words, down to 0 for words with no letters in common."""
+    if not a and not b:
+        return 1.0
+    return 1 - levenshtein(a, b) / max(len(a), len(b))
+
+
+def levenshtein(a: str, b: str) -> int:
+    """Edit distance, computed with the bit-parallel algorithm of Myers (in the
+    formulation of Hyyrö): the column of the DP is kept as bit vectors of +1/-1
+    differences, so each letter of b costs a few integer operations."""
+    if not a:
+        return len(b)
+    mask = (1 << len(a)) - 1
+    high = 1 << (len(a) - 1)
+    peq: dict[str, int] = {}  # Letter -> bits of its positions in a
+    for i, c in enumerate(a):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    pv, mv, distance = mask, 0, len(a)
+    for c in b:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            distance += 1
+        elif mh & high:
+            distance -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+    return distance
 
 
-def highlight_sentence(correct_sentence: str, words: list[bool]) -> str:
-    reference_tokens = correct_sentence.split()
+def highlight_sentence(
+    correct_sentence: str | CompiledSentence, words: list[bool]
+) -> str:
+    reference_tokens = _compiled(correct_sentence).tokens
     formatted_text = ""
     for i, token in enumerate(reference_tokens):
         if words[i]:
@@ -0,0 +1,122 @@
+from collections.abc import Hashable, Iterator
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class IndexedHeap(Generic[K]):
+    """Binary min-heap of (priority, key) pairs that remembers where each key lives,
+    so that priorities can be changed or keys removed in O(log n).
+
+    Priorities are usually floats, but anything that supports `<` will do. Each key
+    is stored once, so the heap never holds stale entries and its size is the number
+    of keys."""
+
+    _heap: list[tuple[float, K]]
+    _pos: dict[K, int]  # key -> index in _heap
+
+    def __init__(self, items: dict[K, float] | None = None):
+        self._heap = []
+        self._pos = {}
+        if items:
+            self._heap = [(priority, key) for key, priority in items.items()]
+            self._heap.sort(key=lambda item: item[0])  # A sorted list is a valid heap
+            self._pos = {key: i for i, (_, key) in enumerate(self._heap)}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._pos
+
+    def priority(self, key: K) -> float:
+        return self._heap[self._pos[key]][0]
+
+    def peek(self) -> tuple[float, K]:
+        return self._heap[0]
+
+    def push(self, key: K, priority: float):
+        """Inserts the key, or changes its priority if it is already present."""
+        if key in self._pos:
+            self.update(key, priority)
+            return
+        self._heap.append((priority, key))
+        self._pos[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, key: K, priority: float):
+        i = self._pos[key]
+        old_priority = self._heap[i][0]
+        self._heap[i] = (priority, key)
+        if priority < old_priority:
+            self._sift_up(i)
+        else:
+            self._sift_down(i)
+
+    def pop(self) -> tuple[float, K]:
+        item = self._heap[0]
+        self.remove(item[1])
+        return item
+
+    def remove(self, key: K):
+        i = self._pos.pop(key)
+        last = self._heap.pop()
+        if i == len(self._heap):
+            return
+        self._heap[i] = last
+        self._pos[last[1]] = i
+        self._sift_up(i)
+        self._sift_down(self._pos[last[1]])
+
+    def iter_below(self, threshold: float) -> Iterator[tuple[float, K]]:
+        """Yields all items with priority <= threshold, in no particular order.
+
+        Walks only the part of the heap that can contain such items, so the cost is
+        proportional to the number of items returned, not to the size of the heap."""
+        if not self._heap:
+            return
+        stack = [0]
+        size = len(self._heap)
+        while stack:
+            i = stack.pop()
+            item = self._heap[i]
+            if item[0] > threshold:
+                continue
+            yield item
+            child = 2 * i + 1
+            if child < size:
+                stack.append(child)
+            if child + 1 < size:
+                stack.append(child + 1)
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][1]] = i
+        self._pos[heap[j][1]] = j
+
+    def _sift_up(self, i: int):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[i][0] < heap[parent][0]:
+                self._swap(i, parent)
+                i = parent
+            else:
+                break
+
+    def _sift_down(self, i: int):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = i
+            left = 2 * i + 1
+            right = left + 1
+            if left < size and heap[left][0] < heap[smallest][0]:
+                smallest = left
+            if right < size and heap[right][0] < heap[smallest][0]:
+                smallest = right
+            if smallest == i:
+                break
+            self._swap(i, smallest)
+            i = smallest
@@ -3,267 +3,23 @@
 # The main goal is to set a time limit for each question and to keep track of the number of correct answers.
 #
 
-from heapq import heappush, heappop
-
+import argparse
 import tkinter as tk
-import random
 import time
-import math
 from PIL import Image, ImageTk
 from pathlib import Path
-import json
-from abc import ABC, abstractmethod
-from overrides import overrides
-
-
-class ITask(ABC):
-    @property
-    @abstractmethod
-    def result(self) -> int: ...
-
-    @abstractmethod
-    def get_question(self) -> str: ...
-
-    @property
-    @abstractmethod
-    def difficulty_score(self): ...
-
-    @abstractmethod
-    def get_time_limit(self) -> float: ...
-
-    @property
-    @abstractmethod
-    def epoch(self) -> int:
-        return self._epoch
-
-    @epoch.setter
-    @abstractmethod
-    def epoch(self, epoch: int):
-        self._epoch = epoch
-
-
-class Mnozenie(ITask):
-    _num1: int
-    _num2: int
-    _div: bool
-    _inv: bool
-    _epoch: int
-
-    def __init__(self, num1: int, num2: int, div: bool, inv: bool, epoch: int):
-        self._num1 = num1
-        self._num2 = num2
-        self._div = div
-        self._inv = inv
-        self._epoch = epoch
-
-    @property
-    @overrides
-    def result(self) -> int:
-        if self._div:
-            if self._inv:
-                return self._num1
-            else:
-                return self._num2
-        else:
-            return self._num1 * self._num2
 
-    @overrides
-    def get_question(self) -> str:
-        if self._div:
-            if self._inv:
-                return f"{self._num1 * self._num2} / {self._num2}"
-            else:
-                return f"{self._num1 * self._num2} / {self._num1}"
-        else:
-            if self._inv:
-                return f"{self._num2} x {self._num1}"
-            else:
-                return f"{self._num1} x {self._num2}"
+from .persistence import PersistenceWriter
+from .profile_selector import ProfileSelector
+from .profiles import Profile, ProfileManager, add_profile_arguments
+from .progress_repository import (
+    IProgressRepository,
+    JsonProgressRepository,
+    SqliteProgressRepository,
+)
+from .tasks import Dodawanie, ITask, Mnozenie, Tasks
 
-    @property
-    @overrides
-    def difficulty_score(self):
-        if self._num1 == 1 or self._num2 == 1:
-            return 0
-        else:
-            # noinspection PyTypeChecker
-            return (
-                max(
-                    1,
-                    math.log(self._num2 * self._num1 + 1) / math.log(9)
-                    + math.log(min(self._num2, self._num1) + 1),
-                )
-                - 1
-            )
-
-    @overrides
-    def get_time_limit(self) -> float:
-        return 4 + self.difficulty_score * 6
-
-    @property
-    @overrides
-    def epoch(self) -> int:
-        return self._epoch
-
-    @epoch.setter
-    @overrides
-    def epoch(self, epoch: int):
-        self._epoch = epoch
-
-
-class Dodawanie(ITask):
-    _num1: int
-    _num2: int
-    _substr: bool
-    _epoch: int
-
-    def __init__(self, num1: int, num2: int, substr: bool, epoch: int):
-        self._num1 = num1
-        self._num2 = num2
-        self._substr = substr
-        self._epoch = epoch
-
-    @property
-    @overrides
-    def result(self) -> int:
-        if self._substr:
-            return self._num1 - self._num2
-        else:
-            return self._num1 + self._num2
-
-    @overrides
-    def get_question(self) -> str:
-        if self._substr:
-            return f"{self._num1} - {self._num2}"
-        else:
-            return f"{self._num1} + {self._num2}"
-
-    @property
-    @overrides
-    def difficulty_score(self):
-        if self._num1 == 1 or self._num2 == 1:
-            return 0
-        else:
-            # noinspection PyTypeChecker
-            return (
-                max(
-                    1,
-                    math.log(self._num2 * self._num1 + 1) / math.log(9)
-                    + math.log(min(self._num2, self._num1) + 1),
-                )
-                - 1
-            )
-
-    @overrides
-    def get_time_limit(self) -> float:
-        return 8 + self.difficulty_score * 30
-
-    @property
-    @overrides
-    def epoch(self) -> int:
-        return self._epoch
-
-    @epoch.setter
-    @overrides
-    def epoch(self, epoch: int):
-        self._epoch = epoch
-
-
-class Tasks:
-    _tasks: list[ITask]
-    _epoch: int
-    _performance: dict[
-        str, tuple[int, int, list[bool]]
-    ]  # mapping: question -> history of correctness of answers
-
-    @staticmethod
-    def CreateFromJSON(json_file: Path = "performance.json"):
-        with open(json_file, "r") as f:
-            performance = json.load(f)
-        tasks = Tasks(10, 100, 10)
-        for question, answers in performance.items():
-            if isinstance(answers, list) and len(answers) == 3:
-                correct, total, history = answers
-            else:
-                correct = sum(answers)
-                total = len(answers)
-                history = answers
-            tasks._performance[question] = (correct, total, [bool(x) for x in history])
-        return tasks
-
-    def serialize_performance(self, json_file: Path = "performance.json"):
-        with open(json_file, "w") as f:
-            json.dump(self._performance, f)
-
-    def __init__(self, max_num: int, max_result: float, min_result: float):
-        self._tasks = []
-        self._performance = {}
-        self._epoch = 0
-        for i in range(1, max_num):
-            for j in range(i, max_num):
-                if i * j <= max_result and i * j >= min_result:
-                    task = Mnozenie(i, j, False, False, 0)
-                    self._tasks.append(task)
-                    self._performance[task.get_question()] = (
-                        0,
-                        0,
-                        [False, False, False, False],
-                    )
-                    task = Mnozenie(i, j, True, False, 0)
-                    self._tasks.append(task)
-                    self._performance[task.get_question()] = (
-                        0,
-                        0,
-                        [False, False, False, False],
-                    )
-                    if i != j:
-                        task = Mnozenie(i, j, False, True, 0)
-                        self._tasks.append(task)
-                        self._performance[task.get_question()] = (
-                            0,
-                            0,
-                            [False, False, False, False],
-                        )
-                        task = Mnozenie(i, j, True, True, 0)
-                        self._tasks.append(task)
-                        self._performance[task.get_question()] = (
-                            0,
-                            0,
-                            [False, False, False, False],
-                        )
-
-    def task_fitness(self, task: ITask) -> float:
-        """Returns the fitness of a task to get presented to the user based on how long it has been since it was last presented,
-        and how well the user has been doing on it"""
-        # epoch_component = (self._epoch - task.epoch) * 0.1
-        correct, total, history = self._performance[task.get_question()]
-        total = max(1, total)
-        performance_last_4 = sum(history) / len(history)
-        performance_total = correct / total
-
-        performance = performance_total * 0.5 + performance_last_4 * 0.5
-
-        ans = 1 - performance  # * (1 + epoch_component)
-        random_factor = random.uniform(-0.1, 0.1)
-        return -ans + random_factor
-
-    def get_next_task(self) -> ITask:
-        heap = []
-        for i, task in enumerate(self._tasks):
-            heappush(heap, (self.task_fitness(task), i, task))
-        self._epoch += 1
-        task = heappop(heap)[2]
-        task.epoch = self._epoch
-        return task
-
-    def give_feedback(self, task: ITask, correct: bool):
-        correct_count, total, history = self._performance[task.get_question()]
-        history.append(correct)
-        history.pop(0)
-        if correct:
-            correct_count += 1
-        total += 1
-        self._performance[task.get_question()] = (correct_count, total, history)
+__all__ = ["Dodawanie", "ITask", "Mnozenie", "MnozenieApp", "Tasks", "main"]
 
 
 class MnozenieApp:
@@ -273,18 +29,37 @@ class MnozenieApp:
     _task: ITask
     _repetition: bool
     _perf_file: Path
-
-    def __init__(self):
+    _writer: PersistenceWriter
+    _profiles: ProfileManager | None
+    _profile: Profile
+
+    def __init__(
+        self,
+        repository: IProgressRepository | None = None,
+        profiles: ProfileManager | None = None,
+        profile: str | None = None,
+        writer: PersistenceWriter | None = None,
+    ):
+        """Without profiles, the progress goes to the repository (performance.json
+        next to the package by default). With them, to the given profile, and the
+        window gets a profile selector."""
         self.window = tk.Tk()
         self.window.title("Mnozenie i dodawanie")
 
         root_path = Path(__file__).parent
         self._perf_file = root_path / "performance.json"
 
-        if self._perf_file.exists():
-            self._tasks = Tasks.CreateFromJSON(self._perf_file)
+        self._writer = writer if writer is not None else PersistenceWriter()
+        self._profiles = profiles
+        if profiles is not None:
+            self._profile = profiles.get(profile)
         else:
-            self._tasks = Tasks(10, 100, 10)
+            if repository is None:
+                repository = JsonProgressRepository(
+                    self._perf_file, writer=self._writer
+                )
+            self._profile = Profile("", root_path, repository)
+        self._tasks = self._profile.tasks
 
         self._repetition = False
 
@@ -294,6 +69,11 @@ class MnozenieApp:
         self.slow_responses = 0
         self.retries = 0
 
+        if profiles is not None:
+            ProfileSelector(
+                self.window, profiles, self._profile.name, self.switch_profile
+            ).pack()
+
         self.question_label = tk.Label(self.window, text="")
         self.question_label.pack()
 
@@ -308,6 +88,7 @@ class MnozenieApp:
 
         self.quit_button = tk.Button(self.window, text="Quit", command=self.quit_app)
         self.quit_button.pack()
+        self.window.protocol("WM_DELETE_WINDOW", self.quit_app)
 
         self.score_label = tk.Label(self.window, text="Score: 0")
         self.score_label.pack()
@@ -341,8 +122,19 @@ class MnozenieApp:
         self.new_question()
 
     def quit_app(self):
+        if self._profiles is not None:
+            self._profiles.close()
+        else:
+            self._profile.close()
+        self._writer.close()
         self.window.destroy()
 
+    def switch_profile(self, name: str):
+        self._profile = self._profiles.get(name)
+        self._tasks = self._profile.tasks
+        self._repetition = False
+        self.new_question()
+
     def new_question(self):
         self._task = self._tasks.get_next_task()
 
@@ -377,7 +169,6 @@ class MnozenieApp:
             self.show_failure(answer)
             self._repetition = True
             self._tasks.give_feedback(self._task, False)
-        self._tasks.serialize_performance(self._perf_file)
 
     def show_success(self):
         self.success_label.pack()
@@ -408,7 +199,31 @@ class MnozenieApp:
 
 
 def main():
-    app = MnozenieApp()
+    parser = argparse.ArgumentParser(description="Multiplication and addition practice")
+    parser.add_argument(
+        "--database",
+        metavar="FILE",
+        type=Path,
+        help="Keep the progress in this SQLite database (it can be shared with "
+        "czytanie). A new database imports performance.json",
+    )
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        writer = PersistenceWriter()
+        profiles = ProfileManager(
+            args.profiles, use_database=args.profile_database, writer=writer
+        )
+        app = MnozenieApp(profiles=profiles, profile=args.profile, writer=writer)
+    else:
+        repository = None
+        if args.database is not None:
+            repository = SqliteProgressRepository(
+                args.database,
+                performance_file=Path(__file__).parent / "performance.json",
+            )
+        app = MnozenieApp(repository)
     app.window.mainloop()
 
 
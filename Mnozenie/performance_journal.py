@@ -0,0 +1,113 @@
+import json
+from pathlib import Path
+
+from .persistence import PersistenceWriter, write_atomically
+
+
+class PerformanceJournal:
+    """Append-only log of answers, kept next to the performance.json snapshot.
+
+    Every answer is one line "<seq> <0|1> <question>" appended to
+    performance.json.journal. Every COMPACT_EVERY answers the whole state is written
+    into the snapshot (atomically, together with the seq of the last answer it
+    contains) and the journal is emptied. On load, answers with seq not greater than
+    the snapshot's one are already in the snapshot and are skipped, so a crash at any
+    point leaves a readable state. A line cut in half by a crash is dropped.
+
+    If a PersistenceWriter is given, the writes are done on its thread. It keeps the
+    order of the writes, so the above still holds."""
+
+    COMPACT_EVERY = 1000
+
+    snapshot_file: Path
+    journal_file: Path
+    _seq: int  # seq of the last answer written
+    _pending: int  # answers in the journal that are not in the snapshot
+    _writer: PersistenceWriter | None
+    _file = None
+
+    def __init__(self, snapshot_file: Path, writer: PersistenceWriter | None = None):
+        self.snapshot_file = Path(snapshot_file)
+        self._writer = writer
+        self.journal_file = self.snapshot_file.with_name(
+            self.snapshot_file.name + ".journal"
+        )
+        self._seq = 0
+        self._pending = 0
+
+    def load(self) -> tuple[dict, list[tuple[str, bool]]]:
+        """Returns the content of the snapshot (question -> answers, in any of the
+        formats accepted by Tasks.CreateFromJSON) and the answers given after it."""
+        performance = {}
+        snapshot_seq = 0
+        if self.snapshot_file.exists():
+            with open(self.snapshot_file, "r") as f:
+                data = json.load(f)
+            if "performance" in data and "seq" in data:
+                performance = data["performance"]
+                snapshot_seq = data["seq"]
+            else:  # Written before the journal existed
+                performance = data
+
+        answers = []
+        self._seq = snapshot_seq
+        if self.journal_file.exists():
+            with open(self.journal_file, "rb") as f:
+                content = f.read()
+            complete = content.rfind(b"\n") + 1
+            if complete < len(content):
+                # Drop the torn last line, so the next answer starts on a new line.
+                with open(self.journal_file, "r+b") as f:
+                    f.truncate(complete)
+            for line in content[:complete].decode().splitlines():
+                try:
+                    seq, correct, question = line.split(" ", 2)
+                    seq = int(seq)
+                except ValueError:
+                    continue
+                if seq <= snapshot_seq:
+                    continue
+                answers.append((question, correct == "1"))
+                self._seq = max(self._seq, seq)
+        self._pending = len(answers)
+        return performance, answers
+
+    def append(self, question: str, correct: bool) -> bool:
+        """Logs the answer. Returns True if it is time to call compact()."""
+        self._seq += 1
+        line = f"{self._seq} {int(correct)} {question}\n".encode()
+        if self._writer is not None:
+            self._writer.append(self.journal_file, line)
+        else:
+            if self._file is None:
+                # Kept open between the answers; close() (or __del__) closes it.
+                self._file = open(self.journal_file, "ab")  # noqa: SIM115
+            try:
+                self._file.write(line)
+                self._file.flush()
+            except OSError:
+                self.close()  # Reopened by the next answer
+                raise
+        self._pending += 1
+        return self._pending >= self.COMPACT_EVERY
+
+    def compact(self, performance: dict):
+        """Writes the full state into the snapshot and empties the journal."""
+        snapshot = {"seq": self._seq, "performance": performance}
+        self._pending = 0
+        if self._writer is not None:
+            self._writer.save(self.snapshot_file, lambda: json.dumps(snapshot).encode())
+            self._writer.save(self.journal_file, lambda: b"")
+            return
+        write_atomically(self.snapshot_file, json.dumps(snapshot).encode())
+        self.close()
+        with open(self.journal_file, "wb"):
+            pass
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        self.close()
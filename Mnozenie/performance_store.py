@@ -0,0 +1,141 @@
+import numpy as np
+
+HISTORY_LENGTH = 4  # Number of recent answers that are remembered for each question
+
+# Number of set bits for each possible history value
+_POPCOUNT = np.array([int(i).bit_count() for i in range(1 << HISTORY_LENGTH)], np.int64)
+_HISTORY_MASK = (1 << HISTORY_LENGTH) - 1
+
+
+def pack_history(history: list[bool]) -> int:
+    """The last HISTORY_LENGTH answers as bits, bit 0 is the most recent one."""
+    bits = 0
+    for answer in history[-HISTORY_LENGTH:]:
+        bits = (bits << 1) | bool(answer)
+    return bits
+
+
+def unpack_history(bits: int) -> list[bool]:
+    """Inverse of pack_history(), padded with failures to HISTORY_LENGTH."""
+    return [bool(bits >> i & 1) for i in range(HISTORY_LENGTH - 1, -1, -1)]
+
+
+def parse_stats(answers: list) -> tuple[int, int, list[bool]]:
+    """(correct, total, history) from an entry of performance.json: either already
+    in that format, or the legacy list of all the answers."""
+    if isinstance(answers, list) and len(answers) == 3 and isinstance(answers[2], list):
+        correct, total, history = answers
+        return correct, total, history
+    return sum(answers), len(answers), list(answers)
+
+
+class PerformanceStore:
+    """Answer statistics of all questions, kept as a struct of NumPy arrays.
+
+    Each question gets an integer id (its row). For each row we keep the number of
+    correct answers, the number of all answers and the last HISTORY_LENGTH answers
+    packed into bits (bit 0 is the most recent answer)."""
+
+    _ids: dict[str, int]  # question -> row
+    _questions: list[str]  # row -> question
+    _correct: np.ndarray  # int64
+    _total: np.ndarray  # int64
+    _history: np.ndarray  # uint8, bit-packed
+    _size: int
+
+    def __init__(self, capacity: int = 16):
+        self._ids = {}
+        self._questions = []
+        self._size = 0
+        self._correct = np.zeros(capacity, np.int64)
+        self._total = np.zeros(capacity, np.int64)
+        self._history = np.zeros(capacity, np.uint8)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, question: str) -> bool:
+        return question in self._ids
+
+    def get_id(self, question: str) -> int | None:
+        return self._ids.get(question)
+
+    def question(self, question_id: int) -> str:
+        return self._questions[question_id]
+
+    def add(self, question: str) -> int:
+        """Returns the id of the question, adding an empty row for it if it is new."""
+        question_id = self._ids.get(question)
+        if question_id is not None:
+            return question_id
+        if self._size == len(self._correct):
+            self._grow()
+        question_id = self._size
+        self._size += 1
+        self._ids[question] = question_id
+        self._questions.append(question)
+        return question_id
+
+    def _grow(self):
+        capacity = max(16, 2 * len(self._correct))
+        self._correct = np.resize(self._correct, capacity)
+        self._total = np.resize(self._total, capacity)
+        self._history = np.resize(self._history, capacity)
+        self._correct[self._size :] = 0
+        self._total[self._size :] = 0
+        self._history[self._size :] = 0
+
+    def set(self, question: str, correct: int, total: int, history: list[bool]):
+        """Overwrites the statistics of the question. Only the last HISTORY_LENGTH
+        entries of the history are kept; shorter histories are padded with failures."""
+        question_id = self.add(question)
+        self._correct[question_id] = correct
+        self._total[question_id] = total
+        self._history[question_id] = pack_history(history)
+
+    def get(self, question: str) -> tuple[int, int, list[bool]]:
+        """Statistics in the format of the performance.json: (correct, total, history),
+        with history ordered from the oldest to the most recent answer."""
+        question_id = self._ids[question]
+        history = unpack_history(int(self._history[question_id]))
+        return int(self._correct[question_id]), int(self._total[question_id]), history
+
+    def items(self):
+        for question in self._questions:
+            yield question, self.get(question)
+
+    def as_dict(self) -> dict[str, tuple[int, int, list[bool]]]:
+        return dict(self.items())
+
+    def record(self, question_id: int, correct: bool):
+        self._history[question_id] = (
+            (int(self._history[question_id]) << 1) | correct
+        ) & _HISTORY_MASK
+        self._correct[question_id] += bool(correct)
+        self._total[question_id] += 1
+
+    def fitness_of(self, question_id: int) -> float:
+        """Fitness (without the random factor) of a single question. Gives exactly
+        the same number as the matching element of `fitness()`."""
+        total = max(1, int(self._total[question_id]))
+        performance_last = int(_POPCOUNT[self._history[question_id]]) / HISTORY_LENGTH
+        performance_total = int(self._correct[question_id]) / total
+        performance = performance_total * 0.5 + performance_last * 0.5
+        return -(1 - performance)
+
+    def fitness(
+        self, rng: np.random.Generator | None = None, jitter: float = 0.0
+    ) -> np.ndarray:
+        """Fitness of all questions at once. Lower is presented sooner.
+
+        If rng is given, a random factor from [-jitter, jitter] is added to each
+        element, drawn in a single batch."""
+        n = self._size
+        total = np.maximum(self._total[:n], 1)
+        performance_last = _POPCOUNT[self._history[:n]] / HISTORY_LENGTH
+        performance_total = self._correct[:n] / total
+        performance = performance_total * 0.5 + performance_last * 0.5
+        ans = -(1 - performance)
+        if rng is not None:
+            ans += rng.uniform(-jitter, jitter, n)
+        return ans
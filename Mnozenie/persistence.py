@@ -0,0 +1,171 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from pathlib import Path
+
+
+def write_atomically(path: Path, data: bytes):
+    """Writes the file so that it is either fully replaced or left untouched,
+    even if the process gets killed in the middle."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PersistenceError(RuntimeError):
+    """Raised by flush()/close() of a PersistenceWriter when writes have failed
+    since the last report. `failures` has the path and the exception of each."""
+
+    failures: list[tuple[Path, Exception]]
+
+    def __init__(self, failures: list[tuple[Path, Exception]]):
+        paths = ", ".join(str(path) for path, _ in failures)
+        super().__init__(f"Failed to write {paths}")
+        self.failures = failures
+
+
+class PersistenceWriter:
+    """Does the file writes of the GUI on a background thread.
+
+    Operations are executed in the order they were requested, in batches. A batch is
+    written when the oldest pending operation is `delay` seconds old, when there are
+    `max_pending` requests waiting, or on flush()/close(). Until then, repeated save()
+    of the same file are coalesced: only the latest content gets written, in the place
+    of the first request. save() replaces the file atomically (temp file + rename);
+    append() adds bytes to the end of the file.
+
+    The producer passed to save() is called on the worker thread, so it must not
+    touch state that the caller keeps modifying - pass it a copy.
+
+    A failed write is printed to stderr, and the next flush() or close() raises a
+    PersistenceError about it; the worker keeps going with the other writes."""
+
+    delay: float
+    max_pending: int
+    _ops: list[list]  # [kind, path, payload], in the order of requests
+    _saves: dict[Path, list]  # path -> its pending save operation
+    _pending: int
+    _first_dirty: float | None
+    _flushing: int
+    _writing: bool
+    _closed: bool
+    _failures: list[tuple[Path, Exception]]  # Not reported by flush()/close() yet
+    _cond: threading.Condition
+    _thread: threading.Thread
+
+    def __init__(self, delay: float = 2.0, max_pending: int = 100):
+        self.delay = delay
+        self.max_pending = max_pending
+        self._ops = []
+        self._saves = {}
+        self._pending = 0
+        self._first_dirty = None
+        self._flushing = 0
+        self._writing = False
+        self._closed = False
+        self._failures = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name="PersistenceWriter", daemon=True
+        )
+        self._thread.start()
+
+    def save(self, path: Path, producer: Callable[[], bytes]):
+        path = Path(path)
+        with self._cond:
+            op = self._saves.get(path)
+            if op is None:
+                op = ["save", path, producer]
+                self._ops.append(op)
+                self._saves[path] = op
+            else:
+                op[2] = producer
+            self._mark_dirty()
+
+    def append(self, path: Path, data: bytes):
+        path = Path(path)
+        with self._cond:
+            if self._ops and self._ops[-1][0] == "append" and self._ops[-1][1] == path:
+                self._ops[-1][2].append(data)
+            else:
+                self._ops.append(["append", path, [data]])
+            self._mark_dirty()
+
+    def _mark_dirty(self):
+        if self._closed:
+            raise RuntimeError("PersistenceWriter is closed")
+        self._pending += 1
+        if self._first_dirty is None:
+            self._first_dirty = time.monotonic()
+        self._cond.notify_all()
+
+    def flush(self):
+        """Blocks until everything requested so far is on disk."""
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            while self._ops or self._writing:
+                self._cond.wait()
+            self._flushing -= 1
+        self._raise_failures()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._raise_failures()
+
+    def _raise_failures(self):
+        with self._cond:
+            failures, self._failures = self._failures, []
+        if failures:
+            raise PersistenceError(failures) from failures[0][1]
+
+    def _batch_due(self) -> bool:
+        if not self._ops:
+            return False
+        if self._closed or self._flushing or self._pending >= self.max_pending:
+            return True
+        return time.monotonic() - self._first_dirty >= self.delay
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._batch_due():
+                    if self._closed and not self._ops:
+                        return
+                    timeout = None
+                    if self._ops:
+                        timeout = self.delay - (time.monotonic() - self._first_dirty)
+                    self._cond.wait(timeout)
+                ops = self._ops
+                self._ops = []
+                self._saves = {}
+                self._pending = 0
+                self._first_dirty = None
+                self._writing = True
+            try:
+                for kind, path, payload in ops:
+                    try:
+                        if kind == "save":
+                            write_atomically(path, payload())
+                        else:
+                            with open(path, "ab") as f:
+                                f.write(b"".join(payload))
+                    except Exception as e:  # Keep the worker alive, retry on next save
+                        print(f"Failed to write {path}:", file=sys.stderr)
+                        traceback.print_exc()
+                        with self._cond:
+                            self._failures.append((path, e))
+            finally:
+                with self._cond:
+                    self._writing = False
+                    self._cond.notify_all()
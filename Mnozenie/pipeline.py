@@ -0,0 +1,117 @@
+import queue
+import time
+import tkinter as tk
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+
+class Job:
+    """A function running on a worker thread of the Pipeline."""
+
+    future: Future
+    on_done: Callable[[Any], None]
+    on_error: Callable[[Exception], None] | None
+    deadline: float | None
+    cancelled: bool
+
+    def __init__(self, on_done, on_error, deadline):
+        self.on_done = on_done
+        self.on_error = on_error
+        self.deadline = deadline
+        self.cancelled = False
+
+    def cancel(self):
+        """The callbacks of a cancelled job are never called. The function itself
+        is not interrupted, its result just gets dropped."""
+        self.cancelled = True
+        self.future.cancel()
+
+    @property
+    def pending(self) -> bool:
+        return not self.cancelled and not self.future.done()
+
+
+class Pipeline:
+    """Runs slow work (transcription, scoring) on worker threads, and calls the
+    callbacks with the results on the Tk thread.
+
+    Tk must only be touched from its own thread, so the workers put the finished
+    jobs on a queue, which the Tk thread polls with window.after()."""
+
+    POLL_MS = 20
+
+    _window: tk.Misc
+    _executor: ThreadPoolExecutor
+    _finished: queue.Queue
+    _calls: queue.Queue  # (fn, args) to call on the Tk thread
+    _jobs: set[Job]
+
+    def __init__(self, window: tk.Misc, max_workers: int = 2):
+        self._window = window
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="pipeline")
+        self._finished = queue.Queue()
+        self._calls = queue.Queue()
+        self._jobs = set()
+        self._window.after(self.POLL_MS, self._poll)
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        on_done: Callable[[Any], None],
+        on_error: Callable[[Exception], None] | None = None,
+        timeout: float | None = None,
+    ) -> Job:
+        """Runs fn(*args) on a worker thread. Then, on the Tk thread, calls on_done
+        with its result, or on_error with the exception it raised. If the result is
+        not there after `timeout` seconds, the job is cancelled and on_error gets a
+        TimeoutError."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = Job(on_done, on_error, deadline)
+        job.future = self._executor.submit(fn, *args)
+        job.future.add_done_callback(lambda _: self._finished.put(job))
+        self._jobs.add(job)
+        return job
+
+    def call_soon(self, fn: Callable[..., Any], *args):
+        """Calls fn(*args) on the Tk thread. Can be called from any thread."""
+        self._calls.put((fn, args))
+
+    def _poll(self):
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            fn(*args)
+
+        while True:
+            try:
+                job = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._jobs.discard(job)
+            if job.cancelled:
+                continue
+            error = job.future.exception()
+            if error is None:
+                job.on_done(job.future.result())
+            elif job.on_error is not None:
+                job.on_error(error)
+            else:
+                print(f"Background job failed: {error!r}")
+
+        now = time.monotonic()
+        for job in [j for j in self._jobs if j.deadline is not None]:
+            if now >= job.deadline and job.pending:
+                job.cancel()
+                self._jobs.discard(job)
+                if job.on_error is not None:
+                    job.on_error(TimeoutError("Background job timed out"))
+        self._window.after(self.POLL_MS, self._poll)
+
+    def shutdown(self):
+        for job in self._jobs:
+            job.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,65 @@
+import tkinter as tk
+from collections.abc import Callable
+
+from .profiles import ProfileManager
+
+
+class ProfileSelector(tk.Frame):
+    """A drop-down list of the profiles, and a field to add a new one. Calls
+    on_select with the name of the chosen profile."""
+
+    _profiles: ProfileManager
+    _on_select: Callable[[str], None]
+    _current: tk.StringVar
+    _menu: tk.OptionMenu
+    _new_name: tk.Entry
+    _error: tk.Label
+
+    def __init__(
+        self,
+        master: tk.Misc,
+        profiles: ProfileManager,
+        current: str,
+        on_select: Callable[[str], None],
+        **kwargs,
+    ):
+        super().__init__(master, **kwargs)
+        self._profiles = profiles
+        self._on_select = on_select
+        self._current = tk.StringVar(self, current)
+        tk.Label(self, text="Profile:").pack(side=tk.LEFT)
+        self._menu = tk.OptionMenu(self, self._current, current)
+        self._menu.pack(side=tk.LEFT)
+        self._new_name = tk.Entry(self, width=12)
+        self._new_name.pack(side=tk.LEFT)
+        self._new_name.bind("<Return>", lambda event: self._add())
+        tk.Button(self, text="Add", command=self._add).pack(side=tk.LEFT)
+        self._error = tk.Label(self, fg="red")
+        self._error.pack(side=tk.LEFT)
+        self._refresh()
+
+    def _refresh(self):
+        menu = self._menu["menu"]
+        menu.delete(0, tk.END)
+        for name in self._profiles.names():
+            menu.add_command(label=name, command=lambda name=name: self._select(name))
+
+    def _select(self, name: str):
+        if name == self._current.get():
+            return
+        self._current.set(name)
+        self._on_select(name)
+
+    def _add(self):
+        name = self._new_name.get().strip()
+        if not name:
+            return
+        try:
+            self._profiles.get(name)
+        except ValueError as e:
+            self._error.config(text=str(e))
+            return
+        self._error.config(text="")
+        self._new_name.delete(0, tk.END)
+        self._refresh()
+        self._select(name)
@@ -0,0 +1,244 @@
+import argparse
+import sys
+import traceback
+from collections import OrderedDict
+from collections.abc import Container
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .attempt_archive import AttemptArchive
+from .persistence import PersistenceWriter
+from .progress_repository import (
+    IProgressRepository,
+    JsonProgressRepository,
+    SqliteProgressRepository,
+)
+from .sentence_store import ScoringServer
+from .tasks import Tasks
+
+
+class Profile:
+    """The progress of one learner. Each part (the Tasks of mnozenie, the
+    ScoringServer and the AttemptArchive of czytanie) is loaded on first use, so
+    that a profile used by only one of the apps does not load the other's state."""
+
+    name: str
+    directory: Path
+    repository: IProgressRepository
+    sentences_file: Path
+    _writer: PersistenceWriter | None
+    _tasks: Tasks | None
+    _scoring_server: ScoringServer | None
+    _archive: AttemptArchive | None
+
+    def __init__(
+        self,
+        name: str,
+        directory: Path,
+        repository: IProgressRepository,
+        sentences_file: Path = Path("czytanie-sentences.txt"),
+        writer: PersistenceWriter | None = None,
+    ):
+        self.name = name
+        self.directory = Path(directory)
+        self.repository = repository
+        self.sentences_file = Path(sentences_file)
+        self._writer = writer
+        self._tasks = None
+        self._scoring_server = None
+        self._archive = None
+
+    @property
+    def tasks(self) -> Tasks:
+        if self._tasks is None:
+            self._tasks = Tasks.CreateFromRepository(self.repository)
+        return self._tasks
+
+    @property
+    def scoring_server(self) -> ScoringServer:
+        if self._scoring_server is None:
+            self._scoring_server = ScoringServer(
+                store=self.repository.sentence_store(self.sentences_file)
+            )
+        return self._scoring_server
+
+    @property
+    def archive(self) -> AttemptArchive:
+        if self._archive is None:
+            self._archive = AttemptArchive(self.directory / "recordings", self._writer)
+        return self._archive
+
+    def load_totals(self) -> dict[str, float]:
+        return self.repository.load_totals()
+
+    def save_totals(self, totals: dict[str, float]):
+        self.repository.save_totals(totals)
+
+    def close(self):
+        """Saves everything that was loaded and closes the repository."""
+        if self._tasks is not None:
+            self._tasks.save()
+        if self._scoring_server is not None:
+            self._scoring_server.close()
+        self.repository.close()
+        if self._writer is not None:
+            self._writer.flush()  # Loading the profile again reads the files
+
+
+class ProfileManager:
+    """The profiles of the learners, one directory each under `root`.
+
+    A profile keeps its progress in the JSON files of JsonProgressRepository, or,
+    with use_database, in its own SQLite database (which imports the JSON files
+    found in the directory, once). Profiles are loaded on first use and at most
+    max_loaded stay in memory: getting one more unloads the least recently used
+    one, which is saved and closed on a background thread. Getting it again waits
+    for that. Not thread-safe."""
+
+    DATABASE_FILE = "progress.sqlite"
+
+    root: Path
+    sentences_file: Path
+    use_database: bool
+    max_loaded: int
+    _writer: PersistenceWriter | None
+    _loaded: OrderedDict[str, Profile]  # Least recently used first
+    _executor: ThreadPoolExecutor  # Closes the evicted profiles
+    _closing: dict[str, Future]  # Name -> close() of its evicted Profile
+
+    def __init__(
+        self,
+        root: Path = Path("profiles"),
+        sentences_file: Path = Path("czytanie-sentences.txt"),
+        use_database: bool = False,
+        max_loaded: int = 8,
+        writer: PersistenceWriter | None = None,
+    ):
+        self.root = Path(root)
+        self.sentences_file = Path(sentences_file)
+        self.use_database = use_database
+        self.max_loaded = max_loaded
+        self._writer = writer
+        self._loaded = OrderedDict()
+        self._executor = ThreadPoolExecutor(1, "ProfileManager")
+        self._closing = {}
+
+    def names(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(path.name for path in self.root.iterdir() if path.is_dir())
+
+    def __contains__(self, name: str) -> bool:
+        return (self.root / name).is_dir()
+
+    def get(self, name: str) -> Profile:
+        """The profile, loaded if needed. A new name creates the profile."""
+        profile = self._loaded.get(name)
+        if profile is not None:
+            self._loaded.move_to_end(name)
+            return profile
+        closing = self._closing.pop(name, None)
+        if closing is not None:  # Its files are still being written
+            wait([closing])
+        profile = self.open(name)
+        for evicted in self.add(profile):
+            self._close_later(evicted)
+        return profile
+
+    def _close_later(self, profile: Profile):
+        closing = self._executor.submit(profile.close)
+        self._closing = {n: f for n, f in self._closing.items() if not f.done()}
+        self._closing[profile.name] = closing
+
+        def done(future: Future):
+            if future.exception() is not None:
+                print(f"Failed to close the profile {profile.name}:", file=sys.stderr)
+                traceback.print_exception(future.exception())
+
+        closing.add_done_callback(done)
+
+    def open(self, name: str) -> Profile:
+        """A new Profile object, not added to the loaded ones. With add(), this lets
+        the loading run on another thread than the one using the profiles."""
+        if not name or name != Path(name).name or name.startswith("."):
+            raise ValueError(f"Invalid profile name: {name!r}")
+        directory = self.root / name
+        directory.mkdir(parents=True, exist_ok=True)
+        return Profile(
+            name,
+            directory,
+            self._repository(directory),
+            self.sentences_file,
+            self._writer,
+        )
+
+    def add(self, profile: Profile, keep: Container[str] = ()) -> list[Profile]:
+        """Adds a profile from open() to the loaded ones. Returns the profiles it
+        evicted, which the caller must close(). Profiles named in `keep` are not
+        evicted, even if that leaves more than max_loaded in memory."""
+        self._loaded[profile.name] = profile
+        self._loaded.move_to_end(profile.name)
+        excess = len(self._loaded) - self.max_loaded
+        if excess <= 0:
+            return []
+        evicted = []
+        for name in list(self._loaded)[:-1]:
+            if name not in keep:
+                evicted.append(self._loaded.pop(name))
+                if len(evicted) == excess:
+                    break
+        return evicted
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._loaded
+
+    def _repository(self, directory: Path) -> IProgressRepository:
+        json_repository = JsonProgressRepository(
+            directory / "performance.json",
+            directory / "total_scores.json",
+            directory / "czytanie-scores.json",
+            self._writer,
+        )
+        if not self.use_database:
+            return json_repository
+        return SqliteProgressRepository(
+            directory / self.DATABASE_FILE,
+            json_repository.performance_file,
+            json_repository.totals_file,
+            json_repository.scores_file,
+        )
+
+    def loaded(self) -> list[str]:
+        """Names of the profiles in memory, the least recently used first."""
+        return list(self._loaded)
+
+    def close(self):
+        """Closes the loaded profiles, and waits for the evicted ones."""
+        self._executor.shutdown()
+        self._closing = {}
+        while self._loaded:
+            _, profile = self._loaded.popitem()
+            profile.close()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """The command line options of the apps for choosing the profile."""
+    parser.add_argument(
+        "--profile",
+        metavar="NAME",
+        help="Practice as this learner (a new name creates the profile). Adds a "
+        "profile selector to the window",
+    )
+    parser.add_argument(
+        "--profiles",
+        metavar="DIR",
+        type=Path,
+        default=Path("profiles"),
+        help="Directory of the profiles (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile-database",
+        action="store_true",
+        help="Keep the progress of each profile in an SQLite database instead of "
+        "JSON files",
+    )
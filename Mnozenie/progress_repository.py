@@ -0,0 +1,258 @@
+import json
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from overrides import overrides
+
+from .performance_journal import PerformanceJournal
+from .performance_store import (
+    HISTORY_LENGTH,
+    PerformanceStore,
+    pack_history,
+    parse_stats,
+    unpack_history,
+)
+from .persistence import PersistenceWriter, write_atomically
+from .sentence_store import ISentenceStore, JsonSentenceStore, SqliteSentenceStore
+from .sqlite_db import SqliteDatabase
+
+
+class IProgressRepository(ABC):
+    """Where the apps keep the progress of the learner: the answer statistics of
+    Tasks, the sentence scores of czytanie and its running totals."""
+
+    @abstractmethod
+    def load_performance(self, store: PerformanceStore):
+        """Fills the store with the saved answer statistics."""
+
+    @abstractmethod
+    def record_answer(self, question: str, correct: bool) -> bool:
+        """Saves one answer. Returns True if it is time to call save_performance()."""
+
+    @abstractmethod
+    def save_performance(self, performance: dict[str, tuple[int, int, list[bool]]]):
+        """Saves the full statistics, in the format of PerformanceStore.as_dict()."""
+
+    @abstractmethod
+    def load_totals(self) -> dict[str, float]: ...
+
+    @abstractmethod
+    def save_totals(self, totals: dict[str, float]): ...
+
+    @abstractmethod
+    def sentence_store(self, input_file: Path) -> ISentenceStore:
+        """The scores of the sentences of the file."""
+
+    def close(self):
+        pass
+
+
+class JsonProgressRepository(IProgressRepository):
+    """The JSON files the apps have always used: performance.json with its journal,
+    total_scores.json and czytanie-scores.json. A file is only touched when its
+    part of the progress is used."""
+
+    performance_file: Path
+    totals_file: Path
+    scores_file: Path
+    _writer: PersistenceWriter | None
+    _journal: PerformanceJournal
+
+    def __init__(
+        self,
+        performance_file: Path = Path("performance.json"),
+        totals_file: Path = Path("total_scores.json"),
+        scores_file: Path = Path("czytanie-scores.json"),
+        writer: PersistenceWriter | None = None,
+    ):
+        self.performance_file = Path(performance_file)
+        self.totals_file = Path(totals_file)
+        self.scores_file = Path(scores_file)
+        self._writer = writer
+        self._journal = PerformanceJournal(self.performance_file, writer)
+
+    @overrides
+    def load_performance(self, store: PerformanceStore):
+        snapshot, journaled = self._journal.load()
+        for question, answers in snapshot.items():
+            store.set(question, *parse_stats(answers))
+        for question, correct in journaled:
+            store.record(store.add(question), correct)
+
+    @overrides
+    def record_answer(self, question: str, correct: bool) -> bool:
+        return self._journal.append(question, correct)
+
+    @overrides
+    def save_performance(self, performance: dict[str, tuple[int, int, list[bool]]]):
+        self._journal.compact(performance)
+
+    @overrides
+    def load_totals(self) -> dict[str, float]:
+        try:
+            with open(self.totals_file, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @overrides
+    def save_totals(self, totals: dict[str, float]):
+        totals = dict(totals)
+        if self._writer is not None:
+            self._writer.save(
+                self.totals_file, lambda: json.dumps(totals, indent=4).encode()
+            )
+        else:
+            write_atomically(self.totals_file, json.dumps(totals, indent=4).encode())
+
+    @overrides
+    def sentence_store(self, input_file: Path) -> ISentenceStore:
+        return JsonSentenceStore(input_file, str(self.scores_file), self._writer)
+
+    @overrides
+    def close(self):
+        self._journal.close()
+
+
+class SqliteProgressRepository(IProgressRepository):
+    """All the progress in one SQLite database (see SqliteDatabase), which both apps
+    can share.
+
+    Every answer updates one row of the statistics and adds one row to the
+    `answers` log, in batched transactions, so nothing is ever rewritten in full
+    and the history can be queried (see weakest_questions() and
+    answers_between()). The JSON files of JsonProgressRepository that are given
+    are imported once, including the legacy performance.json that lists all the
+    answers."""
+
+    db_file: Path
+    scores_file: Path | None
+    _db: SqliteDatabase
+
+    def __init__(
+        self,
+        db_file: Path = Path("progress.sqlite"),
+        performance_file: Path | None = None,
+        totals_file: Path | None = None,
+        scores_file: Path | None = None,
+    ):
+        self.db_file = Path(db_file)
+        self.scores_file = scores_file
+        self._db = SqliteDatabase(self.db_file)
+        self._db.script(
+            "CREATE TABLE IF NOT EXISTS performance ("
+            " question TEXT PRIMARY KEY, correct INTEGER NOT NULL,"
+            " total INTEGER NOT NULL, history INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY, timestamp REAL NOT NULL,"
+            " question TEXT NOT NULL, correct INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS answers_by_time ON answers (timestamp);"
+            "CREATE TABLE IF NOT EXISTS totals ("
+            " name TEXT PRIMARY KEY, value REAL NOT NULL);"
+        )
+        if performance_file is not None:
+            self.import_performance(performance_file)
+        if totals_file is not None:
+            self.import_totals(totals_file)
+
+    def _import_once(self, json_file: Path) -> bool:
+        """Marks the file as imported. False if it already was, or does not exist."""
+        key = f"json:{Path(json_file).resolve()}"
+        if self._db.import_stamp(key) is not None or not Path(json_file).exists():
+            return False
+        self._db.set_import_stamp(key, "imported")
+        return True
+
+    def import_performance(self, json_file: Path):
+        """Imports performance.json and its journal, in any of the formats Tasks
+        has written."""
+        if not self._import_once(json_file):
+            return
+        store = PerformanceStore()
+        JsonProgressRepository(json_file).load_performance(store)
+        self._db.write_many(
+            "INSERT OR REPLACE INTO performance (question, correct, total, history)"
+            " VALUES (?, ?, ?, ?)",
+            [
+                (question, correct, total, pack_history(history))
+                for question, (correct, total, history) in store.items()
+            ],
+        )
+
+    def import_totals(self, json_file: Path):
+        if not self._import_once(json_file):
+            return
+        self.save_totals(JsonProgressRepository(totals_file=json_file).load_totals())
+        self._db.commit()
+
+    @overrides
+    def load_performance(self, store: PerformanceStore):
+        for question, correct, total, history in self._db.query(
+            "SELECT question, correct, total, history FROM performance ORDER BY rowid"
+        ):
+            store.set(question, correct, total, unpack_history(history))
+
+    @overrides
+    def record_answer(self, question: str, correct: bool) -> bool:
+        correct = int(bool(correct))
+        # The same update as PerformanceStore.record(), done by the database.
+        self._db.write(
+            "INSERT INTO performance (question, correct, total, history)"
+            " VALUES (?, ?, 1, ?) ON CONFLICT (question) DO UPDATE SET"
+            " correct = correct + excluded.correct, total = total + 1,"
+            f" history = ((history << 1) | excluded.history) & {(1 << HISTORY_LENGTH) - 1}",
+            (question, correct, correct),
+        )
+        self._db.write(
+            "INSERT INTO answers (timestamp, question, correct) VALUES (?, ?, ?)",
+            (time.time(), question, correct),
+        )
+        return False
+
+    @overrides
+    def save_performance(self, performance: dict[str, tuple[int, int, list[bool]]]):
+        # Every answer has already updated its row.
+        self._db.commit()
+
+    @overrides
+    def load_totals(self) -> dict[str, float]:
+        return dict(self._db.query("SELECT name, value FROM totals"))
+
+    @overrides
+    def save_totals(self, totals: dict[str, float]):
+        for name, value in totals.items():
+            self._db.write(
+                "INSERT OR REPLACE INTO totals (name, value) VALUES (?, ?)",
+                (name, float(value)),
+            )
+
+    @overrides
+    def sentence_store(self, input_file: Path) -> ISentenceStore:
+        return SqliteSentenceStore(self._db, input_file, self.scores_file)
+
+    def weakest_questions(self, limit: int = 10) -> list[tuple[str, int, int]]:
+        """(question, correct, total) of the questions with the lowest share of
+        correct answers."""
+        return self._db.query(
+            "SELECT question, correct, total FROM performance WHERE total > 0"
+            " ORDER BY CAST(correct AS REAL) / total, total DESC LIMIT ?",
+            (limit,),
+        )
+
+    def answers_between(
+        self, start: float, end: float
+    ) -> list[tuple[float, str, bool]]:
+        """(timestamp, question, correct) of the answers given in [start, end)."""
+        return [
+            (timestamp, question, bool(correct))
+            for timestamp, question, correct in self._db.query(
+                "SELECT timestamp, question, correct FROM answers"
+                " WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                (start, end),
+            )
+        ]
+
+    @overrides
+    def close(self):
+        self._db.close()
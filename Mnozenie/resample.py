@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import functools
+import math
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+if TYPE_CHECKING:
+    from .voice_sample import VoiceSample
+
+HALF_LENGTH = 10  # Half-length of the filter, in input periods of the slower side
+KAISER_BETA = 5.0
+MAX_RATIO_TERM = 1000  # Largest up or down factor (after reducing the ratio)
+
+
+@functools.lru_cache(maxsize=16)
+def _phase_matrix(up: int, down: int) -> tuple[np.ndarray, int]:
+    """Low-pass filter for resampling by up/down, laid out as a matrix M such that
+    each block of `up` consecutive outputs is segment @ M, where the segments are
+    windows of the input that start `down` samples apart.
+
+    Returns M and the input index at which the first segment starts."""
+    max_rate = max(up, down)
+    half_length = HALF_LENGTH * max_rate
+    length = 2 * half_length + 1
+    cutoff = 1 / max_rate  # Relative to the Nyquist frequency of the upsampled signal
+    t = np.arange(length) - half_length
+    h = cutoff * np.sinc(cutoff * t) * np.kaiser(length, KAISER_BETA) * up
+    taps = math.ceil(length / up)
+    h = np.concatenate([h, np.zeros(taps * up - length)])
+    # Row p of the bank holds taps p, p + up, p + 2 * up... of the filter, reversed,
+    # so that it can be dotted with the input window that ends at the newest sample.
+    bank = h.reshape(taps, up).T[:, ::-1]
+
+    # Output r (of a block) is at position r * down + half_length of the upsampled
+    # signal, so it uses the phase of that position modulo up, and the input up to
+    # that position divided by up.
+    positions = np.arange(up) * down + half_length
+    last_in = positions // up
+    first_in = int(last_in[0]) - (taps - 1)
+    offsets = last_in - last_in[0]
+    matrix = np.zeros((int(offsets[-1]) + taps, up), np.float32)
+    for r in range(up):
+        matrix[offsets[r] : offsets[r] + taps, r] = bank[positions[r] % up]
+    return matrix, first_in
+
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Polyphase resampling of a mono signal, with a windowed-sinc low-pass filter.
+    Accepts int16 or float32 samples and returns the same dtype (int16 gets rounded
+    and clipped). The filter of each rate pair is designed once and cached."""
+    if src_rate == dst_rate:
+        return samples.copy()
+    if len(samples) == 0:  # E.g. a take that trim_silence() cut to nothing
+        return np.zeros(0, samples.dtype)
+    g = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    if max(up, down) > MAX_RATIO_TERM:
+        raise ValueError(f"Resampling from {src_rate} to {dst_rate} is not supported")
+    matrix, first_in = _phase_matrix(up, down)
+    segment = matrix.shape[0]
+
+    n_out = math.ceil(len(samples) * up / down)
+    blocks = math.ceil(n_out / up)
+    # Zero padding, so that the segments of all blocks are inside x.
+    pad_front = max(0, -first_in)
+    length = max(first_in + pad_front + (blocks - 1) * down + segment, len(samples))
+    x = np.zeros(length + pad_front, np.float32)
+    x[pad_front : pad_front + len(samples)] = samples
+    start = first_in + pad_front
+    segments = sliding_window_view(x[start:], segment)[::down][:blocks]
+    out = (segments @ matrix).ravel()[:n_out]
+
+    if samples.dtype == np.int16:
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+    return out
+
+
+def resample_batch(
+    samples: Iterable[VoiceSample], frame_rate: int = 16000
+) -> list[VoiceSample]:
+    """Resamples many VoiceSamples, e.g. a whole archive. The filter of each rate
+    pair is designed once and reused."""
+    from .voice_sample import VoiceSample
+
+    return [
+        sample
+        if sample.frame_rate == frame_rate
+        else VoiceSample.FromArray(
+            resample(sample.samples, sample.frame_rate, frame_rate), frame_rate
+        )
+        for sample in samples
+    ]
@@ -0,0 +1,279 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from overrides import overrides
+
+from .czytanie_scoring import CompiledSentence, compile_sentence
+from .indexed_heap import IndexedHeap
+from .persistence import PersistenceWriter, write_atomically
+from .sqlite_db import SqliteDatabase
+
+
+@dataclass(order=True)
+class Score:
+    score: float
+    sentence: str
+
+
+def read_sentences(input_file: Path) -> Iterator[str]:
+    """The sentences of the file, one per line, streamed."""
+    with open(input_file, encoding="utf-8") as f:
+        for line in f:
+            yield line.strip()
+
+
+class ISentenceStore(ABC):
+    """Scores of the sentences of czytanie. The sentence with the lowest score is
+    practiced next."""
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def take_lowest(self) -> str:
+        """Takes the sentence with the lowest score out of the rotation. It comes
+        back when it gets scored with set_score()."""
+
+    @abstractmethod
+    def set_score(self, sentence: str, score: float): ...
+
+    @abstractmethod
+    def get_score(self, sentence: str) -> float | None: ...
+
+    def close(self):
+        pass
+
+
+class JsonSentenceStore(ISentenceStore):
+    """All the scores in memory, saved as a JSON object {sentence: score}. Every
+    change rewrites the whole file, so this is for small corpora."""
+
+    _scores: dict[str, float]  # Sentence -> score points
+    _scores_sort: IndexedHeap[str]  # Sentence -> Score, for picking the lowest score
+    _output_file: str
+    _writer: PersistenceWriter | None
+
+    def __init__(
+        self,
+        input_file: str = "czytanie-sentences.txt",
+        output_file: str = "czytanie-scores.json",
+        writer: PersistenceWriter | None = None,
+    ):
+        self._output_file = output_file
+        self._writer = writer
+        self._scores = {}
+        try:
+            with open(output_file, "r") as fr:
+                try:
+                    self._scores = json.load(fr)
+                except json.JSONDecodeError:
+                    with open(output_file, "w") as fw:
+                        jsonobj = json.dumps(self._scores, indent=4)
+                        fw.write(jsonobj)
+        except FileNotFoundError:
+            with open(output_file, "w") as fw:
+                jsonobj = json.dumps(self._scores, indent=4)
+                fw.write(jsonobj)
+
+        for sentence in read_sentences(input_file):
+            if sentence not in self._scores:
+                self._scores[sentence] = 0
+        self._scores_sort = IndexedHeap(
+            {
+                sentence: Score(score, sentence)
+                for sentence, score in self._scores.items()
+            }
+        )
+
+    @overrides
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def sentences(self) -> Iterator[str]:
+        return iter(self._scores)
+
+    @overrides
+    def take_lowest(self) -> str:
+        return self._scores_sort.pop()[1]
+
+    @overrides
+    def get_score(self, sentence: str) -> float | None:
+        return self._scores.get(sentence)
+
+    @overrides
+    def set_score(self, sentence: str, score: float):
+        self._scores[sentence] = score
+        self._scores_sort.push(sentence, Score(score, sentence))
+        scores = dict(self._scores)
+        if self._writer is not None:
+            self._writer.save(
+                self._output_file, lambda: json.dumps(scores, indent=4).encode()
+            )
+        else:
+            write_atomically(self._output_file, json.dumps(scores, indent=4).encode())
+
+
+class SqliteSentenceStore(ISentenceStore):
+    """The scores in an SQLite database, for corpora of whole books.
+
+    The sentence file is streamed into the database in batches, skipping the
+    duplicates, and only when it has changed since the last import, so opening a
+    big corpus is instant. The index on (score, sentence) gives the lowest score
+    and updates in O(log n); nothing but the sentences taken out of the rotation is
+    kept in memory.
+
+    The database is either opened from a file or shared with other stores (see
+    SqliteProgressRepository). The scores of the JSON file of JsonSentenceStore are
+    imported once."""
+
+    IMPORT_BATCH = 10000
+
+    _db: SqliteDatabase
+    _owns_db: bool
+    _taken: set[str]  # Out of the rotation until scored
+
+    def __init__(
+        self,
+        database: SqliteDatabase | Path = Path("czytanie.sqlite"),
+        input_file: Path = Path("czytanie-sentences.txt"),
+        json_file: Path | None = Path("czytanie-scores.json"),
+    ):
+        self._owns_db = not isinstance(database, SqliteDatabase)
+        self._db = SqliteDatabase(database) if self._owns_db else database
+        self._taken = set()
+        self._db.script(
+            "CREATE TABLE IF NOT EXISTS sentences ("
+            " id INTEGER PRIMARY KEY, sentence TEXT NOT NULL UNIQUE,"
+            " score REAL NOT NULL DEFAULT 0);"
+            "CREATE INDEX IF NOT EXISTS sentences_by_score"
+            " ON sentences (score, sentence);"
+        )
+        if json_file is not None and Path(json_file).exists():
+            self.import_json(json_file)
+        self.import_sentences(input_file)
+
+    def import_sentences(self, input_file: Path):
+        """Adds the new sentences of the file, if the file has changed since it was
+        last imported."""
+        input_file = Path(input_file)
+        stat = os.stat(input_file)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        key = str(input_file.resolve())
+        if self._db.import_stamp(key) == stamp:
+            return
+        batch = []
+        for sentence in read_sentences(input_file):
+            batch.append((sentence,))
+            if len(batch) >= self.IMPORT_BATCH:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+        self._db.set_import_stamp(key, stamp)
+        self._db.commit()
+
+    def _insert(self, batch: list[tuple[str]]):
+        self._db.write_many(
+            "INSERT OR IGNORE INTO sentences (sentence) VALUES (?)", batch
+        )
+
+    def import_json(self, json_file: Path):
+        """Imports the scores saved by JsonSentenceStore, once."""
+        key = f"json:{Path(json_file).resolve()}"
+        if self._db.import_stamp(key) is not None:
+            return
+        with open(json_file) as f:
+            try:
+                scores = json.load(f)
+            except json.JSONDecodeError:
+                scores = {}
+        self._db.write_many(
+            "INSERT INTO sentences (sentence, score) VALUES (?, ?)"
+            " ON CONFLICT (sentence) DO UPDATE SET score = excluded.score",
+            scores.items(),
+        )
+        self._db.set_import_stamp(key, "imported")
+        self._db.commit()
+
+    @overrides
+    def __len__(self) -> int:
+        return self._db.query("SELECT COUNT(*) FROM sentences")[0][0]
+
+    @overrides
+    def take_lowest(self) -> str:
+        # At most len(self._taken) of these rows are taken, so one is free.
+        rows = self._db.query(
+            "SELECT sentence FROM sentences ORDER BY score, sentence LIMIT ?",
+            (len(self._taken) + 1,),
+        )
+        for (sentence,) in rows:
+            if sentence not in self._taken:
+                self._taken.add(sentence)
+                return sentence
+        raise IndexError("No sentences left")
+
+    @overrides
+    def get_score(self, sentence: str) -> float | None:
+        rows = self._db.query(
+            "SELECT score FROM sentences WHERE sentence = ?", (sentence,)
+        )
+        return rows[0][0] if rows else None
+
+    @overrides
+    def set_score(self, sentence: str, score: float):
+        self._taken.discard(sentence)
+        self._db.write(
+            "INSERT INTO sentences (sentence, score) VALUES (?, ?)"
+            " ON CONFLICT (sentence) DO UPDATE SET score = excluded.score",
+            (sentence, score),
+        )
+
+    @overrides
+    def close(self):
+        if self._owns_db:
+            self._db.close()
+        else:
+            self._db.commit()
+
+
+class ScoringServer:
+    """Picks the sentences to read and keeps their scores, in an ISentenceStore."""
+
+    PRECOMPILE_LIMIT = 10000  # Bigger corpora are compiled when used (see compiled())
+
+    _store: ISentenceStore
+    _corpus: dict[str, CompiledSentence]  # Sentence -> what scoring needs from it
+
+    def __init__(
+        self,
+        input_file: str = "czytanie-sentences.txt",
+        output_file: str = "czytanie-scores.json",
+        writer: PersistenceWriter | None = None,
+        store: ISentenceStore | None = None,
+    ):
+        if store is None:
+            store = JsonSentenceStore(input_file, output_file, writer)
+        self._store = store
+        self._corpus = {}
+        if isinstance(store, JsonSentenceStore) and len(store) <= self.PRECOMPILE_LIMIT:
+            self._corpus = {s: compile_sentence(s) for s in store.sentences()}
+
+    def compiled(self, sentence: str) -> CompiledSentence:
+        compiled = self._corpus.get(sentence)
+        if compiled is None:
+            compiled = compile_sentence(sentence)  # Cached there
+        return compiled
+
+    def get_sentence(self) -> str:
+        """Takes the sentence with the lowest score out of the rotation.
+        It comes back when it gets scored with set_sentence_score."""
+        return self._store.take_lowest()
+
+    def set_sentence_score(self, sentence: str, score: float):
+        self._store.set_score(sentence, score)
+
+    def close(self):
+        self._store.close()
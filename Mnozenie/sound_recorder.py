@@ -1,3 +1,5 @@
+from collections.abc import Callable
+
 import numpy as np
 import pyaudio
 
@@ -5,17 +7,38 @@ from .voice_sample import VoiceSample
 
 
 class SoundRecorder:
-    def __init__(self):
+    # The recording goes into a NumPy buffer of int16 samples, preallocated for
+    # INITIAL_SECONDS and doubled when full. Every recording gets a new buffer, so
+    # VoiceSamples returned earlier (which are views into it) stay valid.
+    INITIAL_SECONDS = 30
+
+    def __init__(self, frame_rate: int = 16000):
         self.p = pyaudio.PyAudio()
         self.stream = None
-        self.frames = []
-
-    def start_recording(self):
-        self.frames = []
+        self.frame_rate = frame_rate
+        try:
+            self.p.is_format_supported(
+                frame_rate,
+                input_device=self.p.get_default_input_device_info()["index"],
+                input_channels=1,
+                input_format=pyaudio.paInt16,
+            )
+        except (ValueError, OSError):
+            print(f"Recording at {frame_rate} Hz is not supported, using 44100 Hz")
+            self.frame_rate = 44100
+        self._buffer = np.zeros(0, np.int16)
+        self._length = 0
+        self._on_chunk = None
+
+    def start_recording(self, on_chunk: Callable[[bytes], None] | None = None):
+        # on_chunk gets each chunk of audio as soon as it is recorded, on the audio thread.
+        self._buffer = np.empty(self.INITIAL_SECONDS * self.frame_rate, np.int16)
+        self._length = 0
+        self._on_chunk = on_chunk
         self.stream = self.p.open(
             format=pyaudio.paInt16,
             channels=1,
-            rate=44100,
+            rate=self.frame_rate,
             input=True,
             frames_per_buffer=1024,
             stream_callback=self.callback,
@@ -29,7 +52,13 @@ class SoundRecorder:
         self.stream = None
 
     def get_last_recording(self) -> VoiceSample:
-        return VoiceSample(data=b"".join(self.frames), frame_rate=44100, sample_width=2)
+        # No copy: the sample is a view of the recording buffer.
+        return VoiceSample.FromArray(
+            self.get_last_recording_as_array(), self.frame_rate
+        )
+
+    def get_last_recording_as_array(self) -> np.ndarray:
+        return self._buffer[: self._length]
 
     def get_last_recording_as_whisper_sound(self) -> np.ndarray:
         # Converts the sound to np.ndarray, 16kHz, mono as float32 in range [-1, 1]
@@ -45,13 +74,22 @@ class SoundRecorder:
     def play_last_recording(self):
         # Play the last recording
         stream = self.p.open(
-            format=pyaudio.paInt16, channels=2, rate=44100, output=True
+            format=pyaudio.paInt16, channels=1, rate=self.frame_rate, output=True
         )
-        stream.write(b"".join(self.frames))
+        stream.write(self.get_last_recording_as_array().tobytes())
         stream.stop_stream()
 
     def callback(self, in_data, frame_count, time_info, status):
-        self.frames.append(in_data)
+        samples = np.frombuffer(in_data, np.int16)
+        end = self._length + len(samples)
+        if end > len(self._buffer):
+            buffer = np.empty(max(end, 2 * len(self._buffer)), np.int16)
+            buffer[: self._length] = self._buffer[: self._length]
+            self._buffer = buffer
+        self._buffer[self._length : end] = samples
+        self._length = end
+        if self._on_chunk is not None:
+            self._on_chunk(in_data)
         return (in_data, pyaudio.paContinue)
 
 
@@ -76,15 +114,8 @@ def test1():
     recording = sound_recorder.get_last_recording()
     recording.play()
     recording.ResampledClone(16000).play()
-    # Serialize to json to file output.json
-    # json_txt = json.dumps(recording.dict())
-    json_txt = recording.json()
-    with open("output.json", "w") as f:
-        f.write(json_txt)
-
-    with open("output.json", "r") as f:
-        json_txt2 = f.read()
-    loaded_voice_sample = VoiceSample.model_validate_json(json_txt2)
+    # The WAV file loads memory-mapped, without decoding anything
+    loaded_voice_sample = VoiceSample.Load("output.wav")
     loaded_voice_sample.play()
 
 
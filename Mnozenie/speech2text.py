@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import io
+import queue
+import sys
+import threading
+import traceback
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+import numpy as np
+import requests
+from overrides import overrides
+
+from .resample import resample
+
+if TYPE_CHECKING:
+    from .voice_sample import VoiceSample
+
+try:
+    import soundfile
+except ImportError:  # FLAC uploads are optional
+    soundfile = None
+
+RAW_PCM = "application/octet-stream"  # int16, little-endian, mono
+FLAC = "audio/flac"
+TRANSCRIPTION_RATE = 16000  # Whisper works on 16 kHz audio
+
+
+def encode_audio(pcm: bytes, frame_rate: int, content_type: str) -> bytes:
+    if content_type == RAW_PCM:
+        return bytes(pcm)
+    if content_type == FLAC:
+        buffer = io.BytesIO()
+        soundfile.write(buffer, np.frombuffer(pcm, np.int16), frame_rate, format="FLAC")
+        return buffer.getvalue()
+    raise ValueError(f"Unsupported content type {content_type}")
+
+
+def default_upload_formats() -> list[str]:
+    if soundfile is not None:
+        return [FLAC, RAW_PCM]
+    return [RAW_PCM]
+
+
+class _NoBinaryUpload(Exception):
+    pass
+
+
+class ITranscriptStream(ABC):
+    """Audio that is being transcribed while it is still recorded."""
+
+    @abstractmethod
+    def feed(self, chunk: bytes): ...
+
+    @abstractmethod
+    def finish(self, timeout: float | None = None) -> str: ...
+
+    @abstractmethod
+    def cancel(self): ...
+
+
+class ISpeech2Text(ABC):
+    @abstractmethod
+    def get_transcript(self, sound: VoiceSample) -> str: ...
+
+    @abstractmethod
+    def start_stream(
+        self, frame_rate: int, sample_width: int = 2
+    ) -> ITranscriptStream: ...
+
+    def identity(self) -> str:
+        """Names the backend and model, e.g. for caching: two backends with the same
+        identity give the same transcript of the same audio."""
+        return type(self).__name__
+
+
+class Speech2Text(ISpeech2Text):
+    """Client of the transcription server.
+
+    The server has three endpoints:
+
+    * POST {url}transcribe/ - body is the 16 kHz mono audio, as raw int16 PCM or FLAC,
+      with the format in Content-Type and the rate in X-Frame-Rate. If the format is
+      not supported, the server answers 415 with the supported ones in Accept-Post.
+    * GET  {url}request/ - body is a VoiceSample as JSON. Used with servers without
+      the endpoint above.
+    * POST {url}stream/  - body is raw little-endian PCM, mono, sent with chunked
+      transfer encoding while the recording is still going on. The X-Frame-Rate and
+      X-Sample-Width headers describe the audio.
+
+    All of them respond with the transcript."""
+
+    url: str
+    timeout: tuple[float, float]  # (connect, read) in seconds
+    upload_formats: list[str]  # Content types to try, in the order of preference
+    _format: str | None  # Negotiated content type, or "json" for the fallback
+
+    def __init__(
+        self,
+        url: str = "http://192.168.42.5:8000/",
+        timeout: tuple[float, float] = (5.0, 60.0),
+        upload_formats: list[str] | None = None,
+    ):
+        self.url = url
+        self.timeout = timeout
+        if upload_formats is None:
+            upload_formats = default_upload_formats()
+        elif soundfile is None and FLAC in upload_formats:
+            upload_formats = [t for t in upload_formats if t != FLAC]
+        self.upload_formats = upload_formats
+        self._format = None
+
+    @overrides
+    def get_transcript(self, sound: VoiceSample) -> str:
+        if self._format != "json":
+            try:
+                return self._post_transcript(sound)
+            except _NoBinaryUpload:
+                self._format = "json"
+        return requests.get(
+            self.url + "request/", data=sound.json(), timeout=self.timeout
+        ).text.strip()
+
+    def _post_transcript(self, sound: VoiceSample) -> str:
+        if sound.frame_rate != TRANSCRIPTION_RATE:
+            sound = sound.ResampledClone(TRANSCRIPTION_RATE)
+        candidates = list(self.upload_formats)
+        if self._format in candidates:
+            candidates.remove(self._format)
+            candidates.insert(0, self._format)
+        while candidates:
+            content_type = candidates.pop(0)
+            response = requests.post(
+                self.url + "transcribe/",
+                data=encode_audio(sound.data, sound.frame_rate, content_type),
+                headers={
+                    "Content-Type": content_type,
+                    "X-Frame-Rate": str(sound.frame_rate),
+                },
+                timeout=self.timeout,
+            )
+            if response.status_code in (404, 405, 501):
+                raise _NoBinaryUpload()
+            if response.status_code == 415:
+                accepted = [
+                    t.strip()
+                    for t in response.headers.get("Accept-Post", "").split(",")
+                ]
+                candidates = [t for t in candidates if t in accepted]
+                continue
+            response.raise_for_status()
+            self._format = content_type
+            return response.text.strip()
+        raise _NoBinaryUpload()
+
+    @overrides
+    def identity(self) -> str:
+        return f"server:{self.url}"
+
+    @overrides
+    def start_stream(self, frame_rate: int, sample_width: int = 2) -> TranscriptStream:
+        return TranscriptStream(
+            self.url + "stream/", frame_rate, sample_width, self.timeout
+        )
+
+
+class TranscriptStream(ITranscriptStream):
+    """Uploads the audio to the transcription server while it is being recorded.
+
+    feed() is cheap and thread-safe, so it can be called straight from the audio
+    callback. The upload runs on its own thread; finish() ends it and returns the
+    transcript, which by then is usually ready."""
+
+    _chunks: queue.Queue
+    _thread: threading.Thread
+    _transcript: str | None
+    _error: Exception | None
+
+    def __init__(
+        self,
+        url: str,
+        frame_rate: int,
+        sample_width: int = 2,
+        timeout: tuple[float, float] = (5.0, 60.0),
+    ):
+        self._chunks = queue.Queue()
+        self._transcript = None
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._upload,
+            args=(url, frame_rate, sample_width, timeout),
+            name="TranscriptStream",
+            daemon=True,
+        )
+        self._thread.start()
+
+    @overrides
+    def feed(self, chunk: bytes):
+        self._chunks.put(chunk)
+
+    def _body(self):
+        while (chunk := self._chunks.get()) is not None:
+            if chunk:
+                yield chunk
+
+    def _upload(self, url, frame_rate, sample_width, timeout):
+        try:
+            response = requests.post(
+                url,
+                data=self._body(),
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "X-Frame-Rate": str(frame_rate),
+                    "X-Sample-Width": str(sample_width),
+                },
+                timeout=timeout,
+            )
+            response.raise_for_status()
+            self._transcript = response.text.strip()
+        except (requests.RequestException, OSError) as e:
+            self._error = e
+            # Unblock feed()ers and let the queue get collected.
+            self._chunks = queue.Queue()
+
+    @overrides
+    def finish(self, timeout: float | None = None) -> str:
+        """Ends the upload and waits for the transcript. Raises the error of the
+        upload (usually a requests.RequestException) if it failed."""
+        self._chunks.put(None)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError("Transcription did not finish in time")
+        if self._error is not None:
+            raise self._error
+        if self._transcript is None:  # A bug, reported by the thread's excepthook
+            raise RuntimeError("The upload thread failed")
+        return self._transcript
+
+    @overrides
+    def cancel(self):
+        """Ends the upload without waiting for the transcript."""
+        self._chunks.put(None)
+
+
+def pcm_to_whisper_audio(
+    pcm: bytes, frame_rate: int, sample_width: int = 2
+) -> np.ndarray:
+    """Converts mono int16 PCM into what Whisper expects: 16 kHz float32 in [-1, 1]."""
+    if sample_width != 2:
+        raise ValueError("Only 16-bit audio is supported")
+    audio = np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+    return resample(audio, frame_rate, TRANSCRIPTION_RATE)
+
+
+class WhisperSpeech2Text(ISpeech2Text):
+    """Transcribes in this process, on the CPU, with openai-whisper.
+
+    The model is loaded (and warmed up on a second of silence) on a background
+    thread, started by the constructor, so the app can show its window meanwhile.
+    The first transcription waits for the load to finish. If the load fails, the
+    error is printed and raised by every transcription."""
+
+    model_name: str
+    threads: int | None
+    language: str
+    _model = None
+    _loaded: threading.Event
+    _load_error: Exception | None
+    _lock: threading.Lock  # The model must not be used by two threads at once
+
+    def __init__(
+        self, model_name: str = "base", threads: int | None = None, language: str = "pl"
+    ):
+        self.model_name = model_name
+        self.threads = threads
+        self.language = language
+        self._loaded = threading.Event()
+        self._load_error = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._load, name="WhisperLoader", daemon=True).start()
+
+    def _load(self):
+        try:
+            self._model = self._load_model()
+            self._transcribe(np.zeros(TRANSCRIPTION_RATE, np.float32))
+        except Exception as e:  # noqa: BLE001 - raised to the callers below
+            print(
+                f"Failed to load the Whisper model {self.model_name}:", file=sys.stderr
+            )
+            traceback.print_exc()
+            self._load_error = e
+        finally:
+            self._loaded.set()
+
+    def _load_model(self):
+        import torch
+        import whisper
+
+        if self.threads is not None:
+            torch.set_num_threads(self.threads)
+        return whisper.load_model(self.model_name, device="cpu")
+
+    def wait_until_loaded(self, timeout: float | None = None) -> bool:
+        return self._loaded.wait(timeout)
+
+    def _transcribe(self, audio: np.ndarray) -> str:
+        with self._lock:
+            result = self._model.transcribe(audio, language=self.language, fp16=False)
+        return result["text"].strip()
+
+    def transcribe_pcm(self, pcm: bytes, frame_rate: int, sample_width: int = 2) -> str:
+        self._loaded.wait()
+        if self._load_error is not None:
+            raise self._load_error
+        return self._transcribe(pcm_to_whisper_audio(pcm, frame_rate, sample_width))
+
+    @overrides
+    def get_transcript(self, sound: VoiceSample) -> str:
+        return self.transcribe_pcm(sound.data, sound.frame_rate, sound.sample_width)
+
+    @overrides
+    def identity(self) -> str:
+        return f"whisper:{self.model_name}:{self.language}"
+
+    @overrides
+    def start_stream(self, frame_rate: int, sample_width: int = 2) -> ITranscriptStream:
+        return BufferedTranscriptStream(self, frame_rate, sample_width)
+
+
+class BufferedTranscriptStream(ITranscriptStream):
+    """Collects the chunks and transcribes them all on finish(). For backends that
+    cannot transcribe incrementally."""
+
+    _speech2text: WhisperSpeech2Text
+    _chunks: list[bytes]
+
+    def __init__(
+        self, speech2text: WhisperSpeech2Text, frame_rate: int, sample_width: int = 2
+    ):
+        self._speech2text = speech2text
+        self._frame_rate = frame_rate
+        self._sample_width = sample_width
+        self._chunks = []
+
+    @overrides
+    def feed(self, chunk: bytes):
+        self._chunks.append(chunk)
+
+    @overrides
+    def finish(self, timeout: float | None = None) -> str:
+        return self._speech2text.transcribe_pcm(
+            b"".join(self._chunks), self._frame_rate, self._sample_width
+        )
+
+    @overrides
+    def cancel(self):
+        self._chunks = []
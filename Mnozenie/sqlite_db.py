@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+
+class SqliteDatabase:
+    """An SQLite database in WAL mode, with the writes grouped into transactions.
+
+    write() executes the statement in the open transaction, which is committed
+    every BATCH_SIZE writes, BATCH_DELAY seconds after its first write (on a timer
+    thread, so that an idle app does not keep the database locked), and on
+    commit()/close(). Queries see the uncommitted writes. A crash loses at most the
+    last batch, and never leaves it half-written.
+
+    Also remembers which files have been imported, so that imports run once.
+    All the methods are thread-safe."""
+
+    BATCH_SIZE = 50
+    BATCH_DELAY = 2.0  # Seconds
+
+    path: Path
+    _db: sqlite3.Connection
+    _lock: threading.RLock
+    _pending: int
+    _timer: threading.Timer | None
+    _closed: bool
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._timer = None
+        self._closed = False
+        self.script(
+            "CREATE TABLE IF NOT EXISTS imports (file TEXT PRIMARY KEY, stamp TEXT);"
+        )
+
+    def script(self, sql: str):
+        """Runs the statements (e.g. CREATE TABLE IF NOT EXISTS) and commits."""
+        with self._lock:
+            self.commit()
+            self._db.executescript(sql)
+
+    def query(self, sql: str, params: Iterable = ()) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def write(self, sql: str, params: Iterable = ()):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.BATCH_SIZE:
+                self.commit()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.BATCH_DELAY, self.commit)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def write_many(self, sql: str, rows: Iterable[Iterable]):
+        """For bulk loads: the rows go in the open transaction, which is committed."""
+        with self._lock:
+            self._db.executemany(sql, rows)
+            self.commit()
+
+    def commit(self):
+        with self._lock:
+            if self._closed:  # The timer can fire while close() holds the lock
+                return
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._db.commit()
+            self._pending = 0
+
+    def import_stamp(self, key: str) -> str | None:
+        rows = self.query("SELECT stamp FROM imports WHERE file = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def set_import_stamp(self, key: str, stamp: str):
+        self.write(
+            "INSERT OR REPLACE INTO imports (file, stamp) VALUES (?, ?)", (key, stamp)
+        )
+
+    def close(self):
+        with self._lock:
+            self.commit()
+            self._closed = True
+            self._db.close()
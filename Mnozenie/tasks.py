@@ -0,0 +1,334 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+from overrides import overrides
+
+from .indexed_heap import IndexedHeap
+from .performance_store import PerformanceStore
+from .persistence import PersistenceWriter, write_atomically
+from .progress_repository import IProgressRepository, JsonProgressRepository
+
+
+class ITask(ABC):
+    @property
+    @abstractmethod
+    def result(self) -> int: ...
+
+    @abstractmethod
+    def get_question(self) -> str: ...
+
+    @property
+    @abstractmethod
+    def difficulty_score(self): ...
+
+    @abstractmethod
+    def get_time_limit(self) -> float: ...
+
+    @property
+    @abstractmethod
+    def epoch(self) -> int:
+        return self._epoch
+
+    @epoch.setter
+    @abstractmethod
+    def epoch(self, epoch: int):
+        self._epoch = epoch
+
+
+class Mnozenie(ITask):
+    _num1: int
+    _num2: int
+    _div: bool
+    _inv: bool
+    _epoch: int
+
+    def __init__(self, num1: int, num2: int, div: bool, inv: bool, epoch: int):
+        self._num1 = num1
+        self._num2 = num2
+        self._div = div
+        self._inv = inv
+        self._epoch = epoch
+
+    @property
+    @overrides
+    def result(self) -> int:
+        if self._div:
+            if self._inv:
+                return self._num1
+            else:
+                return self._num2
+        else:
+            return self._num1 * self._num2
+
+    @overrides
+    def get_question(self) -> str:
+        if self._div:
+            if self._inv:
+                return f"{self._num1 * self._num2} / {self._num2}"
+            else:
+                return f"{self._num1 * self._num2} / {self._num1}"
+        else:
+            if self._inv:
+                return f"{self._num2} x {self._num1}"
+            else:
+                return f"{self._num1} x {self._num2}"
+
+    @property
+    @overrides
+    def difficulty_score(self):
+        if self._num1 == 1 or self._num2 == 1:
+            return 0
+        else:
+            # noinspection PyTypeChecker
+            return (
+                max(
+                    1,
+                    math.log(self._num2 * self._num1 + 1) / math.log(9)
+                    + math.log(min(self._num2, self._num1) + 1),
+                )
+                - 1
+            )
+
+    @overrides
+    def get_time_limit(self) -> float:
+        return 4 + self.difficulty_score * 6
+
+    @property
+    @overrides
+    def epoch(self) -> int:
+        return self._epoch
+
+    @epoch.setter
+    @overrides
+    def epoch(self, epoch: int):
+        self._epoch = epoch
+
+
+class Dodawanie(ITask):
+    _num1: int
+    _num2: int
+    _substr: bool
+    _epoch: int
+
+    def __init__(self, num1: int, num2: int, substr: bool, epoch: int):
+        self._num1 = num1
+        self._num2 = num2
+        self._substr = substr
+        self._epoch = epoch
+
+    @property
+    @overrides
+    def result(self) -> int:
+        if self._substr:
+            return self._num1 - self._num2
+        else:
+            return self._num1 + self._num2
+
+    @overrides
+    def get_question(self) -> str:
+        if self._substr:
+            return f"{self._num1} - {self._num2}"
+        else:
+            return f"{self._num1} + {self._num2}"
+
+    @property
+    @overrides
+    def difficulty_score(self):
+        if self._num1 == 1 or self._num2 == 1:
+            return 0
+        else:
+            # noinspection PyTypeChecker
+            return (
+                max(
+                    1,
+                    math.log(self._num2 * self._num1 + 1) / math.log(9)
+                    + math.log(min(self._num2, self._num1) + 1),
+                )
+                - 1
+            )
+
+    @overrides
+    def get_time_limit(self) -> float:
+        return 8 + self.difficulty_score * 30
+
+    @property
+    @overrides
+    def epoch(self) -> int:
+        return self._epoch
+
+    @epoch.setter
+    @overrides
+    def epoch(self, epoch: int):
+        self._epoch = epoch
+
+
+class Tasks:
+    _tasks: list[ITask]  # task i has row i in _performance
+    _levels: IndexedHeap[float]  # distinct fitness values (without the random factor)
+    _buckets: dict[float, list[int]]  # fitness value -> indices of tasks that have it
+    _task_level: list[float]  # task index -> its key in _buckets
+    _bucket_pos: list[int]  # task index -> its position in the bucket
+    _epoch: int
+    _performance: PerformanceStore  # question -> history of correctness of answers
+    _rng: np.random.Generator
+    _repository: IProgressRepository | None
+
+    JITTER = 0.1  # Half-width of the random factor added to the fitness
+
+    @staticmethod
+    def CreateFromJSON(
+        json_file: Path = "performance.json", writer: PersistenceWriter | None = None
+    ):
+        """Loads the snapshot and replays the answers journaled after it. The journal
+        stays attached, so that further answers get appended to it (by the writer's
+        thread, if given)."""
+        return Tasks.CreateFromRepository(
+            JsonProgressRepository(json_file, writer=writer)
+        )
+
+    @staticmethod
+    def CreateFromRepository(
+        repository: IProgressRepository,
+        max_num: int = 10,
+        max_result: float = 100,
+        min_result: float = 10,
+        seed: int | None = None,
+    ):
+        """Loads the saved performance. Further answers are saved to the repository."""
+        tasks = Tasks(max_num, max_result, min_result, seed)
+        repository.load_performance(tasks._performance)
+        tasks._rebuild_queue()
+        tasks._repository = repository
+        return tasks
+
+    def serialize_performance(self, json_file: Path = "performance.json"):
+        """Writes the full state. If it goes to the snapshot of the attached journal,
+        this also compacts the journal."""
+        if (
+            isinstance(self._repository, JsonProgressRepository)
+            and Path(json_file) == self._repository.performance_file
+        ):
+            self.save()
+        else:
+            write_atomically(
+                json_file, json.dumps(self._performance.as_dict()).encode()
+            )
+
+    def save(self):
+        """Saves the full state to the attached repository."""
+        if self._repository is not None:
+            self._repository.save_performance(self._performance.as_dict())
+
+    def close(self):
+        if self._repository is not None:
+            self._repository.close()
+
+    def __init__(
+        self,
+        max_num: int,
+        max_result: float,
+        min_result: float,
+        seed: int | None = None,
+    ):
+        """With a seed, the choice of the tasks can be reproduced."""
+        self._tasks = []
+        self._performance = PerformanceStore()
+        self._rng = np.random.default_rng(seed)
+        self._repository = None
+        self._epoch = 0
+        for i in range(1, max_num):
+            for j in range(i, max_num):
+                if i * j <= max_result and i * j >= min_result:
+                    self._add_task(Mnozenie(i, j, False, False, 0))
+                    self._add_task(Mnozenie(i, j, True, False, 0))
+                    if i != j:
+                        self._add_task(Mnozenie(i, j, False, True, 0))
+                        self._add_task(Mnozenie(i, j, True, True, 0))
+        self._rebuild_queue()
+
+    def _add_task(self, task: ITask):
+        row = self._performance.add(task.get_question())
+        assert row == len(self._tasks)
+        self._tasks.append(task)
+
+    def _rebuild_queue(self):
+        self._levels = IndexedHeap()
+        self._buckets = {}
+        self._task_level = [0.0] * len(self._tasks)
+        self._bucket_pos = [0] * len(self._tasks)
+        fitness = self._performance.fitness()[: len(self._tasks)].tolist()
+        for i, task_fitness in enumerate(fitness):
+            self._add_to_bucket(i, task_fitness)
+
+    def _add_to_bucket(self, task_id: int, fitness: float):
+        bucket = self._buckets.get(fitness)
+        if bucket is None:
+            bucket = self._buckets[fitness] = []
+            self._levels.push(fitness, fitness)
+        self._task_level[task_id] = fitness
+        self._bucket_pos[task_id] = len(bucket)
+        bucket.append(task_id)
+
+    def _remove_from_bucket(self, task_id: int):
+        fitness = self._task_level[task_id]
+        bucket = self._buckets[fitness]
+        last = bucket.pop()
+        if last != task_id:
+            pos = self._bucket_pos[task_id]
+            bucket[pos] = last
+            self._bucket_pos[last] = pos
+        if not bucket:
+            del self._buckets[fitness]
+            self._levels.remove(fitness)
+
+    def task_fitness(self, task: ITask) -> float:
+        """Returns the fitness of a task to get presented to the user based on how long it has been since it was last presented,
+        and how well the user has been doing on it"""
+        # epoch_component = (self._epoch - task.epoch) * 0.1
+        row = self._performance.get_id(task.get_question())
+        random_factor = self._rng.uniform(-self.JITTER, self.JITTER)
+        return self._performance.fitness_of(row) + random_factor
+
+    def all_fitness(self) -> np.ndarray:
+        """task_fitness of all tasks at once, with a single batched random draw."""
+        return self._performance.fitness(self._rng, self.JITTER)[: len(self._tasks)]
+
+    def get_next_task(self) -> ITask:
+        """Picks the task with the lowest task_fitness without evaluating all of them.
+
+        The random factor is bounded, so only the fitness levels within 2 * JITTER of
+        the best one can win. All tasks on one level share the fitness, so instead of
+        drawing a random factor for each of them, we draw the smallest of len(bucket)
+        random factors directly, and if that level wins, pick its task uniformly.
+        The result has the same distribution as taking the minimum of task_fitness
+        over all tasks."""
+        best_fitness, _ = self._levels.peek()
+        levels = [
+            fitness
+            for fitness, _ in self._levels.iter_below(best_fitness + 2 * self.JITTER)
+        ]
+        sizes = np.array([len(self._buckets[fitness]) for fitness in levels])
+        # One draw per level, plus one to pick the task within the winning level.
+        draws = self._rng.random(len(levels) + 1)
+        min_factor = 1 - draws[:-1] ** (1 / sizes)  # in [0, 1]
+        values = np.array(levels) + self.JITTER * (2 * min_factor - 1)
+        bucket = self._buckets[levels[int(np.argmin(values))]]
+        self._epoch += 1
+        task = self._tasks[bucket[int(draws[-1] * len(bucket))]]
+        task.epoch = self._epoch
+        return task
+
+    def give_feedback(self, task: ITask, correct: bool):
+        question = task.get_question()
+        row = self._performance.add(question)
+        self._performance.record(row, correct)
+        if row < len(self._tasks):
+            self._remove_from_bucket(row)
+            self._add_to_bucket(row, self._performance.fitness_of(row))
+        if self._repository is not None and self._repository.record_answer(
+            question, correct
+        ):
+            self._repository.save_performance(self._performance.as_dict())
@@ -0,0 +1,616 @@
+"""Headless service of the Tasks scheduler, for browser or tablet clients.
+
+Run with `mnozenie-service` (see --help). The requests are handled on one asyncio
+event loop; the scheduler answers in microseconds, and the progress is written
+behind, by the PersistenceWriter thread (JSON) or in batched transactions (SQLite).
+Loading and unloading the profiles does file I/O, so it runs on worker threads.
+
+HTTP API, JSON in and out:
+
+    POST   /sessions                {"learner": "Ola"} -> the session and its task
+    GET    /sessions/<id>           the session and its current task
+    POST   /sessions/<id>/answer    {"answer": 12} -> the verdict and the next task
+    DELETE /sessions/<id>
+    GET    /profiles                names of the learners
+    GET    /health
+
+WebSocket: /ws?learner=Ola opens a session for the time of the connection. The
+server sends {"type": "task", ...}; the client sends {"answer": 12} and gets
+{"type": "result", ...} with the next task.
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import signal
+import struct
+import sys
+import time
+import traceback
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from .persistence import PersistenceWriter
+from .profiles import Profile, ProfileManager
+from .tasks import ITask
+
+
+@dataclass
+class Session:
+    """One learner answering tasks, like a MnozenieApp window does."""
+
+    id: str
+    learner: str
+    task: ITask
+    started: float  # When the task was given, monotonic seconds
+    last_seen: float
+    retries: int = 0  # Wrong answers to the current task
+    repetition: bool = False  # The task was answered wrong before
+    score: float = 0.0
+    answers: int = 0
+
+
+class TaskService:
+    """The sessions and the scheduling. Tasks of the learners come from the
+    ProfileManager. A session only remembers the learner's name, and the profile
+    stays loaded while it has sessions: max_loaded of the ProfileManager limits the
+    profiles without sessions, which are unloaded least recently used first.
+
+    On an event loop, await load() of the learner before open_session() or
+    answer(): then these find the profile in memory and do no I/O.
+
+    Errors: KeyError for an unknown session, TypeError or ValueError for a bad
+    request."""
+
+    SESSION_TTL = 3600.0  # Seconds without a request after which a session ends
+    MAX_LOADED = 256  # Default number of profiles kept in memory
+
+    profiles: ProfileManager
+    _sessions: dict[str, Session]
+    _learners: Counter[str]  # Learner -> number of their sessions and loads
+    _clock: Callable[[], float]
+    _executor: ThreadPoolExecutor  # One thread, to leave the GIL mostly to the loop
+    _loading: dict[str, asyncio.Future]  # Learner -> the Profile being loaded
+    _closing: dict[str, asyncio.Future]  # Learner -> close() of its evicted Profile
+
+    def __init__(
+        self, profiles: ProfileManager, clock: Callable[[], float] = time.monotonic
+    ):
+        self.profiles = profiles
+        self._sessions = {}
+        self._learners = Counter()
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(1, "TaskService")
+        self._loading = {}
+        self._closing = {}
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def load(self, learner: str):
+        """Loads the profile of the learner on the worker thread, unless it is
+        loaded. The profiles it evicts are closed on the worker thread too."""
+        if not isinstance(learner, str):
+            raise TypeError("learner must be a string")
+        if self.profiles.is_loaded(learner):
+            return
+        # Kept until the caller, which continues right after this returns, has
+        # used the profile: other loads finishing meanwhile must not evict it.
+        self._learners[learner] += 1
+        try:
+            loading = self._loading.get(learner)
+            if loading is None:
+                loading = asyncio.ensure_future(self._load(learner))
+                self._loading[learner] = loading
+            await asyncio.shield(loading)
+        finally:
+            self._release(learner)
+
+    def _release(self, learner: str):
+        self._learners[learner] -= 1
+        if self._learners[learner] == 0:
+            del self._learners[learner]
+
+    async def _load(self, learner: str):
+        try:
+            closing = self._closing.get(learner)
+            if closing is not None:  # Its files are still being written
+                await closing
+            loop = asyncio.get_running_loop()
+            profile = await loop.run_in_executor(self._executor, self._open, learner)
+            for evicted in self.profiles.add(profile, keep=self._learners):
+                self._close_later(evicted)
+        finally:
+            del self._loading[learner]
+
+    def _open(self, learner: str) -> Profile:
+        profile = self.profiles.open(learner)
+        _ = profile.tasks  # Loads the progress
+        return profile
+
+    def _close_later(self, profile: Profile):
+        loop = asyncio.get_running_loop()
+        closing = loop.run_in_executor(self._executor, profile.close)
+        self._closing[profile.name] = closing
+
+        def done(future: asyncio.Future):
+            if self._closing.get(profile.name) is future:
+                del self._closing[profile.name]
+            if not future.cancelled() and future.exception() is not None:
+                print(f"Failed to close the profile {profile.name}:", file=sys.stderr)
+                traceback.print_exception(future.exception())
+
+        closing.add_done_callback(done)
+
+    async def wait_closed(self):
+        """Waits until the evicted profiles are closed."""
+        while self._closing:
+            await asyncio.wait(list(self._closing.values()))
+
+    def learner(self, session_id: str) -> str:
+        return self._sessions[session_id].learner
+
+    def open_session(self, learner: str) -> dict:
+        if not isinstance(learner, str):
+            raise TypeError("learner must be a string")
+        tasks = self.profiles.get(learner).tasks
+        now = self._clock()
+        session = Session(
+            secrets.token_urlsafe(12), learner, tasks.get_next_task(), now, now
+        )
+        self._sessions[session.id] = session
+        self._learners[learner] += 1
+        return self._state(session)
+
+    def session(self, session_id: str) -> dict:
+        session = self._sessions[session_id]
+        session.last_seen = self._clock()
+        return self._state(session)
+
+    def answer(self, session_id: str, answer) -> dict:
+        """Checks the answer to the current task, with the rules of MnozenieApp: a
+        wrong answer keeps the task, a right one moves on; only a right answer in
+        time to a task not failed before counts as correct."""
+        session = self._sessions[session_id]
+        if isinstance(answer, bool):
+            raise TypeError("answer must be a number")
+        try:
+            answer = int(answer)
+        except (TypeError, ValueError):
+            raise ValueError("answer must be a number") from None
+        now = self._clock()
+        session.last_seen = now
+        session.answers += 1
+        tasks = self.profiles.get(session.learner).tasks
+        task = session.task
+        result = {"correct": answer == task.result, "in_time": True}
+        if answer == task.result:
+            elapsed = now - session.started
+            if elapsed > task.get_time_limit():
+                result["in_time"] = False
+                session.score += 0.1 / (1 + session.retries)
+                tasks.give_feedback(task, False)
+            else:
+                session.score += 1 / (1 + session.retries)
+                tasks.give_feedback(task, not session.repetition)
+            session.task = tasks.get_next_task()
+            session.started = now
+            session.retries = 0
+            session.repetition = False
+        else:
+            result["expected"] = task.result
+            session.retries += 1
+            session.repetition = True
+            tasks.give_feedback(task, False)
+        result.update(self._state(session))
+        return result
+
+    def close_session(self, session_id: str):
+        self._release(self._sessions.pop(session_id).learner)
+
+    def expire_sessions(self) -> int:
+        """Ends the sessions idle for SESSION_TTL. Returns how many ended."""
+        deadline = self._clock() - self.SESSION_TTL
+        expired = [s.id for s in self._sessions.values() if s.last_seen < deadline]
+        for session_id in expired:
+            self.close_session(session_id)
+        return len(expired)
+
+    @staticmethod
+    def _state(session: Session) -> dict:
+        return {
+            "session": session.id,
+            "learner": session.learner,
+            "task": {
+                "question": session.task.get_question(),
+                "time_limit": session.task.get_time_limit(),
+            },
+            "score": round(session.score, 2),
+            "answers": session.answers,
+        }
+
+    def close(self):
+        self._sessions.clear()
+        self._learners.clear()
+        self._executor.shutdown()
+        self.profiles.close()
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+_REASONS = {
+    200: "OK",
+    201: "Created",
+    204: "No Content",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_WS_CONTINUATION, _WS_TEXT, _WS_BINARY = 0x0, 0x1, 0x2
+_WS_CLOSE, _WS_PING, _WS_PONG = 0x8, 0x9, 0xA
+
+
+class TaskServer:
+    """HTTP/1.1 (with keep-alive) and WebSocket front end of a TaskService, on
+    asyncio streams. Only what the API needs of the protocols is implemented."""
+
+    MAX_HEADER = 16 * 1024
+    MAX_BODY = 64 * 1024
+    EXPIRE_EVERY = 60.0  # Seconds between the sweeps of idle sessions
+
+    service: TaskService
+    allow_origin: str | None
+    _server: asyncio.Server | None
+    _sweeper: asyncio.Task | None
+    _connections: dict[
+        asyncio.StreamWriter, asyncio.Task
+    ]  # Open ones, to their handler
+
+    def __init__(self, service: TaskService, allow_origin: str | None = None):
+        self.service = service
+        self.allow_origin = allow_origin
+        self._server = None
+        self._sweeper = None
+        self._connections = {}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> int:
+        """Starts listening. Returns the port (useful with port=0)."""
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=self.MAX_HEADER
+        )
+        self._sweeper = asyncio.create_task(self._sweep())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would stay open. Closed, their handlers
+            # read the end of the stream and finish.
+            handlers = list(self._connections.values())
+            for writer in list(self._connections):
+                writer.close()
+            if handlers:
+                await asyncio.wait(handlers)
+            await self._server.wait_closed()
+        await self.service.wait_closed()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.EXPIRE_EVERY)
+            self.service.expire_sessions()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HttpError as e:
+                    writer.write(self._response(e.status, {"error": str(e)}, False))
+                    break
+                if request is None:
+                    break
+                method, target, headers, body = request
+                url = urlsplit(target)
+                if (
+                    url.path == "/ws"
+                    and "websocket" in headers.get("upgrade", "").lower()
+                ):
+                    await self._websocket(reader, writer, headers, parse_qs(url.query))
+                    break
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self._route(method, url.path, body)
+                writer.write(self._response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[str, str, dict[str, str], bytes] | None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise HttpError(400, "Incomplete request") from None
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Headers too large") from None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            raise HttpError(400, "Malformed Content-Length") from None
+        if length > self.MAX_BODY:
+            raise HttpError(413, "Body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    def _response(
+        self, status: int, payload: dict | list | None, keep_alive: bool
+    ) -> bytes:
+        body = b"" if payload is None else json.dumps(payload).encode()
+        head = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        if self.allow_origin is not None:
+            head += [
+                f"Access-Control-Allow-Origin: {self.allow_origin}",
+                "Access-Control-Allow-Methods: GET, POST, DELETE, OPTIONS",
+                "Access-Control-Allow-Headers: Content-Type",
+            ]
+        return ("\r\n".join(head) + "\r\n\r\n").encode() + body
+
+    async def _route(
+        self, method: str, path: str, body: bytes
+    ) -> tuple[int, dict | list | None]:
+        parts = [part for part in path.split("/") if part]
+        try:
+            if method == "OPTIONS":
+                return 204, None
+            if parts == ["health"] and method == "GET":
+                return 200, {
+                    "sessions": len(self.service),
+                    "loaded_profiles": len(self.service.profiles.loaded()),
+                }
+            if parts == ["profiles"] and method == "GET":
+                return 200, self.service.profiles.names()
+            if parts == ["sessions"] and method == "POST":
+                learner = self._json(body).get("learner")
+                await self.service.load(learner)
+                return 201, self.service.open_session(learner)
+            if len(parts) == 2 and parts[0] == "sessions":
+                if method == "GET":
+                    return 200, self.service.session(parts[1])
+                if method == "DELETE":
+                    self.service.close_session(parts[1])
+                    return 204, None
+            if (
+                len(parts) == 3
+                and parts[0] == "sessions"
+                and parts[2] == "answer"
+                and method == "POST"
+            ):
+                answer = self._json(body).get("answer")
+                await self.service.load(self.service.learner(parts[1]))
+                return 200, self.service.answer(parts[1], answer)
+            return 404, {"error": f"No {method} {path}"}
+        except KeyError:
+            return 404, {"error": "No such session"}
+        except (TypeError, ValueError) as e:
+            return 400, {"error": str(e)}
+        except Exception as e:  # noqa: BLE001 - a 500, and the other learners go on
+            print(f"Failed to handle {method} {path}:", file=sys.stderr)
+            traceback.print_exception(e)
+            return 500, {"error": "Internal error"}
+
+    @staticmethod
+    def _json(body: bytes) -> dict:
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise ValueError("Body is not JSON") from None
+        if not isinstance(data, dict):
+            raise TypeError("Body must be a JSON object")
+        return data
+
+    async def _websocket(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        headers: dict[str, str],
+        query: dict[str, list[str]],
+    ):
+        key = headers.get("sec-websocket-key")
+        if key is None:
+            writer.write(self._response(400, {"error": "No Sec-WebSocket-Key"}, False))
+            return
+        accept = base64.b64encode(
+            hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        writer.write(
+            (
+                "HTTP/1.1 101 Switching Protocols\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+            ).encode()
+        )
+
+        def send(message: dict):
+            writer.write(_ws_frame(_WS_TEXT, json.dumps(message).encode()))
+
+        learner = query.get("learner", [None])[0]
+        try:
+            await self.service.load(learner)
+            state = self.service.open_session(learner)
+        except (TypeError, ValueError) as e:
+            send({"type": "error", "error": str(e)})
+            writer.write(_ws_frame(_WS_CLOSE, struct.pack("!H", 1008)))
+            await writer.drain()
+            return
+        session_id = state["session"]
+        send({"type": "task", **state})
+        await writer.drain()
+        try:
+            message = bytearray()
+            while True:
+                fin, opcode, payload = await self._read_frame(reader)
+                if opcode == _WS_CLOSE:
+                    writer.write(_ws_frame(_WS_CLOSE, payload[:2]))
+                    await writer.drain()
+                    return
+                if opcode == _WS_PING:
+                    writer.write(_ws_frame(_WS_PONG, payload))
+                elif opcode in (_WS_TEXT, _WS_BINARY, _WS_CONTINUATION):
+                    message += payload
+                    if len(message) > self.MAX_BODY:
+                        writer.write(_ws_frame(_WS_CLOSE, struct.pack("!H", 1009)))
+                        await writer.drain()
+                        return
+                    if fin:
+                        send(await self._ws_reply(session_id, bytes(message)))
+                        message.clear()
+                await writer.drain()
+        finally:
+            try:
+                self.service.close_session(session_id)
+            except KeyError:
+                pass  # Expired
+
+    async def _ws_reply(self, session_id: str, message: bytes) -> dict:
+        try:
+            answer = self._json(message).get("answer")
+            await self.service.load(self.service.learner(session_id))
+            result = self.service.answer(session_id, answer)
+        except KeyError:
+            return {"type": "error", "error": "Session expired"}
+        except (TypeError, ValueError) as e:
+            return {"type": "error", "error": str(e)}
+        return {"type": "result", **result}
+
+    async def _read_frame(
+        self, reader: asyncio.StreamReader
+    ) -> tuple[bool, int, bytes]:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await reader.readexactly(8))
+        if length > self.MAX_BODY:
+            raise ConnectionError("WebSocket frame too large")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask is not None and length:
+            # XOR with the repeated 4-byte mask, as one big integer operation.
+            key = (mask * (length // 4 + 1))[:length]
+            payload = (
+                int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")
+            ).to_bytes(length, "big")
+        return bool(first & 0x80), first & 0x0F, payload
+
+
+def _ws_frame(opcode: int, payload: bytes) -> bytes:
+    """A single unmasked frame, as a server sends them."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def _run(args: argparse.Namespace):
+    writer = PersistenceWriter()
+    profiles = ProfileManager(
+        args.profiles,
+        use_database=args.profile_database,
+        max_loaded=args.max_loaded,
+        writer=writer,
+    )
+    service = TaskService(profiles)
+    server = TaskServer(service, args.allow_origin)
+    port = await server.start(args.host, args.port)
+    print(f"Serving on http://{args.host}:{port}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+    await server.stop()
+    service.close()
+    writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--profiles",
+        metavar="DIR",
+        type=Path,
+        default=Path("profiles"),
+        help="Directory of the profiles of the learners (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--profile-database",
+        action="store_true",
+        help="Keep the progress of each profile in an SQLite database",
+    )
+    parser.add_argument(
+        "--max-loaded",
+        type=int,
+        default=TaskService.MAX_LOADED,
+        help="Profiles kept in memory; more are unloaded, least recently used "
+        "first (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--allow-origin",
+        metavar="ORIGIN",
+        help="Allow browser pages from this origin (or *) to call the API",
+    )
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from overrides import overrides
+
+from .persistence import write_atomically
+from .speech2text import ISpeech2Text, ITranscriptStream
+
+if TYPE_CHECKING:
+    from .voice_sample import VoiceSample
+
+
+def _hasher(identity: str, frame_rate: int, sample_width: int):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{identity}\0{frame_rate}\0{sample_width}\0".encode())
+    return h
+
+
+class CachedSpeech2Text(ISpeech2Text):
+    """Remembers the transcripts of any ISpeech2Text backend.
+
+    The key is a hash of the audio, its format and the identity() of the backend,
+    so the same recording sent again (re-scoring the archive, a resubmitted attempt)
+    is not transcribed again. At most max_entries transcripts are kept, the least
+    recently used are dropped first.
+
+    With a cache_file, the transcripts are also appended there, and loaded from it
+    when the cache is created. The file is rewritten when it has grown to twice
+    max_entries lines."""
+
+    backend: ISpeech2Text
+    max_entries: int
+    cache_file: Path | None
+    hits: int
+    misses: int
+    _entries: OrderedDict[str, str]
+    _file_lines: int
+    _lock: threading.Lock
+
+    def __init__(
+        self,
+        backend: ISpeech2Text,
+        max_entries: int = 10000,
+        cache_file: Path | None = None,
+    ):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.cache_file = None if cache_file is None else Path(cache_file)
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._file_lines = 0
+        self._lock = threading.Lock()
+        if self.cache_file is not None and self.cache_file.exists():
+            self._load()
+
+    def _load(self):
+        with open(self.cache_file, "rb") as f:
+            for line in f:
+                try:
+                    key, transcript = json.loads(line)
+                except (json.JSONDecodeError, ValueError):
+                    continue  # Torn line of an interrupted write
+                self._entries[key] = transcript
+                self._entries.move_to_end(key)
+                self._file_lines += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def key(self, pcm: bytes, frame_rate: int, sample_width: int = 2) -> str:
+        h = _hasher(self.backend.identity(), frame_rate, sample_width)
+        h.update(pcm)
+        return h.hexdigest()
+
+    def lookup(self, key: str) -> str | None:
+        with self._lock:
+            transcript = self._entries.get(key)
+            if transcript is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return transcript
+
+    def store(self, key: str, transcript: str):
+        with self._lock:
+            self._entries[key] = transcript
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.cache_file is None:
+                return
+            if self._file_lines >= 2 * self.max_entries:
+                lines = [json.dumps(item) + "\n" for item in self._entries.items()]
+                write_atomically(self.cache_file, "".join(lines).encode())
+                self._file_lines = len(lines)
+            else:
+                with open(self.cache_file, "a") as f:
+                    f.write(json.dumps([key, transcript]) + "\n")
+                self._file_lines += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @overrides
+    def identity(self) -> str:
+        return self.backend.identity()
+
+    @overrides
+    def get_transcript(self, sound: VoiceSample) -> str:
+        key = self.key(sound.data, sound.frame_rate, sound.sample_width)
+        transcript = self.lookup(key)
+        if transcript is None:
+            transcript = self.backend.get_transcript(sound)
+            # An empty one could be a hiccup of the backend, try again next time
+            if transcript != "":
+                self.store(key, transcript)
+        return transcript
+
+    @overrides
+    def start_stream(self, frame_rate: int, sample_width: int = 2) -> ITranscriptStream:
+        return CachedTranscriptStream(self, frame_rate, sample_width)
+
+
+class CachedTranscriptStream(ITranscriptStream):
+    """Hashes the audio while passing it on to the stream of the backend. If the
+    transcript is in the cache when the audio ends, the backend stream is cancelled."""
+
+    _cache: CachedSpeech2Text
+    _stream: ITranscriptStream
+
+    def __init__(
+        self, cache: CachedSpeech2Text, frame_rate: int, sample_width: int = 2
+    ):
+        self._cache = cache
+        self._stream = cache.backend.start_stream(frame_rate, sample_width)
+        self._hasher = _hasher(cache.backend.identity(), frame_rate, sample_width)
+
+    @overrides
+    def feed(self, chunk: bytes):
+        self._hasher.update(chunk)
+        self._stream.feed(chunk)
+
+    @overrides
+    def finish(self, timeout: float | None = None) -> str:
+        key = self._hasher.hexdigest()
+        transcript = self._cache.lookup(key)
+        if transcript is not None:
+            self._stream.cancel()
+            return transcript
+        transcript = self._stream.finish(timeout)
+        if transcript != "":
+            self._cache.store(key, transcript)
+        return transcript
+
+    @overrides
+    def cancel(self):
+        self._stream.cancel()
@@ -0,0 +1,151 @@
+from collections import deque
+from collections.abc import Callable
+
+import numpy as np
+from overrides import overrides
+
+from .speech2text import ITranscriptStream
+
+FRAME_MS = 20
+MIN_ENERGY_DB = -50.0  # Frames quieter than this (dBFS) are never speech
+SPEECH_ABOVE_FLOOR_DB = 12.0  # Voiced speech is this much louder than the noise
+FRICATIVE_ABOVE_FLOOR_DB = 6.0  # "sz", "cz", "ś"... are quieter, but noisy
+FRICATIVE_ZCR = 0.25  # Zero crossings per sample typical for fricatives
+NOISE_FLOOR_RISE_DB = 0.05  # Per frame, i.e. 2.5 dB/s
+
+
+def frame_features(
+    samples: np.ndarray, frame_len: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Energy (dBFS) and zero-crossing rate of each whole frame of int16 samples."""
+    n = len(samples) // frame_len
+    frames = samples[: n * frame_len].reshape(n, frame_len).astype(np.float32) / 32768
+    energy_db = 10 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_len
+    return energy_db, zcr
+
+
+def speech_frames(
+    energy_db: np.ndarray, zcr: np.ndarray, noise_floor_db: float
+) -> np.ndarray:
+    loud = energy_db > max(MIN_ENERGY_DB, noise_floor_db + SPEECH_ABOVE_FLOOR_DB)
+    fricative = (
+        energy_db > max(MIN_ENERGY_DB, noise_floor_db + FRICATIVE_ABOVE_FLOOR_DB)
+    ) & (zcr > FRICATIVE_ZCR)
+    return loud | fricative
+
+
+def trim_silence(
+    samples: np.ndarray, frame_rate: int, padding_ms: int = 200
+) -> tuple[int, int]:
+    """Returns (start, end) of the part of the recording with speech, widened by
+    padding_ms on each side. start == end if there is no speech at all."""
+    frame_len = frame_rate * FRAME_MS // 1000
+    energy_db, zcr = frame_features(samples, frame_len)
+    if len(energy_db) == 0:
+        return 0, 0
+    noise_floor_db = float(np.percentile(energy_db, 10))
+    speech = np.flatnonzero(speech_frames(energy_db, zcr, noise_floor_db))
+    if len(speech) == 0:
+        return 0, 0
+    padding = frame_rate * padding_ms // 1000
+    start = max(0, speech[0] * frame_len - padding)
+    end = min(len(samples), (speech[-1] + 1) * frame_len + padding)
+    return int(start), int(end)
+
+
+class VadGate(ITranscriptStream):
+    """Sits between the recorder and a transcript stream, and passes on only the
+    speech: leading silence and long pauses are held back (except for padding_ms of
+    lead-in and tail around the speech), and trailing silence is never sent.
+
+    If auto_stop_ms is given, on_auto_stop is called (on the audio thread) once
+    there was speech followed by that much silence."""
+
+    _stream: ITranscriptStream
+    _frame_len: int
+    _padding: int  # samples
+    _held: deque[bytes]  # Silence that is sent only if speech follows
+    _held_samples: int
+    _tail_left: int  # Samples of silence after speech that still go straight through
+    _noise_floor_db: float | None
+    speech_started: bool
+    silence_samples: int  # Since the last speech
+
+    def __init__(
+        self,
+        stream: ITranscriptStream,
+        frame_rate: int,
+        padding_ms: int = 200,
+        auto_stop_ms: int | None = None,
+        on_auto_stop: Callable[[], None] | None = None,
+    ):
+        self._stream = stream
+        self._frame_len = frame_rate * FRAME_MS // 1000
+        self._padding = frame_rate * padding_ms // 1000
+        self._auto_stop = (
+            None if auto_stop_ms is None else frame_rate * auto_stop_ms // 1000
+        )
+        self._on_auto_stop = on_auto_stop
+        self._held = deque()
+        self._held_samples = 0
+        self._tail_left = 0
+        self._noise_floor_db = None
+        self.speech_started = False
+        self.silence_samples = 0
+
+    def _is_speech(self, samples: np.ndarray) -> bool:
+        energy_db, zcr = frame_features(samples, self._frame_len)
+        if len(energy_db) == 0:
+            return False
+        # The background noise is estimated by the quietest frame, and the estimate
+        # slowly rises so that it can follow a noise that gets louder.
+        quietest = float(energy_db.min())
+        if self._noise_floor_db is None:
+            self._noise_floor_db = quietest
+        else:
+            self._noise_floor_db = min(
+                self._noise_floor_db + NOISE_FLOOR_RISE_DB * len(energy_db), quietest
+            )
+        return bool(speech_frames(energy_db, zcr, self._noise_floor_db).any())
+
+    @overrides
+    def feed(self, chunk: bytes):
+        samples = np.frombuffer(chunk, np.int16)
+        if self._is_speech(samples):
+            for held in self._held:
+                self._stream.feed(held)
+            self._held.clear()
+            self._held_samples = 0
+            self._stream.feed(chunk)
+            self.speech_started = True
+            self.silence_samples = 0
+            self._tail_left = self._padding
+            return
+
+        self.silence_samples += len(samples)
+        if self._tail_left > 0:
+            self._stream.feed(chunk)
+            self._tail_left -= len(samples)
+        else:
+            self._held.append(chunk)
+            self._held_samples += len(samples)
+            while self._held_samples - len(self._held[0]) // 2 >= self._padding:
+                self._held_samples -= len(self._held.popleft()) // 2
+        if (
+            self._auto_stop is not None
+            and self.speech_started
+            and self.silence_samples >= self._auto_stop
+            and self._on_auto_stop is not None
+        ):
+            on_auto_stop, self._on_auto_stop = self._on_auto_stop, None
+            on_auto_stop()
+
+    @overrides
+    def finish(self, timeout: float | None = None) -> str:
+        return self._stream.finish(timeout)
+
+    @overrides
+    def cancel(self):
+        self._stream.cancel()
@@ -1,13 +1,63 @@
 from __future__ import annotations
 
 import base64
-import wave
+import struct
 from pathlib import Path
 
 import numpy as np
-import pyaudio
 from pydantic import BaseModel, field_serializer, field_validator
-from pydub import AudioSegment
+
+from .resample import resample
+
+WAV_HEADER_SIZE = 44
+
+
+def wav_header(frame_rate: int, data_size: int, sample_width: int = 2) -> bytes:
+    """Header of a mono PCM WAV file, with data_size bytes of samples after it."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        36 + data_size,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        1,  # Mono
+        frame_rate,
+        frame_rate * sample_width,
+        sample_width,
+        8 * sample_width,
+        b"data",
+        data_size,
+    )
+
+
+def read_wav_header(f) -> tuple[int, int, int, int]:
+    """Reads the header of a mono PCM WAV file.
+
+    Returns (frame_rate, sample_width, offset, size) of the sample data. Chunks other
+    than "fmt " and "data" are skipped, so files written by other tools work too."""
+    riff, _, wave_id = struct.unpack("<4sI4s", f.read(12))
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        raise ValueError("Not a WAV file")
+    frame_rate = sample_width = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("WAV file without data")
+        chunk_id, size = struct.unpack("<4sI", header)
+        if chunk_id == b"fmt ":
+            fmt = f.read(size + size % 2)
+            audio_format, channels, frame_rate = struct.unpack("<HHI", fmt[:8])
+            sample_width = struct.unpack("<H", fmt[14:16])[0] // 8
+            if audio_format != 1 or channels != 1:
+                raise ValueError("Only mono PCM WAV files are supported")
+        elif chunk_id == b"data":
+            if frame_rate is None:
+                raise ValueError("WAV file without format")
+            return frame_rate, sample_width, f.tell(), size
+        else:
+            f.seek(size + size % 2, 1)
 
 
 class VoiceSample(BaseModel):
@@ -15,6 +65,47 @@ class VoiceSample(BaseModel):
     frame_rate: int
     sample_width: int = 2
 
+    @classmethod
+    def FromArray(cls, samples: np.ndarray, frame_rate: int) -> VoiceSample:
+        """Wraps an array of int16 samples without copying it. The data of the result
+        is a memoryview of the array."""
+        assert samples.dtype == np.int16
+        return cls.model_construct(
+            data=memoryview(np.ascontiguousarray(samples)).cast("B"),
+            frame_rate=frame_rate,
+            sample_width=2,
+        )
+
+    @classmethod
+    def Load(cls, filename: Path, mmap: bool = True) -> VoiceSample:
+        """Loads a WAV file, e.g. one written by save(). With mmap, the samples are
+        memory-mapped instead of read: nothing is read from disk until the data is
+        used, and only the parts that are used (see Slice())."""
+        with open(filename, "rb") as f:
+            frame_rate, sample_width, offset, size = read_wav_header(f)
+        if sample_width != 2:
+            raise ValueError("Only 16-bit WAV files are supported")
+        count = size // 2
+        if count == 0:
+            samples = np.zeros(0, np.int16)
+        elif mmap:
+            samples = np.memmap(filename, np.int16, "r", offset, (count,))
+        else:
+            samples = np.fromfile(filename, np.int16, count, offset=offset)
+        return cls.FromArray(samples, frame_rate)
+
+    def Slice(self, start: float, end: float | None = None) -> VoiceSample:
+        """The part from start to end seconds, without copying."""
+        first = int(start * self.frame_rate)
+        last = None if end is None else int(end * self.frame_rate)
+        return VoiceSample.FromArray(self.samples[first:last], self.frame_rate)
+
+    @property
+    def samples(self) -> np.ndarray:
+        """The data as an array of int16 samples. No copy is made."""
+        assert self.sample_width == 2
+        return np.frombuffer(self.data, np.int16)
+
     @field_validator("data", mode="before")
     @classmethod
     def validate_data(cls, data: bytes) -> bytes:
@@ -29,42 +120,21 @@ class VoiceSample(BaseModel):
         return base64.b85encode(data)
 
     def get_sample_as_np_array(self) -> np.ndarray:
-        audio_segment = AudioSegment(
-            self.data,
-            frame_rate=self.frame_rate,
-            sample_width=self.sample_width,
-            channels=1,
-        )
-
+        arr = self.samples.astype(np.float32) / 32768.0
         if self.frame_rate != 16000:  # 16 kHz
-            audio_segment = audio_segment.set_frame_rate(16000)
-        arr = np.array(audio_segment.get_array_of_samples())
-        arr = arr.astype(np.float32) / 32768.0
+            arr = resample(arr, self.frame_rate, 16000)
         return arr / np.sum(np.abs(arr))
 
     def ResampledClone(self, frame_rate: int = 16000) -> VoiceSample:
-        audio_segment = AudioSegment(
-            self.data,
-            frame_rate=self.frame_rate,
-            sample_width=self.sample_width,
-            channels=1,
-        )
-
-        audio_segment = audio_segment.set_frame_rate(frame_rate)
-        return VoiceSample(
-            data=audio_segment.raw_data,
-            frame_rate=frame_rate,
-            sample_width=self.sample_width,
+        return VoiceSample.FromArray(
+            resample(self.samples, self.frame_rate, frame_rate), frame_rate
         )
 
     def save(self, filename: Path):
-        # Save the last recording as WAV file
-        wf = wave.open(str(filename), "wb")
-        wf.setnchannels(1)
-        wf.setsampwidth(self.sample_width)
-        wf.setframerate(self.frame_rate)
-        wf.writeframes(self.data)
-        wf.close()
+        # Save as WAV file: the header and then the raw samples, which Load() can map
+        with open(filename, "wb") as f:
+            f.write(wav_header(self.frame_rate, len(self.data), self.sample_width))
+            f.write(self.data)
 
     def __len__(self):
         return len(self.data)
@@ -75,6 +145,8 @@ class VoiceSample(BaseModel):
 
     def play(self):
         # Play the last recording
+        import pyaudio  # Only playback needs PortAudio
+
         p = pyaudio.PyAudio()
         if self.sample_width == 2:
             p_format = pyaudio.paInt16
@@ -0,0 +1,51 @@
+"""Compares the speed of Mnozenie.resample with pydub's set_frame_rate().
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_resample
+
+Exits with 1 if resample() is slower than pydub on any of the clips.
+"""
+
+import sys
+import time
+
+import numpy as np
+from pydub import AudioSegment
+
+from Mnozenie.resample import resample
+
+CLIP_SECONDS = [10, 60]
+
+
+def best_time(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    slower = False
+    for seconds in CLIP_SECONDS:
+        samples = (np.random.default_rng(0).normal(size=44100 * seconds) * 3000).astype(
+            np.int16
+        )
+        segment = AudioSegment(
+            samples.tobytes(), frame_rate=44100, sample_width=2, channels=1
+        )
+        ours = best_time(lambda samples=samples: resample(samples, 44100, 16000))
+        pydub = best_time(lambda segment=segment: segment.set_frame_rate(16000))
+        print(
+            f"{seconds} s clip: numpy {ours * 1000:.1f} ms, pydub {pydub * 1000:.1f} ms"
+        )
+        slower |= ours >= pydub
+    if slower:
+        print("resample() is slower than pydub")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
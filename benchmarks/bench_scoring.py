@@ -0,0 +1,226 @@
+"""Benchmarks of the scoring of czytanie.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_scoring                    # compare with the baseline
+    python -m benchmarks.bench_scoring --update-baseline  # store a new baseline
+
+The times are divided by the time of a fixed pure-Python calibration loop, so that
+a baseline recorded on one machine roughly applies to another. A case that got
+slower than the baseline by more than the tolerance makes the script exit with 1.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from Mnozenie.czytanie_scoring import (
+    calc_time_penalty,
+    compile_sentence,
+    highlight_sentence,
+    just_letters,
+    score_sentence,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).with_name("scoring_baseline.json")
+CORPORA = [
+    ROOT / "czytanie-sentences.txt",
+    ROOT / "Mnozenie" / "czytanie-sentences.txt",
+]
+LENGTHS = {"sentence": 12, "paragraph": 80, "page": 350}  # Words
+ERROR_RATES = [0.0, 0.1, 0.3]
+MIN_TIME = 0.1  # Seconds of calls per measurement
+REPEATS = 7
+
+
+def load_sentences() -> list[str]:
+    return [
+        line.strip()
+        for path in CORPORA
+        for line in path.read_text(encoding="utf-8").splitlines()
+        if line.strip()
+    ]
+
+
+def synthetic_text(rng: random.Random, vocabulary: list[str], words: int) -> str:
+    """Random Polish words with punctuation, in sentences of 5 to 15 words."""
+    out = []
+    while len(out) < words:
+        sentence = rng.choices(vocabulary, k=min(rng.randint(5, 15), words - len(out)))
+        sentence[0] = sentence[0].capitalize()
+        for k in range(len(sentence) - 1):
+            if rng.random() < 0.1:
+                sentence[k] += ","
+        sentence[-1] += rng.choice([".", ".", ".", "!", "?"])
+        out.extend(sentence)
+    return " ".join(out)
+
+
+def misread(rng: random.Random, text: str, error_rate: float) -> str:
+    """What a transcript of a child reading the text might look like: some words
+    are mangled, skipped or repeated, and there is no punctuation or capitals."""
+    out = []
+    for word in just_letters(text).split():
+        if rng.random() >= error_rate:
+            out.append(word)
+            continue
+        kind = rng.random()
+        if kind < 0.5:
+            k = rng.randrange(len(word))
+            out.append(word[:k] + rng.choice("aeioyszcrnkw") + word[k + 1 :])
+        elif kind < 0.8:
+            pass  # Skipped
+        else:
+            out.extend([word, word])
+    return " ".join(out)
+
+
+def make_cases() -> dict[str, list[tuple[str, str]]]:
+    """(reference, transcript) pairs of each case."""
+    rng = random.Random(0)
+    sentences = load_sentences()
+    vocabulary = just_letters(" ".join(sentences)).split()
+    cases = {}
+    for length, words in LENGTHS.items():
+        count = max(1, 400 // words)
+        for error_rate in ERROR_RATES:
+            pairs = []
+            for _ in range(count):
+                reference = synthetic_text(rng, vocabulary, words)
+                pairs.append((reference, misread(rng, reference, error_rate)))
+            cases[f"{length}-{int(error_rate * 100)}%"] = pairs
+    cases["corpus"] = [(s, misread(rng, s, 0.1)) for s in sentences]
+    return cases
+
+
+def measure(fn: Callable[[], object]) -> float:
+    """Seconds per call of fn, the best of REPEATS."""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            break
+        loops *= 2
+    best = elapsed / loops
+    for _ in range(REPEATS - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def calibration() -> float:
+    def work():
+        total = 0
+        for k in range(10000):
+            total += k * k % 7
+        return total
+
+    return measure(work)
+
+
+def cold(fn: Callable[[], object]) -> Callable[[], object]:
+    """fn with the cache of compiled sentences emptied first, so that every pass
+    pays for compiling its references, as the apps do for a sentence not seen
+    before."""
+
+    def run_cold():
+        compile_sentence.cache_clear()
+        return fn()
+
+    return run_cold
+
+
+def run() -> dict[str, float]:
+    """Time of one pass over each case with each function, in calibration units.
+    The score_sentence_warm rows score references that are compiled already."""
+    results = {}
+    for name, pairs in make_cases().items():
+        masks = [[k % 3 != 0 for k in range(len(r.split()))] for r, _ in pairs]
+        compiled = [(compile_sentence(r), t) for r, t in pairs]
+        benchmarks = {
+            "just_letters": lambda pairs=pairs: [just_letters(r) for r, _ in pairs],
+            "compile_sentence": cold(
+                lambda pairs=pairs: [compile_sentence(r) for r, _ in pairs]
+            ),
+            "score_sentence": cold(
+                lambda pairs=pairs: [score_sentence(r, t) for r, t in pairs]
+            ),
+            "score_sentence_warm": lambda compiled=compiled: [
+                score_sentence(c, t) for c, t in compiled
+            ],
+            "highlight_sentence": cold(
+                lambda pairs=pairs, masks=masks: [
+                    highlight_sentence(r, m) for (r, _), m in zip(pairs, masks)
+                ]
+            ),
+            "calc_time_penalty": cold(
+                lambda pairs=pairs: [calc_time_penalty(10.0, r) for r, _ in pairs]
+            ),
+        }
+        for function, fn in benchmarks.items():
+            results[f"{function}/{name}"] = measure(fn)
+    unit = calibration()
+    return {key: seconds / unit for key, seconds in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.0,
+        help="Allowed slowdown against the baseline, 1.0 = twice as slow. Timings "
+        "on a busy machine easily vary by 50%%; this is meant to catch changes of "
+        "the complexity, not of a few percent",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the results here")
+    args = parser.parse_args()
+
+    results = run()
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "calibration loops",
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=4))
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(report, indent=4) + "\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+        return
+
+    baseline = json.loads(BASELINE_FILE.read_text())["results"]
+    regressions = []
+    for key, value in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            print(f"{key:45} {value:10.2f}  (new)")
+            continue
+        ratio = value / reference
+        flag = ""
+        if ratio > 1 + args.tolerance:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:45} {value:10.2f}  {ratio:6.2f}x of baseline{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks got slower than the baseline allows:")
+        for key in regressions:
+            print(f"  {key}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
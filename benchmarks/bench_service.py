@@ -0,0 +1,145 @@
+"""Load test of the headless Tasks service (Mnozenie.tasks_service).
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_service --learners 300 --think-ms 1000
+
+Starts the service on a free port with profiles in a temporary directory, opens a
+keep-alive HTTP connection per learner and lets every learner answer tasks with a
+random think time in between, all in this one process, on one core. Prints the
+latency percentiles of the answer requests as the clients see them, and exits
+with 1 if the p99 is over --max-p99-ms. The profiles are not preloaded, and with
+the default --max-loaded of the service some get unloaded and loaded again, as
+they would in production.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from Mnozenie.persistence import PersistenceWriter
+from Mnozenie.profiles import ProfileManager
+from Mnozenie.tasks_service import TaskServer, TaskService
+
+
+async def request(reader, writer, method: str, path: str, body: dict) -> dict:
+    data = json.dumps(body).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+        + data
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.lower().split(b"content-length: ")[1].split(b"\r\n")[0])
+    return json.loads(await reader.readexactly(length))
+
+
+async def learner(
+    port: int,
+    service: TaskService,
+    name: str,
+    answers: int,
+    think: float,
+    rng: random.Random,
+    latencies: list[float],
+):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    state = await request(reader, writer, "POST", "/sessions", {"learner": name})
+    session_id = state["session"]
+    for _ in range(answers):
+        await asyncio.sleep(rng.expovariate(1 / think))
+        task = service._sessions[session_id].task
+        answer = task.result if rng.random() < 0.8 else task.result + 1
+        start = time.perf_counter()
+        await request(
+            reader, writer, "POST", f"/sessions/{session_id}/answer", {"answer": answer}
+        )
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def run(args: argparse.Namespace) -> list[float]:
+    with tempfile.TemporaryDirectory() as root:
+        writer = PersistenceWriter()
+        profiles = ProfileManager(
+            Path(root),
+            use_database=args.database,
+            max_loaded=args.max_loaded,
+            writer=writer,
+        )
+        names = [f"learner{k}" for k in range(args.learners)]
+        service = TaskService(profiles)
+        server = TaskServer(service)
+        port = await server.start("127.0.0.1", 0)
+        rng = random.Random(0)
+        latencies = []
+        await asyncio.gather(
+            *(
+                learner(
+                    port,
+                    service,
+                    name,
+                    args.answers,
+                    args.think_ms / 1000,
+                    rng,
+                    latencies,
+                )
+                for name in names
+            )
+        )
+        await server.stop()
+        service.close()
+        writer.close()
+    return latencies
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--learners", type=int, default=300)
+    parser.add_argument("--answers", type=int, default=10, help="Per learner")
+    parser.add_argument(
+        "--think-ms",
+        type=float,
+        default=1000,
+        help="Mean time between the answers of a learner. Much less overloads a "
+        "single core, and then the latency is just the queue",
+    )
+    parser.add_argument("--database", action="store_true", help="SQLite profiles")
+    parser.add_argument(
+        "--max-loaded",
+        type=int,
+        default=TaskService.MAX_LOADED,
+        help="Profiles kept in memory, as in the service (default: %(default)s). "
+        "With fewer than --learners, profiles get unloaded and loaded again",
+    )
+    parser.add_argument("--max-p99-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run(args))
+    elapsed = time.perf_counter() - start
+    ms = {q: percentile(latencies, q) * 1000 for q in (0.5, 0.9, 0.99)}
+    print(
+        f"{len(latencies)} answers of {args.learners} learners in {elapsed:.1f} s "
+        f"({len(latencies) / elapsed:.0f}/s)"
+    )
+    print(
+        f"latency ms: p50 {ms[0.5]:.2f}  p90 {ms[0.9]:.2f}  p99 {ms[0.99]:.2f}  "
+        f"max {max(latencies) * 1000:.2f}"
+    )
+    if ms[0.99] > args.max_p99_ms:
+        print(f"p99 over {args.max_p99_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
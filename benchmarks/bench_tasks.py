@@ -0,0 +1,301 @@
+"""Benchmarks of the Tasks scheduler of mnozenie, driven by simulated learners.
+
+Run from the root of the repository:
+
+    python -m benchmarks.bench_tasks                    # compare with the baseline
+    python -m benchmarks.bench_tasks --update-baseline  # store a new baseline
+
+A simulated learner answers the tasks the way MnozenieApp takes the answers: a
+wrong answer is followed by the same task, and only a right answer in time to a
+task that was not failed just before counts as correct. For each size of the task
+space and each storage of the progress, the script reports the latency
+percentiles of get_next_task() and give_feedback(), the throughput of the whole
+loop, the time of serialize_performance() and the peak memory. It also reports
+how well each kind of learner knows the facts after practicing, so that changes
+of the scheduling can be judged by what the child learns.
+
+Each timed run is repeated REPEATS times and the median is reported. Times are in
+units of the calibration loop of bench_scoring, as in its baseline. A time or
+memory over the baseline by more than the tolerance, or a mastery lower than the
+baseline by more than MASTERY_SLACK, makes the script exit with 1. The p99
+latencies are too noisy for that and are only reported.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from Mnozenie.persistence import PersistenceWriter
+from Mnozenie.progress_repository import (
+    JsonProgressRepository,
+    SqliteProgressRepository,
+)
+from Mnozenie.tasks import ITask, Tasks
+
+from .bench_scoring import calibration, measure
+
+BASELINE_FILE = Path(__file__).with_name("tasks_baseline.json")
+SIZES = {  # Arguments of Tasks()
+    "app": (10, 100, 10),  # What MnozenieApp uses
+    "20": (20, 400, 10),
+    "40": (40, 1600, 10),
+    "80": (80, 6400, 10),
+}
+STORAGES = ["memory", "json", "sqlite"]
+ANSWERS = 5000  # Per timed run
+REPEATS = 5  # Timed runs per size and storage
+MASTERY_ANSWERS = 1000  # Practice before the mastery is measured
+MASTERY_SLACK = 0.02
+SEED = 0
+
+
+@dataclass
+class SimulatedLearner:
+    """Knows each fact with some probability, which starts lower for harder facts
+    and grows with each right answer. Answers faster the better the fact is known,
+    with log-normal noise."""
+
+    skill: float  # Chance of a right answer to an easy fact never practiced
+    learning_rate: float  # Part of the remaining gap closed by a right answer
+    speed: float  # Time to answer as a part of the time limit, for a known fact
+    rng: random.Random = field(default_factory=lambda: random.Random(SEED))
+    _known: dict[str, float] = field(default_factory=dict)
+
+    def knowledge(self, task: ITask) -> float:
+        question = task.get_question()
+        known = self._known.get(question)
+        if known is None:
+            known = max(0.05, self.skill - 0.1 * task.difficulty_score)
+        return known
+
+    def answer(self, task: ITask) -> tuple[bool, float]:
+        """Whether the answer is right, and the seconds it took."""
+        known = self.knowledge(task)
+        correct = self.rng.random() < known
+        if correct:
+            self._known[task.get_question()] = known + self.learning_rate * (1 - known)
+        seconds = (
+            task.get_time_limit() * self.speed / (0.5 + known)
+        ) * self.rng.lognormvariate(0, 0.4)
+        return correct, seconds
+
+    def mastery(self, tasks: Tasks) -> float:
+        """The mean chance of a right answer over all the tasks."""
+        return float(np.mean([self.knowledge(task) for task in tasks._tasks]))
+
+
+LEARNERS = {
+    "beginner": {"skill": 0.5, "learning_rate": 0.05, "speed": 0.8},
+    "average": {"skill": 0.7, "learning_rate": 0.1, "speed": 0.5},
+    "strong": {"skill": 0.9, "learning_rate": 0.2, "speed": 0.3},
+}
+
+
+def practice(
+    tasks: Tasks,
+    learner: SimulatedLearner,
+    answers: int,
+    next_times: list[int] | None = None,
+    feedback_times: list[int] | None = None,
+):
+    """Lets the learner give `answers` answers. Appends the nanoseconds of each
+    get_next_task() and give_feedback() call to the lists."""
+    next_times = [] if next_times is None else next_times
+    feedback_times = [] if feedback_times is None else feedback_times
+    clock = time.perf_counter_ns
+    start = clock()
+    task = tasks.get_next_task()
+    next_times.append(clock() - start)
+    repetition = False
+    for _ in range(answers):
+        correct, seconds = learner.answer(task)
+        start = clock()
+        if correct:
+            tasks.give_feedback(
+                task, seconds <= task.get_time_limit() and not repetition
+            )
+            feedback_times.append(clock() - start)
+            start = clock()
+            task = tasks.get_next_task()
+            next_times.append(clock() - start)
+            repetition = False
+        else:
+            tasks.give_feedback(task, False)
+            feedback_times.append(clock() - start)
+            repetition = True
+
+
+def make_tasks(
+    size: tuple[int, int, int],
+    storage: str,
+    directory: Path,
+    writer: PersistenceWriter | None = None,
+) -> Tasks:
+    """With "json" storage, the journal is written through the writer, as in the
+    apps."""
+    if storage == "memory":
+        tasks = Tasks(*size, seed=SEED)
+    elif storage == "json":
+        repository = JsonProgressRepository(
+            directory / "performance.json", writer=writer
+        )
+        tasks = Tasks.CreateFromRepository(repository, *size, seed=SEED)
+    else:
+        repository = SqliteProgressRepository(directory / "progress.sqlite")
+        tasks = Tasks.CreateFromRepository(repository, *size, seed=SEED)
+    return tasks
+
+
+def percentile(values: list[int], q: float) -> float:
+    return float(np.percentile(np.array(values), q * 100))
+
+
+def timed_run(
+    learner_kind: str, size: tuple[int, int, int], storage: str
+) -> dict[str, float]:
+    """Seconds of one run of ANSWERS answers, by the name of the measurement."""
+    with tempfile.TemporaryDirectory() as directory:
+        writer = PersistenceWriter() if storage == "json" else None
+        tasks = make_tasks(size, storage, Path(directory), writer)
+        learner = SimulatedLearner(**LEARNERS[learner_kind])
+        next_times, feedback_times = [], []
+        start = time.perf_counter()
+        practice(tasks, learner, ANSWERS, next_times, feedback_times)
+        elapsed = time.perf_counter() - start
+        tasks.close()
+        if writer is not None:
+            writer.close()
+    times = {"answer": elapsed / ANSWERS}
+    for function, samples in (
+        ("get_next_task", next_times),
+        ("give_feedback", feedback_times),
+    ):
+        times[f"{function}_p50"] = percentile(samples, 0.5) / 1e9
+        times[f"{function}_p99"] = percentile(samples, 0.99) / 1e9
+    return times
+
+
+def run(learner_kind: str) -> dict[str, float]:
+    """Times in calibration units, memory in KiB, mastery as a probability."""
+    times = {}
+    other = {}
+    for name, size in SIZES.items():
+        for storage in STORAGES:
+            runs = [timed_run(learner_kind, size, storage) for _ in range(REPEATS)]
+            key = f"{name}/{storage}"
+            for measurement in runs[0]:
+                times[f"{key}/{measurement}"] = float(
+                    np.median([r[measurement] for r in runs])
+                )
+            other[f"{key}/answers_per_s"] = 1 / times[f"{key}/answer"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            tasks = make_tasks(size, "memory", Path(directory))
+            practice(tasks, SimulatedLearner(**LEARNERS[learner_kind]), ANSWERS)
+            json_file = Path(directory) / "performance.json"
+            times[f"{name}/serialize_performance"] = measure(
+                lambda tasks=tasks, json_file=json_file: tasks.serialize_performance(
+                    json_file
+                )
+            )
+
+        tracemalloc.start()
+        tasks = make_tasks(size, "memory", Path())
+        practice(tasks, SimulatedLearner(**LEARNERS[learner_kind]), ANSWERS)
+        other[f"{name}/memory_kib"] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+
+    for kind, parameters in LEARNERS.items():
+        tasks = make_tasks(SIZES["app"], "memory", Path())
+        learner = SimulatedLearner(**parameters)
+        practice(tasks, learner, MASTERY_ANSWERS)
+        other[f"mastery/{kind}"] = learner.mastery(tasks)
+
+    unit = calibration()
+    results = {key: seconds / unit for key, seconds in times.items()}
+    results.update(other)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument(
+        "--learner",
+        choices=sorted(LEARNERS),
+        default="average",
+        help="The learner of the timed runs",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1.0,
+        help="Allowed slowdown or memory growth against the baseline, 1.0 = twice "
+        "as much. Timings on a busy machine easily vary by 50%%",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the results here")
+    args = parser.parse_args()
+
+    if not args.update_baseline:
+        baseline = json.loads(BASELINE_FILE.read_text())
+        if baseline["learner"] != args.learner:
+            print(
+                f"The baseline was recorded with the {baseline['learner']} learner, "
+                f"not {args.learner}. Compare with --learner {baseline['learner']}, "
+                "or record a new baseline"
+            )
+            sys.exit(1)
+
+    results = run(args.learner)
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "calibration loops, KiB, answers/s, probability",
+        "learner": args.learner,
+        "results": results,
+    }
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=4))
+    if args.update_baseline:
+        BASELINE_FILE.write_text(json.dumps(report, indent=4) + "\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+        return
+
+    regressions = []
+    for key, value in results.items():
+        reference = baseline["results"].get(key)
+        if reference is None:
+            print(f"{key:40} {value:12.4f}  (new)")
+            continue
+        flag = ""
+        if key.startswith("mastery/"):
+            comparison = f"{value - reference:+8.3f} of baseline"
+            regressed = value < reference - MASTERY_SLACK
+        elif key.endswith(("/answers_per_s", "_p99")):
+            comparison = f"{value / reference:6.2f}x of baseline"
+            regressed = False  # By the time of an answer; p99 is too noisy
+        else:
+            comparison = f"{value / reference:6.2f}x of baseline"
+            regressed = value > reference * (1 + args.tolerance)
+        if regressed:
+            flag = "  REGRESSION"
+            regressions.append(key)
+        print(f"{key:40} {value:12.4f}  {comparison}{flag}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmarks got worse than the baseline allows:")
+        for key in regressions:
+            print(f"  {key}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
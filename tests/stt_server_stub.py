@@ -0,0 +1,113 @@
+"""Local stand-in for the transcription server, for tests.
+
+Implements the endpoints described in Speech2Text. The "transcript" is produced by
+the `transcribe` callable given to the server, from the raw PCM it received."""
+
+import base64
+import io
+import json
+import threading
+import time
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Mnozenie.speech2text import FLAC, RAW_PCM
+
+
+def default_transcribe(pcm: bytes, frame_rate: int) -> str:
+    return f"{len(pcm)} bytes at {frame_rate} Hz"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "SpeechServerStub"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+            return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return bytes(body)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            self.server.chunk_times.append(time.monotonic())
+
+    def _reply(self, text: str, status: int = 200):
+        data = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/request/":
+            return self._reply("not found", 404)
+        sound = json.loads(self._read_body())  # VoiceSample.json()
+        pcm = base64.b85decode(sound["data"])
+        self.server.requests.append(("json", len(pcm)))
+        self._reply(self.server.transcribe(pcm, sound["frame_rate"]))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/stream/" and self.server.streaming:
+            self.server.requests.append(("stream", len(body)))
+            frame_rate = int(self.headers["X-Frame-Rate"])
+            return self._reply(self.server.transcribe(body, frame_rate))
+        if self.path == "/transcribe/" and self.server.upload_formats:
+            content_type = self.headers["Content-Type"]
+            self.server.requests.append((content_type, len(body)))
+            if content_type not in self.server.upload_formats:
+                self.send_response(415)
+                self.send_header("Accept-Post", ", ".join(self.server.upload_formats))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            frame_rate = int(self.headers["X-Frame-Rate"])
+            if content_type == FLAC:
+                import soundfile
+
+                body = soundfile.read(io.BytesIO(body), dtype="int16")[0].tobytes()
+            return self._reply(self.server.transcribe(body, frame_rate))
+        self._reply("not found", 404)
+
+
+class SpeechServerStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        transcribe: Callable[[bytes, int], str] = default_transcribe,
+        streaming: bool = True,
+        upload_formats: tuple[str, ...] = (FLAC, RAW_PCM),
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.transcribe = transcribe
+        self.streaming = streaming
+        self.upload_formats = upload_formats
+        self.requests = []
+        self.chunk_times = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    with SpeechServerStub() as server:
+        print(f"Listening on {server.url}")
+        threading.Event().wait()
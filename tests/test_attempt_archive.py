@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from Mnozenie.attempt_archive import AttemptArchive
+from Mnozenie.persistence import PersistenceWriter
+from Mnozenie.speech2text import FLAC, RAW_PCM
+from Mnozenie.voice_sample import VoiceSample
+
+
+def sound(seed: int) -> VoiceSample:
+    samples = np.random.default_rng(seed).integers(-2000, 2000, 16000, dtype=np.int16)
+    return VoiceSample.FromArray(samples, 16000)
+
+
+def add(archive: AttemptArchive, i: int, sentence: str = "Ala ma kota"):
+    return archive.add(
+        sound(i),
+        sentence,
+        "Ala ma psa",
+        timestamp=1000.0 + i,
+        time_taken=2.0,
+        score=2 / 3,
+        time_score=1.0,
+        words=[True, True, False],
+    )
+
+
+def test_add_and_reopen(tmp_path):
+    archive = AttemptArchive(tmp_path, codec=RAW_PCM)
+    for i in range(5):
+        add(archive, i, "Ala ma kota" if i % 2 == 0 else "Kot ma Alę")
+
+    archive = AttemptArchive(tmp_path)
+    assert len(archive) == 5
+    assert [a.timestamp for a in archive.by_sentence("Kot ma Alę")] == [1001.0, 1003.0]
+    assert [a.id for a in archive.between(1001.0, 1003.0)] == [1, 2]
+    audio = archive.load_audio(archive[3])
+    assert isinstance(audio.data.obj.base, np.memmap)
+    assert np.array_equal(audio.samples, sound(3).samples)
+    assert archive[3].words == [True, True, False]
+
+
+def test_flac_and_background_writer(tmp_path):
+    pytest.importorskip("soundfile")
+    writer = PersistenceWriter(delay=60)
+    archive = AttemptArchive(tmp_path, writer, codec=FLAC)
+    attempt = add(archive, 7)
+    assert np.array_equal(archive.load_audio(attempt).samples, sound(7).samples)
+    writer.close()
+    assert len(AttemptArchive(tmp_path)) == 1
+
+
+def test_rotation_and_rebuilt_index(tmp_path):
+    archive = AttemptArchive(tmp_path, codec=RAW_PCM)
+    archive.SEGMENT_SIZE = 50000  # Room for one attempt per segment
+    for i in range(3):
+        add(archive, i)
+    assert len(list(tmp_path.glob("attempts-*.seg"))) == 3
+
+    (tmp_path / "index.jsonl").unlink()
+    archive = AttemptArchive(tmp_path)
+    assert len(archive) == 3
+    assert np.array_equal(archive.load_audio(archive[2]).samples, sound(2).samples)
+    assert (tmp_path / "index.jsonl").exists()
+
+
+def test_torn_index_tail_is_ignored(tmp_path):
+    archive = AttemptArchive(tmp_path, codec=RAW_PCM)
+    add(archive, 0)
+    add(archive, 1)
+    with open(tmp_path / "index.jsonl", "ab") as f:
+        f.write(b'{"sentence": "Ala')
+    assert len(AttemptArchive(tmp_path)) == 2
+
+
+def test_rescore(tmp_path):
+    archive = AttemptArchive(tmp_path, codec=RAW_PCM)
+    add(archive, 0)
+    archive[0].transcript = "Ala ma kota"
+    (rescored,) = archive.rescore()
+    assert rescored.score == 1.0 and rescored.words == [True, True, True]
+    assert archive[0].score == 2 / 3
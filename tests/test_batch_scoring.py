@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from Mnozenie import score_sentence
+from Mnozenie.batch_scoring import score_batch
+
+PAIRS = [
+    ("Ala ma kota", "Ala ma psa"),
+    ("123 abcdefghijklm 12 1234", ""),
+    ("Kot ma Alę", "Kot ma Alę"),
+    ("Ala ma kota", "Ala ma psa"),
+    ("Swego nie znacie, dopóki go nie stracicie.", "Swego nie znacie dopóki go nie"),
+]
+
+
+@pytest.mark.parametrize("processes, chunk_size", [(1, 500), (2, 2)])
+def test_same_as_score_sentence(processes, chunk_size):
+    batch = score_batch(PAIRS * 3, processes=processes, chunk_size=chunk_size)
+    assert len(batch) == 15
+    for k, (reference, transcript) in enumerate(PAIRS * 3):
+        score, html = score_sentence(reference, transcript)
+        assert batch.scores[k] == pytest.approx(score)
+        assert len(batch.mask(k)) == len(reference.split())
+        assert batch.highlight(k) == html
+
+
+def test_empty():
+    batch = score_batch([])
+    assert len(batch) == 0 and batch.words.dtype == np.bool_
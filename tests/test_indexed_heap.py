@@ -0,0 +1,29 @@
+import random
+
+from Mnozenie.indexed_heap import IndexedHeap
+
+
+def test_matches_dict_model():
+    rnd = random.Random(0)
+    heap = IndexedHeap({i: rnd.random() for i in range(50)})
+    model = {i: heap.priority(i) for i in range(50)}
+    for _ in range(2000):
+        action = rnd.random()
+        key = rnd.randrange(80)
+        if action < 0.5:
+            priority = rnd.random()
+            heap.push(key, priority)
+            model[key] = priority
+        elif action < 0.7 and key in model:
+            heap.remove(key)
+            del model[key]
+        elif model:
+            priority, key = heap.pop()
+            assert priority == min(model.values())
+            assert model.pop(key) == priority
+        assert len(heap) == len(model)
+
+    threshold = 0.3
+    assert sorted(heap.iter_below(threshold)) == sorted(
+        (p, k) for k, p in model.items() if p <= threshold
+    )
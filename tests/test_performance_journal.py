@@ -0,0 +1,64 @@
+import json
+
+from Mnozenie.mnozenie import Tasks
+from Mnozenie.performance_journal import PerformanceJournal
+
+
+def answer_some(tasks: Tasks, n: int):
+    for i in range(n):
+        tasks.give_feedback(tasks._tasks[i % 7], i % 3 != 0)
+
+
+def test_replay_snapshot_and_journal(tmp_path):
+    perf_file = tmp_path / "performance.json"
+    tasks = Tasks.CreateFromJSON(perf_file)
+    answer_some(tasks, 20)
+    tasks.serialize_performance(perf_file)
+    answer_some(tasks, 15)
+    tasks.close()
+
+    assert perf_file.with_name("performance.json.journal").read_text().count("\n") == 15
+    loaded = Tasks.CreateFromJSON(perf_file)
+    assert loaded._performance.as_dict() == tasks._performance.as_dict()
+
+
+def test_torn_line_and_stale_journal(tmp_path):
+    perf_file = tmp_path / "performance.json"
+    tasks = Tasks.CreateFromJSON(perf_file)
+    answer_some(tasks, 10)
+    expected = tasks._performance.as_dict()
+    tasks.close()
+    journal_file = perf_file.with_name("performance.json.journal")
+    journal_content = journal_file.read_bytes()
+
+    # Killed in the middle of writing an answer
+    with open(journal_file, "ab") as f:
+        f.write(b"11 1 2 x")
+    loaded = Tasks.CreateFromJSON(perf_file)
+    assert loaded._performance.as_dict() == expected
+    assert journal_file.read_bytes() == journal_content
+
+    # Killed after writing the snapshot, but before emptying the journal
+    loaded.serialize_performance(perf_file)
+    loaded.close()
+    journal_file.write_bytes(journal_content)
+    assert Tasks.CreateFromJSON(perf_file)._performance.as_dict() == expected
+
+
+def test_legacy_snapshot(tmp_path):
+    perf_file = tmp_path / "performance.json"
+    perf_file.write_text(json.dumps({"2 x 5": [True, False, True, True, True]}))
+    tasks = Tasks.CreateFromJSON(perf_file)
+    assert tasks._performance.get("2 x 5") == (4, 5, [False, True, True, True])
+
+
+def test_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(PerformanceJournal, "COMPACT_EVERY", 8)
+    perf_file = tmp_path / "performance.json"
+    tasks = Tasks.CreateFromJSON(perf_file)
+    answer_some(tasks, 20)
+    tasks.close()
+    assert json.loads(perf_file.read_text())["seq"] == 16
+    assert perf_file.with_name("performance.json.journal").read_text().count("\n") == 4
+    loaded = Tasks.CreateFromJSON(perf_file)
+    assert loaded._performance.as_dict() == tasks._performance.as_dict()
@@ -0,0 +1,62 @@
+import random
+
+import numpy as np
+
+from Mnozenie.mnozenie import Tasks
+from Mnozenie.performance_store import PerformanceStore
+
+
+def legacy_fitness(performance: tuple[int, int, list[bool]]) -> float:
+    # Tasks.task_fitness before the switch to PerformanceStore, without the random factor.
+    correct, total, history = performance
+    total = max(1, total)
+    performance_last_4 = sum(history) / len(history)
+    performance_total = correct / total
+
+    performance = performance_total * 0.5 + performance_last_4 * 0.5
+
+    ans = 1 - performance
+    return -ans
+
+
+def legacy_give_feedback(performance: dict, question: str, correct: bool):
+    correct_count, total, history = performance[question]
+    history.append(correct)
+    history.pop(0)
+    if correct:
+        correct_count += 1
+    total += 1
+    performance[question] = (correct_count, total, history)
+
+
+def test_vectorized_fitness_matches_legacy():
+    rnd = random.Random(42)
+    tasks = Tasks(10, 100, 10)
+    legacy = {
+        task.get_question(): (0, 0, [False, False, False, False])
+        for task in tasks._tasks
+    }
+    for _ in range(2000):
+        task = rnd.choice(tasks._tasks)
+        correct = rnd.random() < 0.7
+        tasks.give_feedback(task, correct)
+        legacy_give_feedback(legacy, task.get_question(), correct)
+
+    assert tasks._performance.as_dict() == legacy
+    expected = np.array(
+        [legacy_fitness(legacy[task.get_question()]) for task in tasks._tasks]
+    )
+    assert np.array_equal(tasks._performance.fitness(), expected)
+    for row in range(len(tasks._tasks)):
+        assert tasks._performance.fitness_of(row) == expected[row]
+
+    jittered = tasks.all_fitness()
+    assert np.all(np.abs(jittered - expected) <= Tasks.JITTER)
+
+
+def test_legacy_histories_are_truncated():
+    store = PerformanceStore()
+    store.set("2 x 3", 5, 7, [True, False, True, True, False, True])
+    store.set("2 x 4", 1, 1, [True])
+    assert store.get("2 x 3") == (5, 7, [True, True, False, True])
+    assert store.get("2 x 4") == (1, 1, [False, False, False, True])
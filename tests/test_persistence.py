@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+from Mnozenie.mnozenie import Tasks
+from Mnozenie.persistence import PersistenceError, PersistenceWriter
+
+
+def test_saves_are_coalesced_and_ordered(tmp_path):
+    writer = PersistenceWriter(delay=60)
+    calls = []
+
+    def producer(i):
+        def produce():
+            calls.append(i)
+            return str(i).encode()
+
+        return produce
+
+    for i in range(10):
+        writer.save(tmp_path / "a.txt", producer(i))
+        writer.append(tmp_path / "b.txt", f"{i}\n".encode())
+    assert not (tmp_path / "a.txt").exists()
+    writer.flush()
+    assert calls == [9]
+    assert (tmp_path / "a.txt").read_text() == "9"
+    assert (tmp_path / "b.txt").read_text() == "".join(f"{i}\n" for i in range(10))
+    writer.close()
+
+
+def test_max_pending_triggers_write(tmp_path):
+    writer = PersistenceWriter(delay=60, max_pending=5)
+    for i in range(5):
+        writer.append(tmp_path / "b.txt", b"x")
+    path = tmp_path / "b.txt"
+    deadline = time.monotonic() + 5
+    while not (path.exists() and path.stat().st_size == 5):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert (tmp_path / "b.txt").read_bytes() == b"xxxxx"
+    writer.close()
+
+
+def test_failed_writes_are_reported(tmp_path):
+    writer = PersistenceWriter(delay=60)
+    missing = tmp_path / "missing" / "a.txt"
+    writer.append(missing, b"lost")
+    writer.append(tmp_path / "b.txt", b"kept")
+    with pytest.raises(PersistenceError) as e:
+        writer.flush()
+    assert [path for path, _ in e.value.failures] == [missing]
+    assert (tmp_path / "b.txt").read_bytes() == b"kept"
+    writer.flush()  # Reported once
+
+    writer.save(missing, lambda: b"lost again")
+    with pytest.raises(PersistenceError):
+        writer.close()
+
+
+def test_journal_through_writer(tmp_path):
+    perf_file = tmp_path / "performance.json"
+    writer = PersistenceWriter(delay=60)
+    tasks = Tasks.CreateFromJSON(perf_file, writer)
+    for i in range(30):
+        tasks.give_feedback(tasks._tasks[i % 5], i % 2 == 0)
+        if i == 10:
+            tasks.serialize_performance(perf_file)
+    tasks.close()
+    writer.close()
+    loaded = Tasks.CreateFromJSON(perf_file)
+    assert loaded._performance.as_dict() == tasks._performance.as_dict()
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from Mnozenie.pipeline import Pipeline
+
+
+class FakeWindow:
+    """Stands in for the Tk window: after() callbacks run when the test polls."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms: int, fn):
+        self.callbacks.append(fn)
+
+    def poll(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for fn in callbacks:
+            fn()
+
+
+def poll_until(window: FakeWindow, condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+        window.poll()
+
+
+def test_results_come_in_the_order_the_jobs_finish():
+    window = FakeWindow()
+    pipeline = Pipeline(window)
+    release = threading.Event()
+    results = []
+    threads = []
+
+    def record(result):
+        threads.append(threading.get_ident())
+        results.append(result)
+
+    pipeline.submit(lambda: release.wait(5) and "slow", on_done=record)
+    pipeline.submit(lambda: "fast", on_done=record)
+    pipeline.call_soon(results.append, "first call")
+    pipeline.call_soon(results.append, "second call")
+    poll_until(window, lambda: len(results) == 3)
+    assert results == ["first call", "second call", "fast"]
+    release.set()
+    poll_until(window, lambda: len(results) == 4)
+    assert results[-1] == "slow"
+    assert threads == [threading.get_ident()] * 2  # The callbacks run on "Tk" thread
+    pipeline.shutdown()
+
+
+def test_errors_go_to_on_error():
+    window = FakeWindow()
+    pipeline = Pipeline(window)
+    errors = []
+
+    def fail():
+        raise ValueError("bad")
+
+    pipeline.submit(fail, on_done=pytest.fail, on_error=errors.append)
+    poll_until(window, lambda: errors)
+    assert isinstance(errors[0], ValueError)
+    pipeline.shutdown()
+
+
+def test_cancelled_job_calls_nothing():
+    window = FakeWindow()
+    pipeline = Pipeline(window, max_workers=1)
+    release = threading.Event()
+    done = []
+    job = pipeline.submit(release.wait, 5, on_done=done.append, on_error=done.append)
+    assert job.pending
+    job.cancel()
+    assert not job.pending
+    release.set()
+    later = pipeline.submit(lambda: "later", on_done=done.append)
+    poll_until(window, lambda: done)
+    assert done == ["later"] and not later.pending
+    pipeline.shutdown()
+
+
+def test_timeout_drops_the_late_result():
+    window = FakeWindow()
+    pipeline = Pipeline(window)
+    release = threading.Event()
+    done, errors = [], []
+    job = pipeline.submit(
+        release.wait, 5, on_done=done.append, on_error=errors.append, timeout=0.05
+    )
+    poll_until(window, lambda: errors)
+    assert isinstance(errors[0], TimeoutError) and not job.pending
+    release.set()
+    job.future.result(5)
+    time.sleep(0.05)
+    window.poll()
+    assert done == [] and len(errors) == 1
+    pipeline.shutdown()
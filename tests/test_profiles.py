@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from Mnozenie.persistence import PersistenceWriter
+from Mnozenie.profiles import Profile, ProfileManager
+
+
+def answer_some(profile, n: int):
+    tasks = profile.tasks
+    for i in range(n):
+        tasks.give_feedback(tasks._tasks[i % 5], i % 2 == 0)
+
+
+@pytest.mark.parametrize("use_database", [False, True])
+def test_profiles_are_separate_and_survive_eviction(tmp_path, use_database):
+    sentences = tmp_path / "sentences.txt"
+    sentences.write_text("Ala ma kota.\nKot ma Alę.\n", encoding="utf-8")
+    writer = PersistenceWriter(delay=60)
+    profiles = ProfileManager(
+        tmp_path / "profiles", sentences, use_database, max_loaded=2, writer=writer
+    )
+
+    ola = profiles.get("Ola")
+    answer_some(ola, 12)
+    expected = ola.tasks._performance.as_dict()
+    sentence = ola.scoring_server.get_sentence()
+    ola.scoring_server.set_sentence_score(sentence, 0.75)
+    ola.save_totals({"total": 1.0})
+
+    profiles.get("Jan")
+    assert profiles.get("Jan").tasks._performance.as_dict() != expected
+    profiles.get("Ewa")
+    assert profiles.loaded() == ["Jan", "Ewa"]
+    assert profiles.names() == ["Ewa", "Jan", "Ola"]
+
+    ola = profiles.get("Ola")
+    assert ola.tasks._performance.as_dict() == expected
+    assert ola.scoring_server._store.get_score(sentence) == 0.75
+    assert ola.load_totals() == {"total": 1.0}
+    assert profiles.get("Ewa").load_totals() == {}
+    profiles.close()
+    writer.close()
+
+
+def test_parts_of_a_profile_load_lazily(tmp_path):
+    profiles = ProfileManager(tmp_path, tmp_path / "missing.txt")
+    profile = profiles.get("Ola")
+    assert profile._tasks is None
+    assert profile.tasks is profile._tasks is not None
+    assert profile._scoring_server is None and profile._archive is None
+    profiles.close()
+
+
+def test_evicted_profiles_are_closed_in_the_background(tmp_path, monkeypatch):
+    closes = []
+    close = Profile.close
+
+    def slow_close(profile):
+        time.sleep(0.2)
+        close(profile)
+        closes.append((profile.name, threading.current_thread().name))
+
+    monkeypatch.setattr(Profile, "close", slow_close)
+    profiles = ProfileManager(tmp_path, tmp_path / "missing.txt", max_loaded=1)
+    answer_some(profiles.get("Ola"), 12)
+    expected = profiles.get("Ola").tasks._performance.as_dict()
+    start = time.monotonic()
+    profiles.get("Jan")
+    assert time.monotonic() - start < 0.2
+    assert closes == []
+    # Getting it again waits for the close, so the saved progress is read.
+    assert profiles.get("Ola").tasks._performance.as_dict() == expected
+    assert closes[0][0] == "Ola" and closes[0][1].startswith("ProfileManager")
+    profiles.close()
+    assert [name for name, _ in closes] == ["Ola", "Jan", "Ola"]
+
+
+@pytest.mark.parametrize("name", ["", "..", ".hidden", "a/b"])
+def test_invalid_names(tmp_path, name):
+    with pytest.raises(ValueError):
+        ProfileManager(tmp_path).get(name)
@@ -0,0 +1,83 @@
+import json
+import sqlite3
+import time
+
+from Mnozenie.mnozenie import Tasks
+from Mnozenie.progress_repository import SqliteProgressRepository
+from Mnozenie.sqlite_db import SqliteDatabase
+
+
+def answer_some(tasks: Tasks, n: int):
+    for i in range(n):
+        tasks.give_feedback(tasks._tasks[i % 7], i % 3 != 0)
+
+
+def test_import_json_and_record_answers(tmp_path):
+    perf_file = tmp_path / "performance.json"
+    perf_file.write_text(json.dumps({"legacy": [True, False, True, True, True]}))
+    json_tasks = Tasks.CreateFromJSON(perf_file)
+    answer_some(json_tasks, 10)  # Journaled
+    json_tasks.close()
+    expected = Tasks.CreateFromJSON(perf_file)._performance.as_dict()
+
+    db_file = tmp_path / "progress.sqlite"
+    repository = SqliteProgressRepository(db_file, performance_file=perf_file)
+    tasks = Tasks.CreateFromRepository(repository)
+    assert tasks._performance.as_dict() == expected
+    assert tasks._performance.get("legacy") == (4, 5, [False, True, True, True])
+
+    start = time.time()
+    answer_some(tasks, 20)
+    tasks.save()
+    tasks.close()
+
+    # Imported once: changes of the JSON file are not picked up any more.
+    perf_file.write_text(json.dumps({"legacy": [False]}))
+    repository = SqliteProgressRepository(db_file, performance_file=perf_file)
+    loaded = Tasks.CreateFromRepository(repository)
+    assert loaded._performance.as_dict() == tasks._performance.as_dict()
+    assert len(repository.answers_between(start, time.time() + 1)) == 20
+    _, correct, total = repository.weakest_questions(1)[0]
+    stats = loaded._performance.as_dict().values()
+    assert correct / total == min(c / t for c, t, _ in stats if t)
+    loaded.close()
+
+
+def test_totals(tmp_path):
+    totals_file = tmp_path / "total_scores.json"
+    totals_file.write_text(json.dumps({"accuracy": 3.5, "total": 4.0}))
+    repository = SqliteProgressRepository(tmp_path / "db", totals_file=totals_file)
+    assert repository.load_totals() == {"accuracy": 3.5, "total": 4.0}
+    repository.save_totals({"accuracy": 4.5, "total": 5.0})
+    repository.close()
+    repository = SqliteProgressRepository(tmp_path / "db", totals_file=totals_file)
+    assert repository.load_totals() == {"accuracy": 4.5, "total": 5.0}
+    repository.close()
+
+
+def test_writes_are_committed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(SqliteDatabase, "BATCH_SIZE", 3)
+    monkeypatch.setattr(SqliteDatabase, "BATCH_DELAY", 0.2)
+    db = SqliteDatabase(tmp_path / "db")
+    db.script("CREATE TABLE t (x INTEGER);")
+    other = sqlite3.connect(tmp_path / "db")
+
+    def committed():
+        return other.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+
+    db.write("INSERT INTO t VALUES (1)")
+    db.write("INSERT INTO t VALUES (2)")
+    assert db.query("SELECT COUNT(*) FROM t")[0][0] == 2
+    assert committed() == 0
+    db.write("INSERT INTO t VALUES (3)")
+    assert committed() == 3
+
+    db.write("INSERT INTO t VALUES (4)")
+    deadline = time.monotonic() + 5
+    while committed() < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert committed() == 4
+    other.close()
+    db.write("INSERT INTO t VALUES (5)")
+    db.close()
+    db.commit()  # What the batch timer does if it fires after close()
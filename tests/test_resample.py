@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from Mnozenie.resample import resample, resample_batch
+from Mnozenie.voice_sample import VoiceSample
+
+
+def tone(frequency: float, frame_rate: int, seconds: float) -> np.ndarray:
+    t = np.arange(int(frame_rate * seconds)) / frame_rate
+    return (np.sin(2 * np.pi * frequency * t) * 10000).astype(np.int16)
+
+
+@pytest.mark.parametrize(
+    "src_rate, dst_rate", [(44100, 16000), (16000, 44100), (48000, 16000)]
+)
+def test_tone_is_preserved(src_rate, dst_rate):
+    out = resample(tone(440, src_rate, 1), src_rate, dst_rate)
+    assert out.dtype == np.int16
+    assert len(out) == dst_rate
+    expected = tone(440, dst_rate, 1).astype(float)
+    margin = dst_rate // 10  # Skip the edges, where the filter sees the padding
+    assert np.abs(out[margin:-margin] - expected[margin:-margin]).max() < 20
+
+
+def test_frequencies_above_nyquist_are_removed():
+    out = resample(tone(12000, 44100, 1), 44100, 16000)
+    assert np.abs(out[1000:-1000]).max() < 50
+
+
+def test_batch():
+    sounds = [
+        VoiceSample.FromArray(tone(300, 44100, 0.5), 44100),
+        VoiceSample.FromArray(tone(300, 16000, 0.5), 16000),
+    ]
+    out = resample_batch(sounds, 16000)
+    assert [s.frame_rate for s in out] == [16000, 16000]
+    assert np.abs(out[0].samples.astype(int) - out[1].samples)[800:-800].max() < 20
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", [(44100, 16000), (16000, 44100)])
+@pytest.mark.parametrize("dtype", [np.int16, np.float32])
+def test_empty_input(src_rate, dst_rate, dtype):
+    out = resample(np.zeros(0, dtype), src_rate, dst_rate)
+    assert len(out) == 0 and out.dtype == dtype
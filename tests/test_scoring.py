@@ -1,39 +1,107 @@
+import random
+
+import pytest
+
 from Mnozenie import score_sentence
+from Mnozenie.czytanie_scoring import (
+    align_words,
+    calc_time_penalty,
+    compile_sentence,
+    just_letters,
+    levenshtein,
+)
 
 
+@pytest.mark.parametrize(
+    "reference, user, expected",
+    [
+        (
+            "123 abcdefgh 12 abcd 987654 ABCDEFGHIJ xyz",
+            "123 abcdXefgh 12 abcd987654 ABCDEFGHIJ xyz",
+            4 / 7,
+        ),
+        ("123 abcdefghijklm 12 1234", "1234", 1 / 4),
+        ("123 abcdefghijklm 12 1234", "", 0 / 4),
+        ("123 abcdefghijklm 12 1234", "abcdefghijklm", 1 / 4),
+        ("123 abcdefghijklm 12 1234", "123", 1 / 4),
+        ("123 abcdefghijklm 12", "123 aXbcdeXghijkXm 12", 2 / 3),
+        ("123 abcdefghijklm 12", "123 Xabcdefghijklm 12", 2 / 3),
+        ("123 abcdefghijklm 12", "123X Xabcdefghijklm 12", 1 / 3),
+        ("123 abcdefghijklm 12", "123 XabcdefghijklmX 12", 2 / 3),
+        ("123 abcdefghijklm 12", "123 XabcdefghijklmX X12", 1 / 3),
+        ("123 abcdefgh 12 1234", "123 abcXXXX 1234", 2 / 4),
+        ("123 1234567 12 1234", "123 1234567 12 1234", 4 / 4),
+        ("Ala ma kota", "Ala ma psa", 2 / 3),
+        (
+            "Człowiek jest silniejszy, kiedy stawia czoła wyzwaniom. To odwaga napędza nas do działania.",
+            "Człowiek jest silniejszy, kiedy stawia czoła wyzwaniom do odwagi napędza nas do działania.",
+            11 / 13,
+        ),
+    ],
+)
 def test_scoring(reference: str, user: str, expected: float):
-    ans = score_sentence(reference, user)
-    if ans[0] != expected:
-        print(f"Error: expected {expected}, got {ans[0]}")
-    print(ans[1])
-
-
-def test():
-    test_scoring(
-        "123 abcdefgh 12 abcd 987654 ABCDEFGHIJ xyz",
-        "123 abcdXefgh 12 abcd987654 ABCDEFGHIJ xyz",
-        4 / 7,
-    )
-    test_scoring("123 abcdefghijklm 12 1234", "1234", 1 / 4)
-    test_scoring("123 abcdefghijklm 12 1234", "", 0 / 4)
-    test_scoring("123 abcdefghijklm 12 1234", "abcdefghijklm", 1 / 4)
-    test_scoring("123 abcdefghijklm 12 1234", "123", 1 / 4)
-
-    test_scoring("123 abcdefghijklm 12", "123 aXbcdeXghijkXm 12", 2 / 3)
-    test_scoring("123 abcdefghijklm 12", "123 Xabcdefghijklm 12", 2 / 3)
-    test_scoring("123 abcdefghijklm 12", "123X Xabcdefghijklm 12", 1 / 3)
-    test_scoring("123 abcdefghijklm 12", "123 XabcdefghijklmX 12", 2 / 3)
-    test_scoring("123 abcdefghijklm 12", "123 XabcdefghijklmX X12", 1 / 3)
-    test_scoring("123 abcdefgh 12 1234", "123 abcXXXX 1234", 2 / 4)
-    test_scoring("123 1234567 12 1234", "123 1234567 12 1234", 4 / 4)
-
-    test_scoring("Ala ma kota", "Ala ma psa", 2 / 3)
-    test_scoring(
-        "Człowiek jest silniejszy, kiedy stawia czoła wyzwaniom. To odwaga napędza nas do działania.",
-        "Człowiek jest silniejszy, kiedy stawia czoła wyzwaniom do odwagi napędza nas do działania.",
-        11 / 13,
-    )
-
-
-if __name__ == "__main__":
-    test()
+    score, html = score_sentence(reference, user)
+    assert score == pytest.approx(expected)
+    assert html.count("<span") == round((1 - expected) * len(reference.split()))
+
+
+def test_punctuation_only_words_do_not_count_as_errors():
+    assert score_sentence("Kot – pies", "kot pies")[0] == 1.0
+
+
+def test_levenshtein():
+    def naive(a, b):
+        prev = list(range(len(b) + 1))
+        for i, ca in enumerate(a, 1):
+            cur = [i]
+            for j, cb in enumerate(b, 1):
+                cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+            prev = cur
+        return prev[-1]
+
+    rng = random.Random(0)
+    for _ in range(1000):
+        a = "".join(rng.choice("abcż") for _ in range(rng.randint(0, 12)))
+        b = "".join(rng.choice("abcż") for _ in range(rng.randint(0, 12)))
+        assert levenshtein(a, b) == naive(a, b)
+
+
+def test_long_passage_with_repetitions():
+    sentence = [
+        "Ala",
+        "ma",
+        "kota",
+        "a",
+        "kot",
+        "ma",
+        "Alę",
+        "i",
+        "psa",
+        "który",
+        "nie",
+        "lubi",
+        "kota",
+    ]
+    reference = sentence * 100
+    user = [word for k, word in enumerate(reference) if k % 10 != 3]
+    alignment = align_words(reference, user)
+    assert [i for i, _ in alignment if i is not None] == list(range(len(reference)))
+    assert [j for _, j in alignment if j is not None] == list(range(len(user)))
+    score, _ = score_sentence(" ".join(reference), " ".join(user))
+    assert score == pytest.approx(0.9, abs=0.01)
+
+
+def test_compiled_sentence_scores_the_same():
+    sentence = "Popatrz, jaki ładny ptaszek! – ucieszyła się Todzia."
+    compiled = compile_sentence(sentence)
+    assert compiled.word_count == 8 and len(compiled.words) == 7
+    assert compiled.timeout == len(just_letters(sentence)) / 1.5 + 6
+    for transcript in [
+        "popatrz jaki ładny ptaszek ucieszyła się todzia",
+        "jaki ptak",
+        "",
+    ]:
+        assert score_sentence(compiled, transcript) == score_sentence(
+            sentence, transcript
+        )
+    assert calc_time_penalty(10.0, compiled) == calc_time_penalty(10.0, sentence)
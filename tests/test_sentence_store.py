@@ -0,0 +1,79 @@
+import json
+import os
+
+from Mnozenie.sentence_store import JsonSentenceStore, SqliteSentenceStore
+
+
+def write_sentences(path, sentences):
+    path.write_text("\n".join(sentences) + "\n", encoding="utf-8")
+
+
+def test_sqlite_store_takes_lowest_and_keeps_scores(tmp_path):
+    sentences = tmp_path / "sentences.txt"
+    write_sentences(sentences, ["Ala ma kota.", "Kot ma Alę.", "Ala ma kota.", "Pies."])
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    assert len(store) == 3
+
+    store.set_score("Kot ma Alę.", 0.5)
+    store.set_score("Pies.", 0.2)
+    taken = [store.take_lowest() for _ in range(3)]
+    assert taken == ["Ala ma kota.", "Pies.", "Kot ma Alę."]
+
+    store.set_score("Ala ma kota.", 0.9)
+    assert store.take_lowest() == "Ala ma kota."
+    store.close()
+
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    assert store.get_score("Ala ma kota.") == 0.9
+    assert store.get_score("Pies.") == 0.2
+    assert store.get_score("Nie ma.") is None
+    assert store.take_lowest() == "Pies."
+    store.close()
+
+
+def test_sqlite_store_imports_only_changed_files(tmp_path):
+    sentences = tmp_path / "sentences.txt"
+    write_sentences(sentences, ["Jeden.", "Dwa."])
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    store.close()
+
+    # Same size and time: the file is not read again.
+    stat = os.stat(sentences)
+    write_sentences(sentences, ["Jedno.", "Dwa."])
+    os.utime(sentences, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    assert len(store) == 2
+    store.close()
+
+    os.utime(sentences, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    assert len(store) == 3
+    store.close()
+
+
+def test_sqlite_store_imports_json_scores(tmp_path):
+    sentences = tmp_path / "sentences.txt"
+    write_sentences(sentences, ["Jeden.", "Dwa.", "Trzy."])
+    scores = tmp_path / "scores.json"
+    scores.write_text(json.dumps({"Jeden.": 0.7, "Stare.": 0.1}))
+
+    store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, scores)
+    assert len(store) == 4
+    assert store.get_score("Jeden.") == 0.7
+    assert store.get_score("Dwa.") == 0
+    assert store.take_lowest() == "Dwa."
+    store.close()
+
+
+def test_json_and_sqlite_stores_agree(tmp_path):
+    sentences = tmp_path / "sentences.txt"
+    write_sentences(sentences, [f"Zdanie {k}." for k in range(20)])
+    json_store = JsonSentenceStore(sentences, str(tmp_path / "scores.json"))
+    sqlite_store = SqliteSentenceStore(tmp_path / "db.sqlite", sentences, None)
+    for k in range(40):
+        a, b = json_store.take_lowest(), sqlite_store.take_lowest()
+        assert a == b
+        score = (k * 7 % 11) / 10
+        json_store.set_score(a, score)
+        sqlite_store.set_score(b, score)
+    sqlite_store.close()
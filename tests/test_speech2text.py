@@ -0,0 +1,118 @@
+import base64
+import json
+import threading
+import time
+
+import pytest
+import requests
+from stt_server_stub import SpeechServerStub
+
+from Mnozenie.speech2text import FLAC, RAW_PCM, Speech2Text, WhisperSpeech2Text
+
+
+def test_stream_is_uploaded_while_recording():
+    with SpeechServerStub() as server:
+        stream = Speech2Text(server.url).start_stream(16000)
+        for _ in range(10):
+            stream.feed(b"\x00\x01" * 512)
+            time.sleep(0.01)
+        recording_ended = time.monotonic()
+        assert stream.finish(timeout=5) == "10240 bytes at 16000 Hz"
+        # Most of the audio reached the server before the recording ended.
+        assert sum(t < recording_ended for t in server.chunk_times) >= 5
+        assert server.requests == [("stream", 10240)]
+
+
+def test_stream_errors_are_raised_on_finish():
+    with SpeechServerStub(streaming=False) as server:
+        stream = Speech2Text(server.url).start_stream(16000)
+        stream.feed(b"\x00\x00" * 100)
+        with pytest.raises(requests.HTTPError):
+            stream.finish(timeout=5)
+
+
+class Sample16k:
+    # The part of VoiceSample that the binary upload uses, already at 16 kHz.
+    frame_rate = 16000
+    sample_width = 2
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def json(self) -> str:
+        return json.dumps(
+            {
+                "data": base64.b85encode(self.data).decode(),
+                "frame_rate": self.frame_rate,
+                "sample_width": self.sample_width,
+            }
+        )
+
+
+def test_binary_upload_negotiates_format():
+    pytest.importorskip("soundfile")
+    with SpeechServerStub(upload_formats=(RAW_PCM,)) as server:
+        speech2text = Speech2Text(server.url, upload_formats=[FLAC, RAW_PCM])
+        sound = Sample16k(b"\x01\x00" * 16000)
+        assert speech2text.get_transcript(sound) == "32000 bytes at 16000 Hz"
+        assert speech2text.get_transcript(sound) == "32000 bytes at 16000 Hz"
+        # The second request goes straight to the negotiated format.
+        assert [r[0] for r in server.requests] == [FLAC, RAW_PCM, RAW_PCM]
+
+
+def test_json_fallback():
+    with SpeechServerStub(upload_formats=()) as server:
+        speech2text = Speech2Text(server.url, upload_formats=[RAW_PCM])
+        sound = Sample16k(b"\x01\x00" * 100)
+        assert speech2text.get_transcript(sound) == "200 bytes at 16000 Hz"
+        assert speech2text.get_transcript(sound) == "200 bytes at 16000 Hz"
+        assert server.requests == [("json", 200), ("json", 200)]
+
+
+class FakeWhisper(WhisperSpeech2Text):
+    """Loads a fake model: transcribe() returns the number of samples."""
+
+    def __init__(self, release: threading.Event, fail: bool = False):
+        self.release = release
+        self.fail = fail
+        self.calls = []
+        super().__init__("fake")
+
+    def _load_model(self):
+        self.release.wait(5)
+        if self.fail:
+            raise OSError("No such model")
+        return self
+
+    def transcribe(self, audio, language, fp16):
+        self.calls.append(len(audio))
+        return {"text": f" {len(audio)} "}
+
+
+def test_whisper_waits_for_the_model():
+    release = threading.Event()
+    speech2text = FakeWhisper(release)
+    assert not speech2text.wait_until_loaded(0.05)
+    results = []
+    worker = threading.Thread(
+        target=lambda: results.append(
+            speech2text.transcribe_pcm(b"\x00\x00" * 800, 16000)
+        )
+    )
+    worker.start()
+    worker.join(0.1)
+    assert worker.is_alive() and results == []
+    release.set()
+    worker.join(5)
+    assert results == ["800"]
+    assert speech2text.calls == [16000, 800]  # Warm-up on a second of silence
+
+
+def test_whisper_load_errors_are_raised(capsys):
+    release = threading.Event()
+    release.set()
+    speech2text = FakeWhisper(release, fail=True)
+    assert speech2text.wait_until_loaded(5)
+    with pytest.raises(OSError, match="No such model"):
+        speech2text.transcribe_pcm(b"\x00\x00" * 800, 16000)
+    assert "Failed to load the Whisper model fake" in capsys.readouterr().err
@@ -0,0 +1,61 @@
+import numpy as np
+
+from Mnozenie.tasks import Tasks
+
+
+def practiced_tasks(seed: int) -> Tasks:
+    """A small task space with uneven histories, so that several fitness levels
+    compete within the random factor."""
+    tasks = Tasks(6, 36, 1, seed=seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(300):
+        task = tasks._tasks[rng.integers(len(tasks._tasks))]
+        tasks.give_feedback(task, bool(rng.random() < 0.6))
+    return tasks
+
+
+def test_next_task_matches_brute_force_argmin():
+    draws = 10000
+    tasks = practiced_tasks(0)
+    picked = np.zeros(len(tasks._tasks))
+    for _ in range(draws):
+        picked[tasks._performance.get_id(tasks.get_next_task().get_question())] += 1
+    brute_force = np.zeros(len(tasks._tasks))
+    for _ in range(draws):
+        fitness = [tasks.task_fitness(task) for task in tasks._tasks]
+        brute_force[int(np.argmin(fitness))] += 1
+
+    assert picked.sum() == brute_force.sum() == draws
+    # Total variation distance of the two empirical distributions; sampling noise
+    # with these numbers is about 0.015.
+    assert np.abs(picked - brute_force).sum() / (2 * draws) < 0.04
+    assert np.all(picked[brute_force == 0] < draws * 0.001)
+
+
+def test_seed_reproduces_the_choices():
+    first = practiced_tasks(1)
+    second = practiced_tasks(1)
+    for _ in range(50):
+        assert (
+            first.get_next_task().get_question()
+            == second.get_next_task().get_question()
+        )
+    assert first.task_fitness(first._tasks[0]) == second.task_fitness(second._tasks[0])
+
+
+def test_feedback_reranks_only_the_answered_task():
+    tasks = practiced_tasks(2)
+    levels = list(tasks._task_level)
+    row = 7
+    tasks.give_feedback(tasks._tasks[row], False)
+
+    expected = tasks._performance.fitness()[: len(tasks._tasks)].tolist()
+    assert tasks._task_level[row] == expected[row]
+    assert tasks._task_level[:row] == levels[:row]
+    assert tasks._task_level[row + 1 :] == levels[row + 1 :]
+    assert tasks._task_level == expected
+    # The buckets and the heap of levels agree with the levels of the tasks.
+    for task_id, level in enumerate(tasks._task_level):
+        assert tasks._buckets[level][tasks._bucket_pos[task_id]] == task_id
+    assert sum(len(bucket) for bucket in tasks._buckets.values()) == len(tasks._tasks)
+    assert tasks._levels.peek()[0] == min(tasks._buckets)
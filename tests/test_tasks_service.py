@@ -0,0 +1,186 @@
+import asyncio
+import base64
+import json
+import os
+import struct
+
+import pytest
+
+from Mnozenie.profiles import ProfileManager
+from Mnozenie.tasks_service import TaskServer, TaskService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_answers_follow_the_rules_of_the_app(tmp_path):
+    clock = Clock()
+    service = TaskService(ProfileManager(tmp_path), clock)
+    state = service.open_session("Ola")
+    session_id = state["session"]
+    tasks = service.profiles.get("Ola").tasks
+    task = service._sessions[session_id].task
+    question = task.get_question()
+
+    wrong = service.answer(session_id, task.result + 1)
+    assert not wrong["correct"] and wrong["expected"] == task.result
+    assert wrong["task"]["question"] == question
+    right = service.answer(session_id, str(task.result))
+    assert right["correct"] and right["in_time"] and right["score"] == 0.5
+    # Failed once: the right answer does not count as correct.
+    assert tasks._performance.get(question)[:2] == (0, 2)
+
+    task = service._sessions[session_id].task
+    clock.now += task.get_time_limit() + 1
+    slow = service.answer(session_id, task.result)
+    assert slow["correct"] and not slow["in_time"]
+    assert tasks._performance.get(task.get_question())[0] == 0
+
+    with pytest.raises(ValueError):
+        service.answer(session_id, "dwanaście")
+    with pytest.raises(TypeError):
+        service.answer(session_id, True)
+    clock.now += TaskService.SESSION_TTL + 1
+    assert service.expire_sessions() == 1
+    with pytest.raises(KeyError):
+        service.session(session_id)
+    service.close()
+
+
+async def http(reader, writer, method: str, path: str, body: dict | None = None):
+    data = b"" if body is None else json.dumps(body).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n\r\n".encode()
+        + data
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode()
+    status = int(head.split(" ", 2)[1])
+    length = int(head.lower().split("content-length: ")[1].split("\r\n")[0])
+    payload = await reader.readexactly(length)
+    return status, json.loads(payload) if payload else None
+
+
+async def ws_send(writer, message: dict):
+    payload = json.dumps(message).encode()
+    mask = os.urandom(4)
+    masked = bytes(b ^ mask[k % 4] for k, b in enumerate(payload))
+    writer.write(struct.pack("!BB", 0x81, 0x80 | len(payload)) + mask + masked)
+    await writer.drain()
+
+
+async def ws_receive(reader) -> dict:
+    _, length = await reader.readexactly(2)
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    return json.loads(await reader.readexactly(length))
+
+
+def test_http_and_websocket(tmp_path):
+    async def scenario():
+        service = TaskService(ProfileManager(tmp_path))
+        server = TaskServer(service)
+        port = await server.start("127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        status, state = await http(
+            reader, writer, "POST", "/sessions", {"learner": "Ola"}
+        )
+        assert status == 201
+        session_id = state["session"]
+        task = service._sessions[session_id].task
+        status, result = await http(
+            reader,
+            writer,
+            "POST",
+            f"/sessions/{session_id}/answer",
+            {"answer": task.result},
+        )
+        assert status == 200 and result["correct"] and result["answers"] == 1
+        assert (await http(reader, writer, "GET", "/profiles")) == (200, ["Ola"])
+        assert (await http(reader, writer, "GET", "/sessions/nope"))[0] == 404
+        assert (await http(reader, writer, "POST", "/sessions", {"learner": ".."}))[
+            0
+        ] == 400
+        assert (await http(reader, writer, "POST", "/sessions", {"learner": 5}))[
+            0
+        ] == 400
+        assert (await http(reader, writer, "DELETE", f"/sessions/{session_id}")) == (
+            204,
+            None,
+        )
+        writer.close()
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write(
+            "GET /ws?learner=Jan HTTP/1.1\r\nHost: test\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n".encode()
+        )
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        assert head.startswith("HTTP/1.1 101")
+        first = await ws_receive(reader)
+        assert first["type"] == "task" and len(service) == 1
+        task = service._sessions[first["session"]].task
+        await ws_send(writer, {"answer": task.result})
+        result = await ws_receive(reader)
+        assert result["type"] == "result" and result["correct"]
+        await ws_send(writer, {"answer": None})
+        assert (await ws_receive(reader))["type"] == "error"
+        writer.write(struct.pack("!BB", 0x88, 0x80) + os.urandom(4))  # Close
+        await writer.drain()
+        await reader.read()
+        writer.close()
+        assert len(service) == 0
+
+        await server.stop()
+        service.close()
+
+    asyncio.run(scenario())
+
+
+def test_many_concurrent_sessions(tmp_path):
+    async def learner(port: int, service: TaskService, name: str):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        _, state = await http(reader, writer, "POST", "/sessions", {"learner": name})
+        for _ in range(5):
+            task = service._sessions[state["session"]].task
+            _, state = await http(
+                reader,
+                writer,
+                "POST",
+                f"/sessions/{state['session']}/answer",
+                {"answer": task.result},
+            )
+            assert state["correct"]
+        writer.close()
+
+    async def scenario():
+        service = TaskService(ProfileManager(tmp_path, max_loaded=20))
+        server = TaskServer(service)
+        port = await server.start("127.0.0.1", 0)
+        await asyncio.gather(
+            *(learner(port, service, f"learner{k % 40}") for k in range(100))
+        )
+        assert len(service) == 100
+        # Profiles with sessions stay loaded, max_loaded limits the others.
+        assert len(service.profiles.loaded()) == 40
+        for session_id in list(service._sessions):
+            service.close_session(session_id)
+        await service.load("newcomer")
+        assert len(service.profiles.loaded()) == 20
+        assert not service.profiles.is_loaded("learner0")
+        await service.wait_closed()
+        await service.load("learner0")
+        stats = service.profiles.get("learner0").tasks._performance.as_dict()
+        assert sum(total for _, total, _ in stats.values()) == 15
+        await server.stop()
+        service.close()
+
+    asyncio.run(scenario())
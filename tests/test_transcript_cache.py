@@ -0,0 +1,82 @@
+import numpy as np
+from overrides import overrides
+
+from Mnozenie.speech2text import (
+    BufferedTranscriptStream,
+    ISpeech2Text,
+    ITranscriptStream,
+)
+from Mnozenie.transcript_cache import CachedSpeech2Text
+from Mnozenie.voice_sample import VoiceSample
+
+
+class CountingSpeech2Text(ISpeech2Text):
+    def __init__(self, model: str = "a"):
+        self.model = model
+        self.calls = 0
+
+    def transcribe_pcm(self, pcm: bytes, frame_rate: int, sample_width: int = 2) -> str:
+        self.calls += 1
+        return f"{len(pcm)} bytes"
+
+    @overrides
+    def get_transcript(self, sound: VoiceSample) -> str:
+        return self.transcribe_pcm(sound.data, sound.frame_rate)
+
+    @overrides
+    def start_stream(self, frame_rate: int, sample_width: int = 2) -> ITranscriptStream:
+        return BufferedTranscriptStream(self, frame_rate, sample_width)
+
+    @overrides
+    def identity(self) -> str:
+        return f"counting:{self.model}"
+
+
+def sound(n: int) -> VoiceSample:
+    return VoiceSample.FromArray(np.arange(n, dtype=np.int16), 16000)
+
+
+def test_repeated_audio_is_transcribed_once():
+    backend = CountingSpeech2Text()
+    cache = CachedSpeech2Text(backend, max_entries=2)
+    assert cache.get_transcript(sound(100)) == "200 bytes"
+    assert cache.get_transcript(sound(100)) == "200 bytes"
+    assert backend.calls == 1
+
+    # The stream of the same audio, in chunks, hits the same entry.
+    stream = cache.start_stream(16000)
+    stream.feed(sound(100).data[:50])
+    stream.feed(sound(100).data[50:])
+    assert stream.finish() == "200 bytes"
+    assert backend.calls == 1
+
+    # Least recently used goes first.
+    cache.get_transcript(sound(200))
+    cache.get_transcript(sound(300))
+    assert len(cache) == 2
+    cache.get_transcript(sound(100))
+    assert backend.calls == 4
+
+
+def test_key_depends_on_the_backend_and_format():
+    cache_a = CachedSpeech2Text(CountingSpeech2Text("a"))
+    cache_b = CachedSpeech2Text(CountingSpeech2Text("b"))
+    pcm = sound(100).data
+    assert cache_a.key(pcm, 16000) != cache_b.key(pcm, 16000)
+    assert cache_a.key(pcm, 16000) != cache_a.key(pcm, 44100)
+
+
+def test_persistence(tmp_path):
+    cache_file = tmp_path / "cache.jsonl"
+    cache = CachedSpeech2Text(
+        CountingSpeech2Text(), max_entries=3, cache_file=cache_file
+    )
+    for n in range(1, 8):
+        cache.get_transcript(sound(n))
+    assert len(cache_file.read_text().splitlines()) <= 6  # Rewritten when too long
+
+    backend = CountingSpeech2Text()
+    cache = CachedSpeech2Text(backend, max_entries=3, cache_file=cache_file)
+    assert len(cache) == 3
+    assert cache.get_transcript(sound(7)) == "14 bytes"
+    assert backend.calls == 0
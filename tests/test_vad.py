@@ -0,0 +1,88 @@
+import numpy as np
+from overrides import overrides
+
+from Mnozenie.speech2text import ITranscriptStream
+from Mnozenie.vad import VadGate, trim_silence
+
+RATE = 16000
+
+
+def recording(*parts: tuple[str, float]) -> np.ndarray:
+    """Quiet background noise with "speech" (a loud tone) or "hiss" (a fricative
+    like white noise) in it."""
+    rng = np.random.default_rng(0)
+    out = []
+    for kind, seconds in parts:
+        n = int(RATE * seconds)
+        x = rng.normal(0, 30, n)  # About -60 dBFS
+        if kind == "speech":
+            x += np.sin(2 * np.pi * 200 * np.arange(n) / RATE) * 8000
+        elif kind == "hiss":
+            x += rng.normal(0, 600, n)
+        out.append(x)
+    return np.concatenate(out).astype(np.int16)
+
+
+class CollectingStream(ITranscriptStream):
+    def __init__(self):
+        self.fed = []
+
+    @overrides
+    def feed(self, chunk: bytes):
+        self.fed.append(chunk)
+
+    @overrides
+    def finish(self, timeout: float | None = None) -> str:
+        return f"{sum(len(c) for c in self.fed) // 2}"
+
+    @overrides
+    def cancel(self):
+        pass
+
+
+def test_trim_silence():
+    samples = recording(("silence", 1.0), ("speech", 1.5), ("silence", 2.0))
+    start, end = trim_silence(samples, RATE, padding_ms=200)
+    assert abs(start - int(0.8 * RATE)) <= RATE // 50
+    assert abs(end - int(2.7 * RATE)) <= RATE // 50
+
+
+def test_fricatives_are_speech():
+    samples = recording(("silence", 1.0), ("hiss", 0.3), ("silence", 1.0))
+    start, end = trim_silence(samples, RATE, padding_ms=0)
+    assert abs(start - RATE) <= RATE // 50
+    assert abs(end - int(1.3 * RATE)) <= RATE // 50
+
+
+def test_silence_only():
+    assert trim_silence(recording(("silence", 2.0)), RATE) == (0, 0)
+    assert trim_silence(np.zeros(RATE, np.int16), RATE) == (0, 0)
+
+
+def test_gate_sends_only_speech_and_auto_stops():
+    samples = recording(
+        ("silence", 1.0),
+        ("speech", 1.0),
+        ("silence", 1.5),
+        ("speech", 0.5),
+        ("silence", 3.0),
+    )
+    stream = CollectingStream()
+    stopped_at = []
+    gate = VadGate(
+        stream,
+        RATE,
+        padding_ms=200,
+        auto_stop_ms=2000,
+        on_auto_stop=lambda: stopped_at.append(fed),
+    )
+    fed = 0
+    for start in range(0, len(samples), 1024):
+        gate.feed(samples[start : start + 1024].tobytes())
+        fed = start + 1024
+
+    assert stopped_at and abs(stopped_at[0] - 6 * RATE) <= 2048
+    sent = int(gate.finish())
+    # Both words, the pause between them shortened to about twice the padding, and
+    # about the padding before and after (all rounded up to whole chunks).
+    assert 2.2 * RATE <= sent <= 2.8 * RATE
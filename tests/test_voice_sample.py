@@ -0,0 +1,50 @@
+import numpy as np
+
+from Mnozenie.voice_sample import VoiceSample
+
+
+def test_from_array_is_zero_copy():
+    samples = np.arange(-800, 800, dtype=np.int16)
+    sound = VoiceSample.FromArray(samples, 16000)
+    assert np.shares_memory(sound.samples, samples)
+    assert len(sound) == 2 * len(samples)
+    assert sound.length() == len(samples) / 16000
+
+    loaded = VoiceSample.model_validate_json(sound.model_dump_json())
+    assert np.array_equal(loaded.samples, samples)
+
+
+def test_wav_round_trip_is_memory_mapped(tmp_path):
+    samples = np.arange(-8000, 8000, dtype=np.int16)
+    VoiceSample.FromArray(samples, 16000).save(tmp_path / "a.wav")
+
+    loaded = VoiceSample.Load(tmp_path / "a.wav")
+    assert loaded.frame_rate == 16000
+    assert isinstance(loaded.data.obj.base, np.memmap)  # A view of the mapped file
+    assert np.array_equal(loaded.samples, samples)
+    part = loaded.Slice(0.25, 0.5)
+    assert np.shares_memory(part.samples, loaded.samples)
+    assert np.array_equal(part.samples, samples[4000:8000])
+    assert np.array_equal(
+        VoiceSample.Load(tmp_path / "a.wav", mmap=False).samples, samples
+    )
+
+
+def test_load_wav_with_extra_chunks(tmp_path):
+    import wave
+
+    samples = np.arange(100, dtype=np.int16)
+    with wave.open(str(tmp_path / "b.wav"), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(44100)
+        wf.writeframes(samples.tobytes())
+    # A LIST chunk between "fmt " and "data", as some recorders write
+    data = (tmp_path / "b.wav").read_bytes()
+    extra = b"LIST" + (5).to_bytes(4, "little") + b"abcde\0"
+    patched = data[:12] + data[12:36] + extra + data[36:]
+    (tmp_path / "b.wav").write_bytes(patched)
+
+    loaded = VoiceSample.Load(tmp_path / "b.wav")
+    assert loaded.frame_rate == 44100
+    assert np.array_equal(loaded.samples, samples)